@@ -0,0 +1,151 @@
+import os
+import random
+import struct
+
+# the synthetic files of the benchmarks. every layout stresses another part of the extraction:
+# samples_count and gop set the number of samples and the distance between key frames, samples_per_chunk is the repeating
+# pattern of samples per chunk (alternating values make stsc hold an entry per chunk), extra_traks adds audio traks before
+# the video trak and sample sizes are drawn between min_sample_size and max_sample_size
+LAYOUTS = {
+    'moov_start': {},
+    'moov_end': {'moov_at_end': True},
+    'huge_stsc': {'samples_count': 30000, 'samples_per_chunk': (1, 2), 'min_sample_size': 200, 'max_sample_size': 600},
+    'co64': {'co64': True},
+    'long_gop': {'gop': 1500},
+    'many_traks': {'extra_traks': 8, 'moov_at_end': True},
+}
+DEFAULT_LAYOUT = {'samples_count': 3000, 'gop': 60, 'samples_per_chunk': (5,), 'min_sample_size': 2000, 'max_sample_size': 12000,
+                  'moov_at_end': False, 'co64': False, 'extra_traks': 0, 'timescale': 12800, 'sample_delta': 512, 'seed': 1,
+                  'fragment_gops': 2}
+
+SPS = b'\x67\x42\x00\x1e\xaa\xbb'
+PPS = b'\x68\xce\x38\x80'
+
+
+def box(box_type, payload):
+    return struct.pack('!I', 8 + len(payload)) + box_type.encode() + payload
+
+
+def full_box(box_type, payload, version=0, flags=0):
+    return box(box_type, struct.pack('!I', (version << 24) | flags) + payload)
+
+
+def table_box(box_type, entries, entry_format, header=b''):
+    return full_box(box_type, header + struct.pack('!I', len(entries)) + b''.join(struct.pack(entry_format, *entry) for entry in entries))
+
+
+# a 4 byte length prefixed nal unit filling the sample. key frames are idr slices
+def make_sample(sample_size, is_key):
+    return struct.pack('!IB', sample_size - 4, 0x65 if is_key else 0x41) + bytes(sample_size - 5)
+
+
+def make_video_trak(layout, samples_sizes, chunks, chunks_offsets):
+    samples_count = len(samples_sizes)
+    stsc_entries = []
+    for chunk_index, chunk_samples in enumerate(chunks):
+        if not stsc_entries or stsc_entries[-1][1] != len(chunk_samples):
+            stsc_entries.append((chunk_index + 1, len(chunk_samples), 1))
+    avcc = box('avcC', bytes([1, 0x42, 0, 0x1e, 0xff, 0xe1]) + struct.pack('!H', len(SPS)) + SPS + bytes([1]) + struct.pack('!H', len(PPS)) + PPS)
+    avc1 = box('avc1', bytes(6) + struct.pack('!H', 1) + bytes(16) + struct.pack('!HH', 320, 240) + struct.pack('!II', 0x480000, 0x480000) +
+               bytes(4) + struct.pack('!H', 1) + bytes(32) + struct.pack('!Hh', 0x18, -1) + avcc)
+    stbl = box('stbl', full_box('stsd', struct.pack('!I', 1) + avc1) +
+               table_box('stts', [(samples_count, layout['sample_delta'])] if samples_count else [], '!II') +
+               table_box('stss', [(sample_number,) for sample_number in range(1, samples_count + 1, layout['gop'])], '!I') +
+               table_box('stsc', stsc_entries, '!III') +
+               table_box('stsz', [(sample_size,) for sample_size in samples_sizes], '!I', struct.pack('!I', 0)) +
+               table_box('co64' if layout['co64'] else 'stco', [(chunk_offset,) for chunk_offset in chunks_offsets], '!Q' if layout['co64'] else '!I'))
+    mdhd = full_box('mdhd', struct.pack('!IIII', 0, 0, layout['timescale'], samples_count * layout['sample_delta']) + bytes(4))
+    hdlr = full_box('hdlr', struct.pack('!I', 0) + b'vide' + bytes(12) + b'video\x00')
+    return box('trak', full_box('tkhd', struct.pack('!IIII', 0, 0, 1, 0) + bytes(64)) + box('mdia', mdhd + hdlr + box('minf', box('vmhd', bytes(12)) + stbl)))
+
+
+# audio traks with a sample table of their own, so the moov is walked past tables the extractor does not need
+def make_audio_trak(track_id, samples_count):
+    hdlr = full_box('hdlr', struct.pack('!I', 0) + b'soun' + bytes(12) + b'audio\x00')
+    stbl = box('stbl', table_box('stsz', [(400,)] * samples_count, '!I', struct.pack('!I', 0)) + table_box('stco', [(0,)] * samples_count, '!I'))
+    return box('trak', full_box('tkhd', struct.pack('!IIII', 0, 0, track_id, 0) + bytes(64)) + box('mdia', hdlr + box('minf', stbl)))
+
+
+def get_layout(layout_name):
+    return {**DEFAULT_LAYOUT, **LAYOUTS[layout_name]}
+
+
+def get_duration(layout):
+    return layout['samples_count'] * layout['sample_delta'] / layout['timescale']
+
+
+def make_samples_sizes(layout):
+    rnd = random.Random(layout['seed'])
+    return [rnd.randint(layout['min_sample_size'], layout['max_sample_size']) for _ in range(layout['samples_count'])]
+
+
+def make_mp4(**layout_options):
+    layout = {**DEFAULT_LAYOUT, **layout_options}
+    samples_sizes = make_samples_sizes(layout)
+    chunks = []
+    sample_index = 0
+    while sample_index < layout['samples_count']:
+        chunk_samples_number = layout['samples_per_chunk'][len(chunks) % len(layout['samples_per_chunk'])]
+        chunks.append(range(sample_index, min(sample_index + chunk_samples_number, layout['samples_count'])))
+        sample_index += chunk_samples_number
+    payload = bytearray()
+    payload_offsets = []
+    for chunk_samples in chunks:
+        payload_offsets.append(len(payload))
+        for sample_index in chunk_samples:
+            payload += make_sample(samples_sizes[sample_index], sample_index % layout['gop'] == 0)
+    ftyp = box('ftyp', b'isom' + struct.pack('!I', 512) + b'isomavc1')
+    audio_traks = b''.join(make_audio_trak(track_id, layout['samples_count']) for track_id in range(2, layout['extra_traks'] + 2))
+
+    def make_moov(chunks_offsets):
+        return box('moov', full_box('mvhd', bytes(96)) + audio_traks + make_video_trak(layout, samples_sizes, chunks, chunks_offsets))
+
+    # the moov size does not depend on the offsets values so it is built once to find where the mdat starts
+    mdat_offset = len(ftyp) if layout['moov_at_end'] else len(ftyp) + len(make_moov([0] * len(chunks)))
+    moov = make_moov([mdat_offset + 8 + payload_offset for payload_offset in payload_offsets])
+    mdat = box('mdat', bytes(payload))
+    return ftyp + mdat + moov if layout['moov_at_end'] else ftyp + moov + mdat
+
+
+# the samples of make_mp4 with the same layout in a fragmented file: empty sample tables in the moov, a moof and mdat pair for every
+# fragment_gops key frames and an mfra at the end with a tfra entry per key frame. the truns carry every optional sample field
+def make_fragmented_mp4(**layout_options):
+    layout = {**DEFAULT_LAYOUT, **layout_options}
+    samples_sizes = make_samples_sizes(layout)
+    gop, sample_delta = layout['gop'], layout['sample_delta']
+    moov = box('moov', full_box('mvhd', bytes(96)) + make_video_trak(layout, [], [], []) +
+               box('mvex', full_box('trex', struct.pack('!IIIII', 1, 1, sample_delta, 0, 0))))
+    data = bytearray(box('ftyp', b'isom' + struct.pack('!I', 512) + b'isomavc1') + moov)
+    tfra_entries = []
+    fragment_samples_count = gop * layout['fragment_gops']
+    for sequence_number, first_sample in enumerate(range(0, len(samples_sizes), fragment_samples_count), 1):
+        fragment_sizes = samples_sizes[first_sample: first_sample + fragment_samples_count]
+
+        # the data offset of the trun is relative to the moof, as the default-base-is-moof flag of the tfhd states
+        def make_moof(data_offset):
+            trun = full_box('trun', struct.pack('!Ii', len(fragment_sizes), data_offset) +
+                            b''.join(struct.pack('!IIIi', sample_delta, sample_size, 0, 0) for sample_size in fragment_sizes), flags=0xF01)
+            traf = box('traf', full_box('tfhd', struct.pack('!I', 1), flags=0x020000) +
+                       full_box('tfdt', struct.pack('!Q', first_sample * sample_delta), version=1) + trun)
+            return box('moof', full_box('mfhd', struct.pack('!I', sequence_number)) + traf)
+        moof = make_moof(len(make_moof(0)) + 8)
+        for sample_index in range(first_sample, first_sample + len(fragment_sizes), gop):
+            tfra_entries.append((sample_index * sample_delta, len(data), 1, 1, sample_index - first_sample + 1))
+        data += moof + box('mdat', b''.join(make_sample(sample_size, (first_sample + index) % gop == 0) for index, sample_size in enumerate(fragment_sizes)))
+    # 4 byte traf, trun and sample numbers
+    tfra = full_box('tfra', struct.pack('!III', 1, 0x3F, len(tfra_entries)) + b''.join(struct.pack('!QQIII', *entry) for entry in tfra_entries), version=1)
+    mfro_size = 16
+    return bytes(data + box('mfra', tfra + full_box('mfro', struct.pack('!I', 8 + len(tfra) + mfro_size))))
+
+
+# writes the files of the layouts that are missing in the directory. returns layout name -> file path
+def generate_corpus(corpus_dir, layouts_names=None):
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = {}
+    for layout_name in layouts_names or LAYOUTS:
+        file_path = os.path.join(corpus_dir, f'{layout_name}.mp4')
+        if not os.path.isfile(file_path):
+            with open(file_path, 'wb') as f:
+                f.write(make_mp4(**LAYOUTS[layout_name]))
+        corpus[layout_name] = file_path
+    return corpus
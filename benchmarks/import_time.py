@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.corpus import generate_corpus
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS_DIR = os.path.join(REPO_DIR, 'benchmarks', 'corpus')
+# the libraries of the decoders and the encoders. importing opencv alone may take most of the startup of a worker
+HEAVY_MODULES = ('cv2', 'av', 'numpy')
+# every scenario runs in a fresh interpreter. the index scenario prepares the packets of a key frame without decoding them
+SCENARIOS = {
+    'import': "import frameExtractor.FrameExtractor",
+    'index': "from frameExtractor.FrameExtractor import FrameExtractor\n"
+             "from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler\n"
+             "FrameExtractor(FileStreamHandler(FILE_PATH, os.devnull), verbose=0).prepare_targets_packets([(0.5, 0)])",
+    'batch_import': "import frameExtractor.FrameExtractorBatch",
+}
+# the scenarios that must not import the heavy modules
+LIGHTWEIGHT_SCENARIOS = ('import', 'index')
+SCENARIO_TEMPLATE = '''import json, os, sys, time
+FILE_PATH = {file_path!r}
+start_time = time.perf_counter()
+{code}
+print(json.dumps({{'seconds': time.perf_counter() - start_time, 'heavy_modules': [m for m in {heavy_modules!r} if m in sys.modules]}}))
+'''
+
+
+def run_scenario(code, file_path):
+    script = SCENARIO_TEMPLATE.format(file_path=file_path, code=code, heavy_modules=HEAVY_MODULES)
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')]))}
+    process = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, cwd=REPO_DIR)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.decode(errors='replace').strip())
+    return json.loads(process.stdout.decode().strip().splitlines()[-1])
+
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description='measures the startup of fresh interpreters and checks which libraries they import.')
+    parser.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--repeat', type=int, default=5)
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    args = parse_arguments(arguments)
+    file_path = generate_corpus(args.corpus_dir, ['moov_start'])['moov_start']
+    failed = False
+    print(f"{'scenario':<16}{'median ms':>12}  heavy modules")
+    for name, code in SCENARIOS.items():
+        runs = [run_scenario(code, file_path) for _ in range(args.repeat)]
+        heavy_modules = runs[-1]['heavy_modules']
+        print(f"{name:<16}{statistics.median(run['seconds'] for run in runs) * 1000:>12.1f}  {', '.join(heavy_modules) or '-'}")
+        if name in LIGHTWEIGHT_SCENARIOS and heavy_modules:
+            failed = True
+            print(f"regression: {name} imported {', '.join(heavy_modules)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
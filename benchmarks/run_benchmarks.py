@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks.corpus import LAYOUTS, generate_corpus, get_duration, get_layout
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import SUCCESS_CODE, UNKNOWN_ERROR_FAIL_CODE
+from frameExtractor.FrameExtractorExceptions import ExtractorExceptionBase
+from frameExtractor.FrameExtractorRangePlanner import ReadCostModel
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE_PATH = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+# the times depend on the machine so they are kept out of the committed baseline, in a file of the host that recorded them
+DEFAULT_LOCAL_TIMES_PATH = os.path.join(BENCHMARKS_DIR, 'baseline_times.local.json')
+DEFAULT_CORPUS_DIR = os.path.join(BENCHMARKS_DIR, 'corpus')
+# bytes and requests are deterministic so any growth is a regression. times are noisy and compared with a tolerance
+DETERMINISTIC_FIELDS = ('fetched_bytes', 'requests', 'status_code')
+TIME_FIELDS = ('wall_time', 'cpu_time')
+DEFAULT_TIME_TOLERANCE = 0.5
+# times of a few milliseconds are mostly noise so they may also grow by this many seconds
+TIME_SLACK = 0.005
+# long gops download many samples up to the time target. the limits are raised above them so nothing asks for a confirmation
+BENCHMARK_DOWNLOAD_LIMIT = 64 * 1000 * 1000
+# the latency and bandwidth of the fake remote source
+REMOTE_REQUEST_LATENCY = 0.02
+REMOTE_BYTES_PER_SECOND = 20 * 1000 * 1000
+
+
+class LatencyStreamHandler(FileStreamHandler):
+    # a local file that answers like a remote source: every vectored read waits a request latency plus the transfer time
+    def __init__(self, src_file_name, dst_file_name, request_latency=REMOTE_REQUEST_LATENCY, bytes_per_second=REMOTE_BYTES_PER_SECOND):
+        super().__init__(src_file_name, dst_file_name)
+        self.request_latency = request_latency
+        self.bytes_per_second = bytes_per_second
+
+    def read_ranges(self, ranges, chunk_size):
+        time.sleep(self.request_latency + sum(bytes_number for _, bytes_number in ranges) / self.bytes_per_second)
+        return super().read_ranges(ranges, chunk_size)
+
+    # identifies as another source than the local file so caches never mix them
+    def get_file_identity(self):
+        return None
+
+
+HANDLERS = {
+    'file': lambda file_path: FileStreamHandler(file_path, os.devnull),
+    'remote': lambda file_path: LatencyStreamHandler(file_path, os.devnull),
+}
+
+
+# a fresh extractor prepares the packets of a key frame and of a time target, without decoding them
+def run_extraction(layout_name, handler_name, file_path):
+    handler = HANDLERS[handler_name](file_path)
+    cost_model = ReadCostModel(REMOTE_REQUEST_LATENCY, REMOTE_BYTES_PER_SECOND) if handler_name == 'remote' else None
+    extractor = FrameExtractor(handler, verbose=0, frames_after=5, cost_model=cost_model, download_limit=BENCHMARK_DOWNLOAD_LIMIT,
+                               download_threshold=BENCHMARK_DOWNLOAD_LIMIT, fetch_byte_limit=BENCHMARK_DOWNLOAD_LIMIT * 2)
+    start_wall_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    try:
+        extractor.prepare_targets_packets([(0.5, 0)])
+        extractor.prepare_time_target_packets(get_duration(get_layout(layout_name)) * 0.7)
+        status_code = SUCCESS_CODE
+    except ExtractorExceptionBase as e:
+        status_code = e.get_fail_code()
+    except Exception as e:
+        status_code = UNKNOWN_ERROR_FAIL_CODE
+    result = {'wall_time': time.perf_counter() - start_wall_time, 'cpu_time': time.process_time() - start_cpu_time,
+              'fetched_bytes': extractor.get_fetched_bytes(), 'requests': extractor.round_trips, 'status_code': status_code}
+    extractor.close()
+    return result
+
+
+# runs every layout with every handler. times are the medians of the repeats
+def run_benchmarks(corpus, handlers_names, repeat):
+    results = {}
+    for layout_name, file_path in corpus.items():
+        for handler_name in handlers_names:
+            runs = [run_extraction(layout_name, handler_name, file_path) for _ in range(repeat)]
+            results[f'{layout_name}/{handler_name}'] = {'wall_time': statistics.median(run['wall_time'] for run in runs),
+                                                        'cpu_time': statistics.median(run['cpu_time'] for run in runs),
+                                                        'fetched_bytes': runs[-1]['fetched_bytes'], 'requests': runs[-1]['requests'],
+                                                        'status_code': runs[-1]['status_code']}
+    return results
+
+
+# returns the regressions messages of the results against the baseline. the times are compared only to the local times
+def compare_to_baseline(results, baseline, time_tolerance, local_times=None):
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            expected = baseline[name]
+            if result['status_code'] != expected['status_code']:
+                regressions.append(f"{name}: status code {result['status_code']} instead of {expected['status_code']}")
+            for field in ('fetched_bytes', 'requests'):
+                if result[field] > expected[field]:
+                    regressions.append(f"{name}: {field} grew from {expected[field]} to {result[field]}")
+        if local_times and name in local_times:
+            for field in TIME_FIELDS:
+                expected_time = local_times[name][field]
+                if result[field] > expected_time * (1 + time_tolerance) + TIME_SLACK:
+                    regressions.append(f"{name}: {field} grew from {round(expected_time, 4)} to {round(result[field], 4)} seconds")
+    return regressions
+
+
+def load_json(path, default):
+    if not os.path.isfile(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+# the times recorded by --update-baseline on this host. times of other hosts are never compared
+def load_local_times(path):
+    local_times = load_json(path, {})
+    return local_times.get('results', {}) if local_times.get('host') == platform.node() else {}
+
+
+def store_baseline(results, baseline, baseline_path, local_times, local_times_path):
+    with open(baseline_path, 'w') as f:
+        json.dump({**baseline, **{name: {field: result[field] for field in DETERMINISTIC_FIELDS} for name, result in results.items()}}, f,
+                  indent=2, sort_keys=True)
+    with open(local_times_path, 'w') as f:
+        json.dump({'host': platform.node(), 'results': {**local_times, **{name: {field: result[field] for field in TIME_FIELDS}
+                                                                        for name, result in results.items()}}}, f, indent=2, sort_keys=True)
+
+
+def print_results(results, baseline):
+    print(f"{'benchmark':<24}{'wall ms':>10}{'cpu ms':>10}{'fetched KB':>12}{'requests':>10}{'baseline KB':>13}{'baseline requests':>19}")
+    for name, result in results.items():
+        expected = baseline.get(name, {})
+        print(f"{name:<24}{result['wall_time'] * 1000:>10.1f}{result['cpu_time'] * 1000:>10.1f}{result['fetched_bytes'] / 1024:>12.1f}"
+              f"{result['requests']:>10}{expected.get('fetched_bytes', 0) / 1024:>13.1f}{expected.get('requests', '-'):>19}")
+
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description='benchmarks the extractor on synthetic mp4 layouts and compares to a stored baseline.')
+    parser.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR, help='where the synthetic files are generated once')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help='the committed bytes, requests and status codes')
+    parser.add_argument('--local-times', default=DEFAULT_LOCAL_TIMES_PATH, help='the times recorded on this host by --update-baseline')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the new baseline and the times of this host')
+    parser.add_argument('--layouts', nargs='*', choices=list(LAYOUTS), default=None)
+    parser.add_argument('--handlers', nargs='*', choices=list(HANDLERS), default=list(HANDLERS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--time-tolerance', type=float, default=DEFAULT_TIME_TOLERANCE, help='allowed relative growth of the times')
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    args = parse_arguments(arguments)
+    corpus = generate_corpus(args.corpus_dir, args.layouts)
+    results = run_benchmarks(corpus, args.handlers, args.repeat)
+    baseline = load_json(args.baseline, {})
+    local_times = load_local_times(args.local_times)
+    print_results(results, baseline)
+    if args.update_baseline:
+        store_baseline(results, baseline, args.baseline, local_times, args.local_times)
+        print(f"baseline stored to {args.baseline} and the times of this host to {args.local_times}")
+        return 0
+    if not local_times:
+        print("times are not compared: record them on this host with --update-baseline")
+    regressions = compare_to_baseline(results, baseline, args.time_tolerance, local_times)
+    for regression in regressions:
+        print(f"regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
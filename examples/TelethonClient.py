@@ -1,13 +1,20 @@
-import time
+import asyncio
+import random
 
 from telethon.errors import FloodWaitError
 from telethon.tl.types import InputMessagesFilterVideo
 
+# flood waits longer than this fail the download instead of holding the extraction
+DEFAULT_MAX_FLOOD_WAIT = 60
+DEFAULT_MAX_FLOOD_RETRIES = 3
+
 
 class TelethonClient:
-    def __init__(self, client, verbose=1):
+    def __init__(self, client, verbose=1, max_flood_wait=DEFAULT_MAX_FLOOD_WAIT, max_flood_retries=DEFAULT_MAX_FLOOD_RETRIES):
         self.client = client
         self.verbose = verbose
+        self.max_flood_wait = max_flood_wait
+        self.max_flood_retries = max_flood_retries
 
     async def get_last_video_in_channel(self, channel_id):
         msgs = [m async for m in self.client.iter_messages(channel_id, filter=InputMessagesFilterVideo(), limit=1)]
@@ -16,11 +23,14 @@ class TelethonClient:
             exit(1)
         return msgs[0]
 
+    # a flood wait is awaited, with jitter so concurrent downloads don't wake together, and the download resumes from the
+    # first chunk it did not get
     async def get_video_chunks(self, message, offset, chunks_number, chunk_size):
         if self.verbose >= 1:
             print(f"downloading {chunk_size*chunks_number} bytes from offset {offset} of video {message.id} in channel {message.chat.id}...")
         to_return = {}
         i = 0
+        flood_retries = 0
         while True:
             try:
                 async for chunk in self.client.iter_download(message, limit=chunks_number-i, request_size=chunk_size, offset=offset + chunk_size * i):
@@ -28,7 +38,11 @@ class TelethonClient:
                     i += 1
                 break
             except FloodWaitError as f:
-                print(f)
-                print(f"sleeping {f.seconds}")
-                time.sleep(f.seconds)
+                flood_retries += 1
+                if f.seconds > self.max_flood_wait or flood_retries > self.max_flood_retries:
+                    raise
+                wait_seconds = f.seconds + random.uniform(0, 1)
+                if self.verbose >= 1:
+                    print(f"{f}. sleeping {round(wait_seconds, 2)}")
+                await asyncio.sleep(wait_seconds)
         return to_return
@@ -0,0 +1,130 @@
+import asyncio
+
+from .FrameExtractor import FrameExtractor
+from .FrameExtractorConstants import *
+from .FrameExtractorExceptions import *
+from .extractor_handlers.AsyncStreamHandlerBase import AsyncStreamHandler
+
+
+class MissingRangesException(Exception):
+    # raised by the synchronous extraction steps when bytes are not cached yet.
+    # the async driver downloads the ranges and runs the step again
+    def __init__(self, ranges, priority, used_ranges=()):
+        self.ranges = ranges
+        self.priority = priority
+        self.used_ranges = used_ranges
+        super().__init__(f'missing ranges: {ranges}')
+
+
+class AsyncFrameExtractor(FrameExtractor):
+    # the async twin of FrameExtractor. the parsing steps are shared with the synchronous extractor and every read
+    # they plan is awaited on the running loop, so a single loop can drive many extractions at once.
+    # there is no user to confirm sizes above the thresholds so only the limits apply
+    def __init__(self, stream_handler: AsyncStreamHandler, **kwargs):
+        super().__init__(stream_handler, **kwargs)
+
+    def read_ranges(self, ranges, priority, used_ranges=()):
+        raise MissingRangesException(ranges, priority, used_ranges)
+
+    async def fetch_ranges_async(self, ranges):
+        return await self.stream_handler.read_ranges(ranges, self.chunk_size)
+
+    # reads through the shared cache like the synchronous extractor. concurrent misses of other extractors are awaited
+    async def read_ranges_async(self, ranges, priority, used_ranges=()):
+        bytes_number = self.check_fetch_budget(ranges)
+        file_identity = self.stream_handler.get_file_identity() if self.shared_cache is not None else None
+        with self.metrics.span('fetch', handler=self.handler_name):
+            if file_identity is not None:
+                ranges_dict, requests_count, fetched_bytes, cached_bytes = await self.shared_cache.read_ranges_async(file_identity, ranges,
+                                                                                                                     self.fetch_ranges_async,
+                                                                                                                     self.read_alignment)
+            else:
+                ranges_dict, requests_count, fetched_bytes, cached_bytes = await self.fetch_ranges_async(ranges), 1, bytes_number, 0
+        self.store_ranges(ranges, ranges_dict, bytes_number, priority, requests_count, fetched_bytes, cached_bytes, used_ranges)
+
+    # runs a synchronous step until all the bytes it needs are cached.
+    # steps cache everything they parse so a rerun only repeats the work after the last missing read.
+    # the rerun reads again the ranges of the earlier runs so they are kept under a byte budget
+    async def run_step(self, step, *args):
+        step_ranges = []
+        while True:
+            try:
+                return step(*args)
+            except MissingRangesException as e:
+                step_ranges += e.used_ranges
+                await self.read_ranges_async(e.ranges, e.priority, step_ranges)
+
+    def confirm_download_size(self, download_size):
+        return True
+
+    async def init_async(self):
+        self.print_verbose("initiating...", ALG_VARS_VERBOSE)
+        if not self.load_cached_index():
+            with self.metrics.span('find_boxes'):
+                await self.run_step(self.build_index)
+        self.initiated = True
+
+    async def extract_frame(self):
+        try:
+            self.stream_handler.start_extraction()
+            if not self.initiated:
+                await self.init_async()
+            with self.metrics.span('collect_target_samples'):
+                description_data_id, target_samples = await self.run_step(self.collect_target_samples)
+            converted_samples_packets = await self.run_step(self.retrieve_and_decode_samples_bytes, target_samples, description_data_id)
+            # decoding is cpu bound and blocking so it runs in the default executor
+            result = await asyncio.get_running_loop().run_in_executor(None, self.extract_decoded_frame, converted_samples_packets, description_data_id)
+        except ExtractorExceptionBase as e:
+            return self.finish_extraction(e.get_fail_code(), str(e))
+        except Exception as e:
+            return self.finish_extraction(UNKNOWN_ERROR_FAIL_CODE, str(e))
+        self.print_summary()
+        return self.finish_extraction(SUCCESS_CODE, result)
+
+    async def extract_frame_at(self, seconds):
+        try:
+            self.stream_handler.start_extraction()
+            if not self.initiated:
+                await self.init_async()
+            with self.metrics.span('collect_target_samples'):
+                description_data_id, target_samples, frame_index = await self.run_step(self.collect_time_target_samples, seconds)
+            converted_samples_packets = await self.run_step(self.retrieve_and_decode_samples_bytes, target_samples, description_data_id)
+            result = await asyncio.get_running_loop().run_in_executor(None, self.extract_decoded_frame, converted_samples_packets,
+                                                                      description_data_id, None, frame_index)
+        except ExtractorExceptionBase as e:
+            return self.finish_extraction(e.get_fail_code(), str(e))
+        except Exception as e:
+            return self.finish_extraction(UNKNOWN_ERROR_FAIL_CODE, str(e))
+        self.print_summary()
+        return self.finish_extraction(SUCCESS_CODE, result)
+
+    # the packets are read on the loop so bytes evicted under a byte budget are fetched again, only decoding runs in the executor.
+    # returns (target, status code, result)
+    async def decode_target_async(self, target_index, target, description_data_id, target_samples):
+        try:
+            converted_samples_packets = await self.run_step(self.retrieve_and_decode_samples_bytes, target_samples, description_data_id)
+            result = await asyncio.get_running_loop().run_in_executor(None, self.extract_decoded_frame, converted_samples_packets,
+                                                                      description_data_id, self.get_target_file_name(target_index))
+        except ExtractorExceptionBase as e:
+            return target, e.get_fail_code(), str(e)
+        except Exception as e:
+            return target, UNKNOWN_ERROR_FAIL_CODE, str(e)
+        return target, SUCCESS_CODE, result
+
+    async def extract_frames(self, targets):
+        targets = list(targets)
+        try:
+            self.stream_handler.start_extraction()
+            if not self.initiated:
+                await self.init_async()
+            with self.metrics.span('collect_target_samples'):
+                targets_samples = await self.run_step(self.collect_targets_samples, targets)
+            await self.run_step(self.download_samples, [target_samples for _, target_samples in targets_samples])
+        except ExtractorExceptionBase as e:
+            return [(target, *self.finish_extraction(e.get_fail_code(), str(e))) for target in targets]
+        except Exception as e:
+            return [(target, *self.finish_extraction(UNKNOWN_ERROR_FAIL_CODE, str(e))) for target in targets]
+        results = await asyncio.gather(*[self.decode_target_async(target_index, target, description_data_id, target_samples)
+                                         for target_index, (target, (description_data_id, target_samples)) in enumerate(zip(targets, targets_samples))])
+        self.print_batch_summary(results)
+        return [(target, *self.finish_extraction(status_code, result)) for target, status_code, result in results]
@@ -1,26 +1,45 @@
 import os
-from typing import List
-
-import cv2
-from extractor_codecs.FrameExtractorCodecBase import FrameExtractorCodec
-from FrameExtractorExceptions import *
-from FrameExtractorConstants import *
-from FrameExtractorHelpers import *
-from extractor_codecs.H264Codec import H264Codec
-from extractor_codecs.H265Codec import H265Codec
-from extractor_codecs.MPEG4Codec import MPEG4Codec
-from extractor_handlers.StreamHandlerBase import StreamHandler
+from array import array
+from bisect import bisect_right
+from typing import List, Union
+
+from .extractor_codecs.FrameExtractorCodecBase import FrameExtractorCodec
+from .FrameExtractorExceptions import *
+from .FrameExtractorConstants import *
+from .FrameExtractorHelpers import *
+from .FrameExtractorBoxTree import BoxTree
+from .FrameExtractorByteStore import SparseByteStore
+from .FrameExtractorFragments import TrackFragmentRandomAccessTable, parse_track_fragment
+from .FrameExtractorIndexCache import IndexCache
+from .FrameExtractorMetrics import Instrumentation, MetricsSink
+from .FrameExtractorRangePlanner import RangePlanner, ReadCostModel
+from .FrameExtractorSampleTables import *
+from .FrameExtractorSharedCache import SharedChunkCache
+from .FrameExtractorTrackIndex import TrackIndex
+from .extractor_codecs.H264Codec import H264Codec
+from .extractor_codecs.H265Codec import H265Codec
+from .extractor_codecs.MPEG4Codec import MPEG4Codec
+from .extractor_decoders.FrameDecoderBase import DEFAULT_DECODER_BACKENDS, FrameDecoder, get_available_decoder
+from .extractor_handlers.StreamHandlerBase import StreamHandler
 
 
 class FrameExtractor:
     def __init__(self, stream_handler: StreamHandler, verbose=SUMMERY_VERBOSE, target_frame_mult=1, target_frame_offset=0,
-                 frames_after=0, chunk_size=DEFAULT_CHUNK_SIZE, chunk_limit=DEFAULT_CHUNKS_LIMIT,
-                 download_threshold=DEFAULT_DOWNLOAD_THRESHHOLD, frames_limit_from_end=0, stsc_size_threshold=DEFAULT_STSC_SIZE_THRESHOLD,
-                 download_limit=DEFAULT_DOWNLOAD_LIMIT, stsc_size_limit=DEFAULT_STSC_SIZE_LIMIT):
-        # will cache chunks
-        self.chunks_mapper = {}
-        # saves how many chunks we used
-        self.chunks_count = 0
+                 frames_after=0, chunk_size=DEFAULT_CHUNK_SIZE, fetch_byte_limit=DEFAULT_FETCH_BYTE_LIMIT, request_limit=DEFAULT_REQUEST_LIMIT,
+                 download_threshold=DEFAULT_DOWNLOAD_THRESHHOLD, frames_limit_from_end=0, stsc_size_threshold=None,
+                 download_limit=DEFAULT_DOWNLOAD_LIMIT, stsc_size_limit=DEFAULT_STSC_SIZE_LIMIT, index_cache: IndexCache = None,
+                 range_gap_threshold=None, cache_byte_budget=None, shared_cache: SharedChunkCache = None,
+                 frame_output=FILE_FRAME_OUTPUT, encoded_image_extension=DEFAULT_ENCODED_IMAGE_EXTENSION, decoders: List[Union[FrameDecoder, str]] = None,
+                 probe_window_size=DEFAULT_PROBE_WINDOW_SIZE, cost_model: ReadCostModel = None,
+                 metrics_sinks: List[MetricsSink] = None, track_index: TrackIndex = None):
+        # will cache the downloaded bytes. with a byte budget the least recently used payload is evicted first
+        self.byte_store = SparseByteStore(cache_byte_budget)
+        # saves how many bytes we fetched and how many bytes the shared cache served without a request
+        self.fetched_bytes = 0
+        self.shared_cache_bytes = 0
+        # saves how many reads we made and how many of them were made until the moov box was found
+        self.round_trips = 0
+        self.moov_round_trips = None
         # the handler we will use to retrieve chunks and the file name and size.
         self.stream_handler: StreamHandler = stream_handler
         self.verbose = verbose
@@ -28,10 +47,12 @@ class FrameExtractor:
         self.target_frame_mult = target_frame_mult
         # how many frames to retrieve after target key frame
         self.frames_after = frames_after
-        # the chunk size. default is 10 kb
+        # the read granularity of handlers that can only read whole chunks. other handlers read exact ranges
         self.chunk_size = chunk_size
-        # limit the chunks that the algorithm will retrieve
-        self.chunk_limit = chunk_limit
+        self.read_alignment = stream_handler.get_read_alignment(chunk_size)
+        # limit the bytes and the requests that the algorithm will retrieve
+        self.fetch_byte_limit = fetch_byte_limit
+        self.request_limit = request_limit
         # specify the offset from end to the target key frame(-1 for the last, -2 for the frame before the last and so on)
         self.target_frame_offset = target_frame_offset
         # any download above the threshold will require the confirmation of the user
@@ -39,11 +60,9 @@ class FrameExtractor:
         # allows limiting the frames retrieved after the target key frame. for example if you want to target one of the last 90 frames put here 90
         # and the extractor will stop at 90 frames from the end
         self.frames_limit_from_end = frames_limit_from_end
-        # any stsc size above the threshold will require the confirmation of the user
-        self.stsc_size_threshold = stsc_size_threshold
         # any download size above will raise error
         self.download_limit = download_limit
-        # any stsc size above will raise error
+        # any stsc size above will raise error when the whole table is loaded for the index
         self.stsc_size_limit = stsc_size_limit
         # allow the use of the same extractor multiple times without downloading the boxes' data every time
         self.initiated = False
@@ -53,104 +72,166 @@ class FrameExtractor:
         self.codecs: List[FrameExtractorCodec] = [H264Codec(), H265Codec(), MPEG4Codec()]
         # caching the boxes for the extractor
         self.boxes = {}
+        # the parsed box headers of the file, created when the boxes are looked for
+        self.box_tree = None
+        # caching the decoded sample tables of the boxes
+        self.sample_tables = {}
+        # caching the sample descriptions as description id -> (sample entry type, codec private box data, width, height)
+        self.sample_descriptions = {}
+        # the time units per second of the video track. read from mdhd when seeking by time
+        self.timescale = None
+        # the presentation times of the key samples in stss order. computed once per track and searched by every seek
+        self.keys_times = None
+        # the id of the video track and its (sample description index, sample size, sample duration) defaults. only read for fragmented files
+        self.track_id = None
+        self.trex_defaults = None
+        # persistent index shared between extractors of the same file. the whole tables are read once when it is set
+        self.index_cache = index_cache
+        # the latency and bandwidth of the source. gaps between ranges of the same phase are downloaded while that is cheaper than
+        # another request and box headers are read ahead up to the same size, inside their enclosing box
+        self.cost_model = cost_model if cost_model is not None else ReadCostModel()
+        self.readahead_size = self.cost_model.get_break_even_size()
+        self.range_gap_threshold = range_gap_threshold if range_gap_threshold is not None else self.readahead_size
+        # smaller stsc tables are read whole with the key samples. bigger ones are read in pages around the target samples.
+        # by default a table is read whole when that costs less than another request. tables above the size limit are always paged
+        self.stsc_size_threshold = min(stsc_size_threshold if stsc_size_threshold is not None else self.readahead_size, stsc_size_limit)
+        # the head and the tail of the file are fetched together before looking for the moov box. 0 walks the boxes from the start
+        self.probe_window_size = probe_window_size
+        # process wide cache shared with the other extractors of the same file. concurrent misses are fetched once
+        self.shared_cache = shared_cache
+        # the extracted frame is written to the handler destination file, returned as a bgr numpy array or returned as encoded image bytes
+        self.frame_output = frame_output
+        self.encoded_image_extension = encoded_image_extension
+        # the first available decoder is used. the packets are decoded in memory unless only opencv is available.
+        # decoders given by their backend name, like 'pyav', are imported on the first decode
+        self.decoders: List[Union[FrameDecoder, str]] = decoders if decoders is not None else self.create_default_decoders()
+        self.decoder = None
+        # the phases timings, the reads and the results are reported to the sinks. nothing is measured without sinks
+        self.metrics = Instrumentation(metrics_sinks or ())
+        self.handler_name = type(stream_handler).__name__
+        # an index built by another extractor of the same file. this extractor keeps only its targets, reads and accounting
+        if track_index is not None:
+            self.use_track_index(track_index)
+
+    @staticmethod
+    def create_default_decoders():
+        return list(DEFAULT_DECODER_BACKENDS)
 
     def print_verbose(self, to_print, verbose_level):
         if self.verbose >= verbose_level:
             print(to_print)
 
-    def find_box(self, box_name, start_offset, end):
-        if start_offset >= end:
-            return 0
-
-        offset = start_offset
-        box_size = 0
-        # look for the box
-        while offset + 8 < end:
-            box_entry_bytes = self.get_bytes(offset, 8)
-            atom_size = read_unsigned_integer(box_entry_bytes, 0)
-            if 1 < atom_size < 8:  # erroneous size
-                return 0, 0  # file cut
-
-            atom_type = read_bytes(box_entry_bytes, 4, 4)
-            if len(atom_type) < 4:
-                return 0, 0  # file cut
-
-            if atom_size == 0:  # box extends to the end of file
-                atom_size = self.get_file_size() - offset - 4
-                if box_name is None or atom_type.decode(encoding='UTF-8') == box_name:
-                    box_size = atom_size
-                    break
-                return 0, 0  # we have nothing more to look for
-            elif atom_size == 1:  # 64 bit-size
-                atom_size = self.read_unsigned_long_direct(offset + 8)
-
-            if box_name is None or atom_type.decode(encoding='UTF-8') == box_name:
-                box_size = atom_size
-                break
-            offset += atom_size
-            self.print_verbose('%s    size    %12d' % (atom_type.decode(encoding='UTF-8'), atom_size), BOX_FINDERS_VERBOSE)
-        if box_name is None or atom_type.decode(encoding='UTF-8') == box_name:
-            self.print_verbose('found! %s    size    %12d' % (atom_type.decode(encoding='UTF-8'), atom_size), BOX_FINDERS_VERBOSE)
-        return box_size, offset, atom_type.decode(encoding='UTF-8')
-
-    def look_for_video_trak(self, start_offset, end):
-        offs = start_offset
-        video_trak = 0
-        while offs + 8 < end:
-            trak_size, trak_offs, _ = self.find_box('trak', offs, end)
-            if trak_size == 0:
-                raise BoxNotFoundException("trak")
-            mdia_size, mdia_offs, _ = self.find_box('mdia', trak_offs + 8, trak_offs + trak_size)
-            if mdia_size == 0:
-                raise BoxNotFoundException("mdia")
-            hdlr_size, hdlr_offs, _ = self.find_box('hdlr', mdia_offs + 8, mdia_offs + mdia_size)
-            if hdlr_size == 0:
-                raise BoxNotFoundException("hdlr")
+    # box headers are read ahead inside their enclosing box since the boxes that follow are usually needed too
+    def get_box_tree(self):
+        if self.box_tree is None:
+            self.box_tree = BoxTree(self.get_file_size(), lambda offset, bytes_number, end: self.get_bytes(offset, bytes_number, readahead_end=end))
+        return self.box_tree
 
+    def find_child_box(self, box, box_name):
+        child = self.get_box_tree().find_child(box, box_name)
+        if child is None:
+            raise BoxNotFoundException(box_name)
+        self.print_verbose('found! %s    size    %12d' % (box_name, child.size), BOX_FINDERS_VERBOSE)
+        return child
+
+    def set_box(self, box_name, box):
+        self.boxes[box_name] = (box.size, box.offset)
+
+    # yields (trak box, handler type) of the traks of the moov, parsing each trak only when it is reached
+    def iterate_traks(self, moov):
+        for trak in self.get_box_tree().iterate_children(moov):
+            if trak.box_type != 'trak':
+                continue
+            hdlr = self.find_child_box(self.find_child_box(trak, 'mdia'), 'hdlr')
             # skip over version and pre-defined
-            trak_type = self.read_characters_direct(hdlr_offs + 16, 4)
-            self.print_verbose(f'trak type: {trak_type}', BOX_FINDERS_VERBOSE)
-
-            if trak_type.decode(encoding='UTF-8') == 'vide':
-                return True, mdia_offs, mdia_size, video_trak
+            yield trak, self.read_characters_direct(hdlr.offset + 16, 4).decode(encoding='UTF-8')
 
-            offs = trak_offs + trak_size
-            video_trak += 1
-        return False, -1, -1, -1
+    # returns (video trak number, trak box) of the first video trak
+    def look_for_video_trak(self, moov):
+        for video_trak, (trak, trak_type) in enumerate(self.iterate_traks(moov)):
+            self.print_verbose(f'trak type: {trak_type}', BOX_FINDERS_VERBOSE)
+            if trak_type == 'vide':
+                return video_trak, trak
+        raise VideoTrakNotFoundException()
 
     def get_file_size(self):
         if not self.file_size:
             self.file_size = self.stream_handler.get_file_size()
         return self.file_size
 
-    def read_chunks(self, offset, chunk_number):
-        self.print_verbose(f"reading {chunk_number} chunks in offset {offset}...", READING_VERBOSE)
-        if self.chunks_count + chunk_number > self.chunk_limit:
-            raise ChunksLimitException(self.chunks_count, chunk_number)
-        chunks_dict = self.stream_handler.read_chunks(offset, chunk_number, self.chunk_size)
-        self.chunks_count += chunk_number
-        for chunk_offset, chunk_bytes in chunks_dict.items():
-            self.chunks_mapper[chunk_offset] = chunk_bytes
-
-    def get_bytes(self, offset, bytes_number):
+    # every vectored read is a single request of the budget
+    def check_fetch_budget(self, ranges):
+        bytes_number = sum(bytes_number for _, bytes_number in ranges)
+        self.print_verbose(f"reading {bytes_number} bytes in {len(ranges)} ranges: {ranges}...", READING_VERBOSE)
+        if self.fetched_bytes + bytes_number > self.fetch_byte_limit or self.round_trips >= self.request_limit:
+            raise FetchBudgetException(self.fetched_bytes, self.round_trips, bytes_number)
+        return bytes_number
+
+    # only the requests that reached the handler count toward the budget. the bytes served by the shared cache are counted apart
+    def store_ranges(self, ranges, ranges_dict, bytes_number, priority, requests_count=1, fetched_bytes=None, cached_bytes=0, used_ranges=()):
+        fetched_bytes = bytes_number if fetched_bytes is None else fetched_bytes
+        self.fetched_bytes += fetched_bytes
+        self.round_trips += requests_count
+        self.shared_cache_bytes += cached_bytes
+        if requests_count:
+            self.metrics.count('requests', requests_count, handler=self.handler_name)
+            self.metrics.count('fetched_bytes', fetched_bytes, handler=self.handler_name)
+            self.metrics.observe('request_bytes', fetched_bytes, handler=self.handler_name)
+            self.metrics.observe('request_ranges', len(ranges), handler=self.handler_name)
+        if cached_bytes:
+            self.metrics.count('shared_cache_bytes', cached_bytes, handler=self.handler_name)
+        self.byte_store.add_ranges([(offset, ranges_dict.get(offset, bytes())) for offset, _ in ranges], priority, used_ranges)
+
+    def fetch_ranges(self, ranges):
+        return self.stream_handler.read_ranges(ranges, self.chunk_size)
+
+    # the shared cache needs the handler identity to tell files apart so handlers without one always read directly.
+    # the used ranges are the ranges the read completes. their cached parts are kept when the new ranges are stored
+    def read_ranges(self, ranges, priority, used_ranges=()):
+        bytes_number = self.check_fetch_budget(ranges)
+        file_identity = self.stream_handler.get_file_identity() if self.shared_cache is not None else None
+        with self.metrics.span('fetch', handler=self.handler_name):
+            if file_identity is not None:
+                ranges_dict, requests_count, fetched_bytes, cached_bytes = self.shared_cache.read_ranges(file_identity, ranges, self.fetch_ranges,
+                                                                                                            self.read_alignment)
+            else:
+                ranges_dict, requests_count, fetched_bytes, cached_bytes = self.fetch_ranges(ranges), 1, bytes_number, 0
+        self.store_ranges(ranges, ranges_dict, bytes_number, priority, requests_count, fetched_bytes, cached_bytes, used_ranges)
+
+    # the missing parts of the range, aligned to the read granularity of the handler. the file end is never requested.
+    # when the end of the enclosing box is known a missing range is read ahead toward it, since reading the box bytes
+    # that follow costs less than the request that would fetch them later
+    def get_missing_read_ranges(self, offset, bytes_number, readahead_end=None):
+        file_size = self.get_file_size()
+        bytes_number = min(bytes_number, file_size - offset)
+        missing_ranges = self.byte_store.get_missing_ranges(offset, bytes_number)
+        if missing_ranges and readahead_end is not None:
+            readahead_bytes_number = min(max(bytes_number, self.readahead_size), readahead_end - offset, file_size - offset)
+            missing_ranges = self.byte_store.get_missing_ranges(offset, max(bytes_number, readahead_bytes_number), count_access=False)
+        for missing_offset, missing_bytes_number in missing_ranges:
+            read_offset = missing_offset - missing_offset % self.read_alignment
+            read_end = min(-(-(missing_offset + missing_bytes_number) // self.read_alignment) * self.read_alignment, file_size)
+            yield read_offset, read_end - read_offset
+
+    # plans all the missing ranges together and fetches them with one vectored read.
+    # boxes and tables are reused by every extraction so they are stored with a higher priority than samples payload
+    def prefetch(self, ranges, priority=METADATA_PRIORITY, readahead_end=None):
+        ranges = list(ranges)
+        planner = RangePlanner(self.range_gap_threshold)
+        for offset, bytes_number in ranges:
+            for missing_offset, missing_bytes_number in self.get_missing_read_ranges(offset, bytes_number, readahead_end):
+                planner.add_range(missing_offset, missing_bytes_number)
+        plan = planner.get_plan()
+        if plan:
+            self.read_ranges(plan, priority, ranges)
+
+    # returns a zero copy view of the range
+    def get_bytes(self, offset, bytes_number, priority=METADATA_PRIORITY, readahead_end=None):
         self.print_verbose(f"getting {bytes_number} bytes in offset {offset}", READING_VERBOSE)
-        required_chunks_offsets = [o - o % self.chunk_size for o in range(offset, (offset + bytes_number) -
-                                                                          (offset + bytes_number) % self.chunk_size + self.chunk_size, self.chunk_size)]
-        sequence_start = -1
-        for i, required_chunk_offset in enumerate(required_chunks_offsets):
-            if required_chunk_offset not in self.chunks_mapper:
-                if sequence_start < 0:
-                    sequence_start = i
-            elif sequence_start >= 0:
-                self.read_chunks(required_chunks_offsets[sequence_start], i - sequence_start)
-                sequence_start = -1
-        if sequence_start >= 0:
-            self.read_chunks(required_chunks_offsets[sequence_start], len(required_chunks_offsets) - sequence_start)
-
-        target_chunk = self.chunks_mapper[required_chunks_offsets[0]]
-        for chunk_offset in required_chunks_offsets[1:]:
-            target_chunk += self.chunks_mapper[chunk_offset]
-        return read_bytes(target_chunk, offset % self.chunk_size, bytes_number)
+        self.prefetch([(offset, bytes_number)], priority, readahead_end)
+        # the bytes served to the parsing and the decoding, repeated reads included
+        self.metrics.count('used_bytes', bytes_number)
+        return self.byte_store.get(offset, bytes_number)
 
     def read_unsigned_long_direct(self, offset):
         target_bytes = self.get_bytes(offset, LONG_SIZE)
@@ -170,122 +251,140 @@ class FrameExtractor:
 
     def read_characters_direct(self, offset, number_of_characters):
         target_bytes = self.get_bytes(offset, number_of_characters)
-        return read_bytes(target_bytes, 0, number_of_characters)
+        return read_characters(target_bytes, 0, number_of_characters)
 
     def ensure_box_exist(self, box_name):
         if box_name not in self.boxes:
             raise BoxNotFoundException(box_name)
 
-    def get_target_key_sample(self):
-        self.ensure_box_exist('stss')
-        stss_offset = self.boxes['stss'][BOX_OFFSET_IDX]
-        table_entry_bytes = self.get_bytes(stss_offset, 16)
-        number_of_entries = read_unsigned_integer(table_entry_bytes, 12)
-        target_entry = round((self.target_frame_offset % number_of_entries) * self.target_frame_mult)
-        offset_from_start = stss_offset + 16 + target_entry * INT_SIZE
-        return self.read_unsigned_integer_direct(offset_from_start)
+    def get_sample_table(self, box_name):
+        if box_name not in self.sample_tables:
+            self.ensure_box_exist(box_name)
+            box_offset = self.boxes[box_name][BOX_OFFSET_IDX]
+            table_entry_bytes = self.get_bytes(box_offset, STSZ_ENTRIES_OFFSET)
+            if box_name == 'stsz':
+                table = create_sample_table(box_name, box_offset, read_unsigned_integer(table_entry_bytes, 16), read_unsigned_integer(table_entry_bytes, 12))
+            else:
+                table = create_sample_table(box_name, box_offset, read_unsigned_integer(table_entry_bytes, 12))
+            self.sample_tables[box_name] = table
+        return self.sample_tables[box_name]
+
+    # fetches the headers of all the tables, the media header and the sample descriptions box in one plan
+    def prefetch_tables_headers(self):
+        ranges = [(box_offset, STSZ_ENTRIES_OFFSET) for box_name, (_, box_offset) in self.boxes.items()
+                  if box_name in SAMPLE_TABLES_CLASSES and box_name not in self.sample_tables]
+        if 'mdhd' in self.boxes and self.timescale is None:
+            ranges.append((self.boxes['mdhd'][BOX_OFFSET_IDX], MDHD_V1_TIMESCALE_OFFSET + INT_SIZE))
+        if 'stsd' in self.boxes and not self.sample_descriptions:
+            stsd_size, stsd_offset = self.boxes['stsd']
+            ranges.append((stsd_offset, stsd_size))
+        self.prefetch(ranges)
+
+    def get_timescale(self):
+        if self.timescale is None:
+            self.ensure_box_exist('mdhd')
+            mdhd_bytes = self.get_bytes(self.boxes['mdhd'][BOX_OFFSET_IDX], MDHD_V1_TIMESCALE_OFFSET + INT_SIZE)
+            # version 1 headers have 64 bit creation and modification times
+            timescale_offset = MDHD_V1_TIMESCALE_OFFSET if read_unsigned_byte(mdhd_bytes, 8) == 1 else MDHD_TIMESCALE_OFFSET
+            self.timescale = read_unsigned_integer(mdhd_bytes, timescale_offset)
+        return self.timescale
+
+    # the whole stsc is needed right after the key samples so it joins their plan when it is small enough to be read whole
+    def get_stsc_prefetch_ranges(self):
+        stsc_table = self.get_sample_table('stsc')
+        if stsc_table.is_loaded() or self.boxes['stsc'][BOX_SIZE_IDX] >= self.stsc_size_threshold:
+            return []
+        return [stsc_table.get_entries_range(0, stsc_table.entries_count)]
+
+    def get_targets_key_samples(self, targets):
+        stss_table = self.get_sample_table('stss')
+        targets_entries = [round((target_frame_offset % stss_table.entries_count) * target_frame_mult)
+                           for target_frame_mult, target_frame_offset in targets]
+        self.prefetch(stss_table.get_missing_ranges((target_entry, 1) for target_entry in targets_entries) + self.get_stsc_prefetch_ranges())
+        return [stss_table.get_key_sample(self.get_bytes, target_entry) for target_entry in targets_entries]
+
+    def get_target_key_sample(self, target_frame_mult=None, target_frame_offset=None):
+        target_frame_mult = self.target_frame_mult if target_frame_mult is None else target_frame_mult
+        target_frame_offset = self.target_frame_offset if target_frame_offset is None else target_frame_offset
+        return self.get_targets_key_samples([(target_frame_mult, target_frame_offset)])[0]
 
     def get_number_of_samples(self):
-        self.ensure_box_exist('stsz')
-        stsz_offset = self.boxes['stsz'][BOX_OFFSET_IDX]
-        return self.read_unsigned_integer_direct(stsz_offset + 16)
+        return self.get_sample_table('stsz').entries_count
+
+    # sizes above the threshold require the confirmation of the user
+    def confirm_download_size(self, download_size):
+        self.stream_handler.describe_stream()
+        print(f"warning!!! download size {round(download_size/MB_SIZE, 2)} MB above download threshhold.")
+        return input("procceed?(y/n) ") != 'n'
+
+    def load_stsc_table(self):
+        stsc_table = self.get_sample_table('stsc')
+        if not stsc_table.is_loaded():
+            stsc_size = self.boxes['stsc'][BOX_SIZE_IDX]
+            if stsc_size >= self.stsc_size_limit:
+                raise StscLimitException(stsc_size)
+            stsc_table.load(self.get_bytes)
+        return stsc_table
+
+    # decodes the stsc pages of the samples. every round decodes the pages next to the known checkpoints toward the samples
+    def load_stsc_pages(self, target_samples_numbers):
+        stsc_table = self.get_sample_table('stsc')
+        stsc_table.set_totals(self.get_chunks_offsets_table().entries_count, self.get_number_of_samples())
+        pages_spans = stsc_table.get_pages_spans(target_samples_numbers)
+        while pages_spans:
+            self.prefetch(stsc_table.get_pages_ranges(pages_spans))
+            stsc_table.load_pages(self.get_bytes, pages_spans)
+            pages_spans = stsc_table.get_pages_spans(target_samples_numbers)
+        return stsc_table
 
     def get_samples_chunks(self, target_samples_numbers):
-        self.ensure_box_exist('stsc')
-        stsc_size, stsc_offset = self.boxes['stsc']
-        table_entry_bytes = self.get_bytes(stsc_offset, 16)
-        number_of_entries = read_unsigned_integer(table_entry_bytes, 12)
-        if stsc_size >= self.stsc_size_limit:
-            raise StscLimitException(stsc_size)
-        if stsc_size >= self.stsc_size_threshold:
-            ans = input(f"idiotic chunks split. {round(stsc_size / MB_SIZE, 2)} MB to read. continue?(y/n) ") != 'n'
-            if not ans:
-                raise StscLimitException(stsc_size)
-        self.get_bytes(stsc_offset, stsc_size)
-        offset_to_table = stsc_offset + 16
-        found_samples = 0
-        found_chunks = 0
-        current_target_index = 0
-        chunks_to_return = []
-        last_entry_first_chunk = None
-        last_entry_chunk_samples_number = None
-        last_entry_first_sample_number = None
-        last_entry_reference_id = None
-        for i in range(0, number_of_entries):
-            entry_bytes = self.get_bytes(offset_to_table + i * 12, 12)
-            entry_first_chunk = read_unsigned_integer(entry_bytes, 0)
-            entry_samples_per_chunk = read_unsigned_integer(entry_bytes, 4)
-            entry_reference_id = read_unsigned_integer(entry_bytes, 8)
-            if last_entry_first_chunk is not None:
-                last_chunks_count = entry_first_chunk - last_entry_first_chunk
-                additional_samples = last_entry_chunk_samples_number * last_chunks_count
-                found_samples += additional_samples
-                while current_target_index < len(target_samples_numbers) and found_samples >= target_samples_numbers[current_target_index]:
-                    target_chunk_index = ((target_samples_numbers[current_target_index] - last_entry_first_sample_number) // last_entry_chunk_samples_number) + found_chunks + 1
-                    target_chunk_first_sample = last_entry_first_sample_number + (target_chunk_index - found_chunks - 1) * last_entry_chunk_samples_number
-                    chunks_to_return.append((target_chunk_index, target_chunk_first_sample, last_entry_reference_id))
-                    current_target_index += 1
-                if current_target_index == len(target_samples_numbers):
-                    break
-                found_chunks += last_chunks_count
-            last_entry_first_chunk = entry_first_chunk
-            last_entry_chunk_samples_number = entry_samples_per_chunk
-            last_entry_first_sample_number = found_samples + 1
-            last_entry_reference_id = entry_reference_id
-
-        while current_target_index < len(target_samples_numbers):
-            target_chunk_index = ((target_samples_numbers[current_target_index] - last_entry_first_sample_number) // last_entry_chunk_samples_number) + found_chunks + 1
-            target_chunk_first_sample = last_entry_first_sample_number + (target_chunk_index - found_chunks - 1) * last_entry_chunk_samples_number
-            chunks_to_return.append((target_chunk_index, target_chunk_first_sample, last_entry_reference_id))
-            current_target_index += 1
-        return chunks_to_return
+        # a loaded table, like the tables of a shared index, is never changed by the lookups
+        stsc_table = self.get_sample_table('stsc')
+        if not stsc_table.is_loaded() and self.boxes['stsc'][BOX_SIZE_IDX] < self.stsc_size_threshold:
+            self.load_stsc_table()
+        elif not stsc_table.is_loaded():
+            self.load_stsc_pages(target_samples_numbers)
+        return [stsc_table.get_sample_chunk(target_sample_number) for target_sample_number in target_samples_numbers]
 
     def get_samples_sizes_and_chunks_offsets(self, target_chunks, target_samples_numbers):
-        self.ensure_box_exist('stsz')
-        stsz_offset = self.boxes['stsz'][BOX_OFFSET_IDX]
-        samples_to_ret = []
-        for target_chunk, target_sample_number in zip(target_chunks, target_samples_numbers):
-            offset_in_chunk = 0
-            target_chunk_samples_entries_bytes = self.get_bytes(
-                stsz_offset + 20 + INT_SIZE * (target_chunk[CHUNK_FIRST_SAMPLE_IDX] - 1),
-                (target_sample_number - target_chunk[CHUNK_FIRST_SAMPLE_IDX] + 1) * INT_SIZE)
-            for i in range(0, target_sample_number - target_chunk[CHUNK_FIRST_SAMPLE_IDX] + 1):
-                entry_sample_size = read_unsigned_integer(target_chunk_samples_entries_bytes, INT_SIZE * i)
-                if i + target_chunk[CHUNK_FIRST_SAMPLE_IDX] == target_sample_number:
-                    samples_to_ret.append(
-                        (i + target_chunk[CHUNK_FIRST_SAMPLE_IDX], offset_in_chunk, entry_sample_size))
-                offset_in_chunk += entry_sample_size
-        return samples_to_ret
-
-    def get_chunks_offsets(self, target_chunks):
+        stsz_table = self.get_sample_table('stsz')
+        chunks_samples = [(target_chunk[CHUNK_FIRST_SAMPLE_IDX], target_sample_number) for target_chunk, target_sample_number in
+                          zip(target_chunks, target_samples_numbers)]
+        samples_offsets_in_chunks = stsz_table.get_samples_offsets_in_chunks(self.get_bytes, chunks_samples)
+        return [(target_sample_number, offset_in_chunk, sample_size) for target_sample_number, (offset_in_chunk, sample_size) in
+                zip(target_samples_numbers, samples_offsets_in_chunks)]
+
+    def get_chunks_offsets_table(self):
         atom_to_use = 'stco'
         if 'stco' not in self.boxes:
             if 'co64' not in self.boxes:
                 raise BoxNotFoundException('stco', 'co64')
             atom_to_use = 'co64'
-        stco_offset = self.boxes[atom_to_use][BOX_OFFSET_IDX]
-        offsets_to_return = []
-        for target_chunk in target_chunks:
-            if atom_to_use == 'stco':
-                offsets_to_return.append(
-                    self.read_unsigned_integer_direct(stco_offset + 16 + (target_chunk[CHUNK_NUMBER_IDX] - 1) * INT_SIZE))
-            else:
-                offsets_to_return.append(
-                    self.read_unsigned_long_direct(stco_offset + 16 + (target_chunk[CHUNK_NUMBER_IDX] - 1) * LONG_SIZE))
-        return offsets_to_return
+        return self.get_sample_table(atom_to_use)
 
-    def get_target_sample_description_box(self, target_sample_id):
+    def get_chunks_offsets(self, target_chunks):
+        chunks_offsets_table = self.get_chunks_offsets_table()
+        return chunks_offsets_table.get_chunks_offsets(self.get_bytes, [target_chunk[CHUNK_NUMBER_IDX] for target_chunk in target_chunks])
+
+    # the stsz and stco entries of the target chunks are fetched in one plan
+    def prefetch_chunks_entries(self, target_chunks, target_samples_numbers):
+        chunks_samples = [(target_chunk[CHUNK_FIRST_SAMPLE_IDX], target_sample_number) for target_chunk, target_sample_number in
+                          zip(target_chunks, target_samples_numbers)]
+        self.prefetch(self.get_sample_table('stsz').get_samples_ranges(chunks_samples) +
+                      self.get_chunks_offsets_table().get_chunks_ranges([target_chunk[CHUNK_NUMBER_IDX] for target_chunk in target_chunks]))
+
+    # yields (description data index, sample entry box) of the entries of the stsd
+    def iterate_sample_entries(self):
         self.ensure_box_exist('stsd')
         stsd_size, stsd_offset = self.boxes['stsd']
-        offset_in_box = 16
-        while offset_in_box < stsd_size:
-            entry_bytes = self.get_bytes(stsd_offset + offset_in_box, 16)
-            entry_size = read_unsigned_integer(entry_bytes, 0)
-            entry_type = read_bytes(entry_bytes, 4, 4)
-            entry_id = read_unsigned_short(entry_bytes, 14)
+        stsd = self.get_box_tree().get_box_at(stsd_offset, stsd_offset + stsd_size, STSD_ENTRIES_OFFSET)
+        for entry in self.box_tree.iterate_children(stsd):
+            yield self.read_unsigned_short_direct(entry.offset + 14), entry
+
+    def get_target_sample_description_box(self, target_sample_id):
+        for entry_id, entry in self.iterate_sample_entries():
             if entry_id == target_sample_id:
-                return entry_size, stsd_offset + offset_in_box, entry_type.decode(encoding='UTF-8')
-            offset_in_box += entry_size
+                return entry.size, entry.offset, entry.box_type
         raise SampleDescriptionDataNotFoundException(target_sample_id)
 
     def detect_codec(self, vsd_type):
@@ -294,132 +393,555 @@ class FrameExtractor:
                 return codec
         return None
 
+    def read_codec_data(self, vsd_type, vsd_offs, vsd_size):
+        video_codec = self.detect_codec(vsd_type)
+        if video_codec is None:
+            return bytes()
+        sample_entry = self.get_box_tree().get_box_at(vsd_offs, vsd_offs + vsd_size, VISUAL_SAMPLE_ENTRY_CHILDREN_OFFSET)
+        codec_box = self.box_tree.find_child(sample_entry, video_codec.get_extension_name())
+        if codec_box is None:
+            return bytes()
+        return bytes(self.get_bytes(codec_box.offset + codec_box.header_size, codec_box.size - codec_box.header_size))
+
+    # returns (sample entry type, codec private box data, width, height)
+    def read_sample_description(self, vsd_type, vsd_offs, vsd_size):
+        dimensions_bytes = self.get_bytes(vsd_offs + VISUAL_SAMPLE_ENTRY_WIDTH_OFFSET, SHORT_SIZE * 2)
+        return vsd_type, self.read_codec_data(vsd_type, vsd_offs, vsd_size), read_unsigned_short(dimensions_bytes, 0), \
+            read_unsigned_short(dimensions_bytes, SHORT_SIZE)
+
+    def get_sample_description(self, description_data_id):
+        if description_data_id not in self.sample_descriptions:
+            vsd_size, vsd_offs, vsd_type = self.get_target_sample_description_box(description_data_id)
+            self.sample_descriptions[description_data_id] = self.read_sample_description(vsd_type, vsd_offs, vsd_size)
+        return self.sample_descriptions[description_data_id]
+
+    def load_sample_descriptions(self):
+        for entry_id, entry in self.iterate_sample_entries():
+            if entry_id not in self.sample_descriptions:
+                self.sample_descriptions[entry_id] = self.read_sample_description(entry.box_type, entry.offset, entry.size)
+
+    # reads the whole sample tables and sample descriptions so the index can be served without the moov box.
+    # an stsc above the size limit is left out and every extraction decodes the pages it needs
+    def load_index(self):
+        for box_name in self.boxes:
+            if box_name == 'stsc':
+                if self.boxes['stsc'][BOX_SIZE_IDX] < self.stsc_size_limit:
+                    self.load_stsc_table()
+            elif box_name in SAMPLE_TABLES_CLASSES:
+                self.get_sample_table(box_name).load(self.get_bytes)
+        if 'mdhd' in self.boxes:
+            self.get_timescale()
+        self.load_sample_descriptions()
+
+    # the moov box is at the start or at the end of most files, so both windows are fetched in the first read.
+    # walking the top level boxes then jumps over the mdat straight into the tail window
+    def probe_file_ends(self):
+        if self.probe_window_size:
+            window_size = min(self.probe_window_size, self.get_file_size())
+            self.prefetch([(0, window_size), (self.get_file_size() - window_size, window_size)])
+
     def find_boxes(self):
-        moov_size, moov_offs, _ = self.find_box('moov', 0, self.get_file_size())
-        if moov_size == 0:
-            raise BoxNotFoundException('moov')
-        moov_end = moov_offs + moov_size + 4
-        video_found, mdia_offs, mdia_size, video_trak = self.look_for_video_trak(moov_offs + 8, moov_end)
-        if not video_found:
-            raise VideoTrakNotFoundException()
+        self.probe_file_ends()
+        box_tree = self.get_box_tree()
+        moov = self.find_child_box(box_tree.root, 'moov')
+        self.moov_round_trips = self.round_trips
+        self.print_verbose(f"moov found after {self.moov_round_trips} round trips", ALG_VARS_VERBOSE)
+        video_trak, trak = self.look_for_video_trak(moov)
         self.print_verbose('Video Trak Number %d found' % video_trak, BOX_FINDERS_VERBOSE)
-        minf_size, minf_offs, _ = self.find_box('minf', mdia_offs + 8, mdia_offs + mdia_size)
-        if minf_size == 0:
-            raise BoxNotFoundException('minf')
-        stbl_size, stbl_offs, _ = self.find_box('stbl', minf_offs + 8, minf_offs + minf_size)
-        if stbl_size == 0:
-            raise BoxNotFoundException('stbl')
-
-        stsd_size, stsd_offs, _ = self.find_box('stsd', stbl_offs + 8, stbl_offs + stbl_size)
-        if stsd_size == 0:
-            raise BoxNotFoundException('stsd')
-        self.boxes['stsd'] = (stsd_size, stsd_offs)
-        stss_size, stss_offs, _ = self.find_box('stss', stbl_offs + 8, stbl_offs + stbl_size)
-        if stss_size == 0:
-            raise BoxNotFoundException('stss')
-        self.boxes['stss'] = (stss_size, stss_offs)
-        stsc_size, stsc_offs, _ = self.find_box('stsc', stbl_offs + 8, stbl_offs + stbl_size)
-        if stsc_size == 0:
-            raise BoxNotFoundException('stsc')
-        self.boxes['stsc'] = (stsc_size, stsc_offs)
-        stsz_size, stsz_offs, _ = self.find_box('stsz', stbl_offs + 8, stbl_offs + stbl_size)
-        if stsz_size == 0:
-            raise BoxNotFoundException('stsz')
-        self.boxes['stsz'] = (stsz_size, stsz_offs)
-        stco_size, stco_offs, _ = self.find_box('stco', stbl_offs + 8, stbl_offs + stbl_size)
-        if stco_size == 0:
-            co64_size, co64_offs, _ = self.find_box('co64', stbl_offs + 8, stbl_offs + stbl_size)
-            if co64_size == 0:
-                raise BoxNotFoundException('stco', 'co64')
-            self.boxes['co64'] = (co64_size, co64_offs)
-        else:
-            self.boxes['stco'] = (stco_size, stco_offs)
+        mdia = self.find_child_box(trak, 'mdia')
+        # the media header and the time tables are only needed for seeking by time
+        mdhd = box_tree.find_child(mdia, 'mdhd')
+        if mdhd is not None:
+            self.set_box('mdhd', mdhd)
+        stbl = self.find_child_box(self.find_child_box(mdia, 'minf'), 'stbl')
+        self.set_box('stsd', self.find_child_box(stbl, 'stsd'))
+        # fragmented files keep their samples in moof boxes and the sample tables of the moov are empty
+        mvex = box_tree.find_child(moov, 'mvex')
+        if mvex is not None:
+            self.find_fragments_boxes(trak, mvex)
+            return
+        for box_name in ('stss', 'stsc', 'stsz'):
+            self.set_box(box_name, self.find_child_box(stbl, box_name))
+        chunks_offsets_box = box_tree.find_child(stbl, 'stco') or box_tree.find_child(stbl, 'co64')
+        if chunks_offsets_box is None:
+            raise BoxNotFoundException('stco', 'co64')
+        self.set_box(chunks_offsets_box.box_type, chunks_offsets_box)
+        for time_box_name in ('stts', 'ctts'):
+            time_box = box_tree.find_child(stbl, time_box_name)
+            if time_box is not None:
+                self.set_box(time_box_name, time_box)
+
+    def find_fragments_boxes(self, trak, mvex):
+        box_tree = self.get_box_tree()
+        tkhd = self.find_child_box(trak, 'tkhd')
+        tkhd_bytes = self.get_bytes(tkhd.offset, TKHD_V1_TRACK_ID_OFFSET + INT_SIZE)
+        # version 1 headers have 64 bit creation and modification times
+        self.track_id = read_unsigned_integer(tkhd_bytes, TKHD_V1_TRACK_ID_OFFSET if read_unsigned_byte(tkhd_bytes, 8) == 1 else TKHD_TRACK_ID_OFFSET)
+        self.trex_defaults = (1, 0, 0)
+        for trex in box_tree.get_children(mvex, 'trex'):
+            trex_bytes = self.get_bytes(trex.offset, 32)
+            if read_unsigned_integer(trex_bytes, 12) == self.track_id:
+                self.trex_defaults = (read_unsigned_integer(trex_bytes, 16), read_unsigned_integer(trex_bytes, 24), read_unsigned_integer(trex_bytes, 20))
+                break
+        # the mfro box ends the file and holds the size of the mfra box
+        mfro_bytes = self.get_bytes(self.get_file_size() - MFRO_SIZE, MFRO_SIZE)
+        if read_characters(mfro_bytes, 4, 4) != b'mfro':
+            raise BoxNotFoundException('mfro')
+        mfra = box_tree.get_box_at(self.get_file_size() - read_unsigned_integer(mfro_bytes, 12), self.get_file_size())
+        if mfra is None or mfra.box_type != 'mfra':
+            raise BoxNotFoundException('mfra')
+        for tfra in box_tree.iterate_children(mfra):
+            if tfra.box_type == 'tfra' and read_unsigned_integer(self.get_bytes(tfra.offset + 12, INT_SIZE), 0) == self.track_id:
+                self.set_box('tfra', tfra)
+                return
+        raise BoxNotFoundException('tfra')
+
+    def is_fragmented(self):
+        return 'tfra' in self.boxes
+
+    def get_fragments_table(self):
+        if 'tfra' not in self.sample_tables:
+            tfra_offset = self.boxes['tfra'][BOX_OFFSET_IDX]
+            tfra_header_bytes = self.get_bytes(tfra_offset, TFRA_HEADER_SIZE)
+            self.sample_tables['tfra'] = TrackFragmentRandomAccessTable(tfra_offset, read_unsigned_integer(tfra_header_bytes, 20),
+                                                                        read_unsigned_byte(tfra_header_bytes, 8),
+                                                                        read_unsigned_integer(tfra_header_bytes, 16))
+        return self.sample_tables['tfra']
+
+    # returns the (time, moof offset, traf number, trun number, sample number) random access samples of the tfra entries and
+    # moof offset -> (description data index, samples of the track fragment, index of the random access sample in them) per sample.
+    # the headers of all the moof boxes and then the whole boxes are fetched in one plan each and only the trafs of the video track are parsed
+    def read_random_access_fragments(self, tfra_entries):
+        tfra_table = self.get_fragments_table()
+        self.prefetch(tfra_table.get_missing_ranges((tfra_entry, 1) for tfra_entry in tfra_entries))
+        random_access_samples = [tfra_table.get_random_access_sample(self.get_bytes, tfra_entry) for tfra_entry in tfra_entries]
+        self.print_verbose(f"target random access samples(time, moof offset, traf, trun, sample): {random_access_samples}", ALG_VARS_VERBOSE)
+        moofs_offsets = sorted(set(random_access_sample[1] for random_access_sample in random_access_samples))
+        self.prefetch([(moof_offset, 8) for moof_offset in moofs_offsets])
+        moofs_sizes = {moof_offset: read_unsigned_integer(self.get_bytes(moof_offset, 8), 0) for moof_offset in moofs_offsets}
+        self.prefetch([(moof_offset, moofs_sizes[moof_offset]) for moof_offset in moofs_offsets])
+        fragments = []
+        for _, moof_offset, _, trun_number, sample_number in random_access_samples:
+            track_fragment = parse_track_fragment(self.get_bytes(moof_offset, moofs_sizes[moof_offset]), moof_offset, self.track_id,
+                                                  self.trex_defaults)
+            if track_fragment is None:
+                raise BoxNotFoundException('traf')
+            description_data_id, truns_samples = track_fragment
+            key_index = sum(len(trun_samples) for trun_samples in truns_samples[:trun_number - 1]) + sample_number - 1
+            fragments.append((description_data_id, [sample for trun_samples in truns_samples for sample in trun_samples], key_index))
+        return random_access_samples, fragments
+
+    # jumps from the random access entries of the targets straight to their moof boxes.
+    # the samples after a key frame are taken from its track fragment.
+    # returns (description data index, target samples) per target in the order of the targets
+    def collect_fragmented_targets_samples(self, targets):
+        tfra_table = self.get_fragments_table()
+        targets_entries = [round((target_frame_offset % tfra_table.entries_count) * target_frame_mult)
+                           for target_frame_mult, target_frame_offset in targets]
+        # the samples count of the file is unknown without every moof, so the frames limit from the end is counted in the fragment
+        # of the last random access entry, which joins the plans of the targets
+        last_entries = [tfra_table.entries_count - 1] if self.frames_limit_from_end else []
+        random_access_samples, fragments = self.read_random_access_fragments(targets_entries + last_entries)
+        last_moof_offset = random_access_samples[-1][1] if last_entries else None
+        targets_samples = []
+        for (_, moof_offset, _, _, _), (description_data_id, fragment_samples, key_index) in zip(random_access_samples, fragments[:len(targets)]):
+            end_index = min(key_index + self.frames_after + 1, len(fragment_samples))
+            if moof_offset == last_moof_offset:
+                end_index = max(key_index + 1, min(end_index, len(fragment_samples) - self.frames_limit_from_end))
+            targets_samples.append((description_data_id, [(sample_index + 1, fragment_samples[sample_index][0], fragment_samples[sample_index][1])
+                                                          for sample_index in range(key_index, end_index)]))
+        return targets_samples
+
+    # the tfra holds the presentation times of the key samples so a time seek reads the whole tfra and a single moof box.
+    # the times of the samples after the key sample are summed from the durations and the composition offsets of their truns.
+    # returns the description data index, the target samples and the index of the target frame among their decoded frames
+    def collect_fragmented_time_target_samples(self, target_time):
+        tfra_table = self.get_fragments_table()
+        if not tfra_table.is_loaded():
+            tfra_table.load(self.get_bytes)
+        key_entry = max(bisect_right(self.get_keys_times(), target_time) - 1, 0)
+        # the samples of the track fragment up to the next random access sample when it is in the same track fragment
+        tfra_entries = [key_entry]
+        if key_entry + 1 < tfra_table.entries_count and \
+                tfra_table.get_random_access_sample(self.get_bytes, key_entry + 1)[1:3] == tfra_table.get_random_access_sample(self.get_bytes, key_entry)[1:3]:
+            tfra_entries.append(key_entry + 1)
+        random_access_samples, fragments = self.read_random_access_fragments(tfra_entries)
+        key_time = random_access_samples[0][0]
+        description_data_id, fragment_samples, key_index = fragments[0]
+        next_key_index = fragments[1][2] if len(fragments) > 1 else len(fragment_samples)
+        samples_times = {}
+        decode_time = key_time - fragment_samples[key_index][3]
+        for sample_index in range(key_index, next_key_index):
+            _, _, sample_duration, composition_offset = fragment_samples[sample_index]
+            samples_times[sample_index + 1] = decode_time + composition_offset
+            decode_time += sample_duration
+        target_samples_numbers, frame_index = self.get_presented_samples(samples_times, key_index + 1, target_time)
+        return description_data_id, [(n, *fragment_samples[n - 1][:2]) for n in target_samples_numbers], frame_index
+
+    def get_cache_file_identity(self):
+        return self.stream_handler.get_file_identity() if self.index_cache is not None else None
+
+    # returns whether the index was served by the index cache
+    def load_cached_index(self):
+        file_identity = self.get_cache_file_identity()
+        cached_index = self.index_cache.load(file_identity) if file_identity is not None else None
+        if file_identity is not None:
+            self.metrics.count('index_cache_lookups', hit=cached_index is not None)
+        if cached_index is None:
+            return False
+        self.print_verbose("using cached index", ALG_VARS_VERBOSE)
+        self.boxes, self.sample_tables, self.sample_descriptions, self.timescale = cached_index
+        return True
+
+    def build_index(self):
+        self.find_boxes()
+        file_identity = self.get_cache_file_identity()
+        # the index of fragmented files is spread over the moof boxes so only regular files are cached
+        if file_identity is not None and not self.is_fragmented():
+            self.load_index()
+            self.index_cache.store(file_identity, self.boxes, self.get_index_sample_tables(), self.sample_descriptions, self.timescale)
+
+    # the whole tables of the index. the tables decoded in pages belong to this extractor only
+    def get_index_sample_tables(self):
+        return {box_name: table for box_name, table in self.sample_tables.items() if table.is_loaded()}
+
+    # serves the extractions from a shared index instead of reading the moov box
+    def use_track_index(self, track_index):
+        self.boxes, self.sample_descriptions = track_index.boxes, track_index.sample_descriptions
+        # the shared tables are never changed by the lookups. the tables missing from the index, like a big stsc, are added to this copy
+        self.sample_tables = dict(track_index.sample_tables)
+        self.timescale, self.keys_times = track_index.timescale, track_index.keys_times
+        self.track_id, self.trex_defaults = track_index.track_id, track_index.trex_defaults
+        self.file_size = track_index.file_size
+        self.initiated = True
+
+    # reads the whole index of the video track. the extractors created with it skip the moov box and every table read
+    def build_track_index(self):
+        if not self.initiated:
+            self.init()
+        self.load_index()
+        if self.is_fragmented():
+            self.get_fragments_table().load(self.get_bytes)
+        if self.is_fragmented() or ('stss' in self.sample_tables and 'stts' in self.sample_tables):
+            self.get_keys_times()
+        return TrackIndex(self.get_file_size(), self.boxes, self.get_index_sample_tables(), self.sample_descriptions, self.timescale, self.track_id,
+                          self.trex_defaults, self.keys_times)
 
     def init(self):
         self.print_verbose("initiating...", ALG_VARS_VERBOSE)
-        self.find_boxes()
+        if not self.load_cached_index():
+            with self.metrics.span('find_boxes'):
+                self.build_index()
         self.initiated = True
 
-    def collect_target_samples(self):
-        target_sample_number = self.get_target_key_sample()
-        self.print_verbose(f"target sample number: {target_sample_number}", ALG_VARS_VERBOSE)
-        number_of_samples = self.get_number_of_samples()
-        self.print_verbose(f"video samples count: {number_of_samples}", ALG_VARS_VERBOSE)
-        target_samples_numbers = [n for n in range(target_sample_number, max(target_sample_number + 1,
-                                                                             min(number_of_samples - self.frames_limit_from_end,
-                                                                                 target_sample_number + self.frames_after) + 1))]
-        self.print_verbose(f"target samples: {target_samples_numbers}", ALG_VARS_VERBOSE)
-        self.print_verbose(f"targeting {len(target_samples_numbers)} samples", ALG_VARS_VERBOSE)
+    def get_target_samples_numbers(self, target_sample_number, number_of_samples):
+        return [n for n in range(target_sample_number, max(target_sample_number + 1,
+                                                           min(number_of_samples - self.frames_limit_from_end,
+                                                               target_sample_number + self.frames_after) + 1))]
+
+    # resolves sorted samples numbers to (sample number, offset in file, sample size) and the description data index of their chunks
+    def resolve_samples(self, target_samples_numbers):
         target_chunks = self.get_samples_chunks(target_samples_numbers)
         self.print_verbose(f"target chunks(chunk number, chunk first sample, chunk description data index): {target_chunks}", ALG_VARS_VERBOSE)
+        self.prefetch_chunks_entries(target_chunks, target_samples_numbers)
         target_samples = self.get_samples_sizes_and_chunks_offsets(target_chunks, target_samples_numbers)
         self.print_verbose(f"target samples(sample number, offset in chunk, sample size): {target_samples}", ALG_VARS_VERBOSE)
         target_chunks_offsets = self.get_chunks_offsets(target_chunks)
         self.print_verbose(f"target chunks offsets(chunk number, chunk offset): {list(zip(map(lambda c: c[CHUNK_NUMBER_IDX], target_chunks), target_chunks_offsets))}", ALG_VARS_VERBOSE)
 
-        return target_chunks[0][CHUNK_DESCRIPTION_DATA_IDX], \
+        return [target_chunk[CHUNK_DESCRIPTION_DATA_IDX] for target_chunk in target_chunks], \
             [(target_sample_number, chunk_offset + target_sample_offset_in_chunk, target_sample_size) for
                 ((target_sample_number, target_sample_offset_in_chunk, target_sample_size), chunk_offset) in
                 zip(target_samples, target_chunks_offsets)]
 
-    def retrieve_and_decode_samples_bytes(self, target_samples, description_data_id):
-        vsd_size, vsd_offs, vsd_type = self.get_target_sample_description_box(description_data_id)
+    def collect_target_samples(self):
+        if self.is_fragmented():
+            return self.collect_fragmented_targets_samples([(self.target_frame_mult, self.target_frame_offset)])[0]
+        self.prefetch_tables_headers()
+        target_sample_number = self.get_target_key_sample()
+        self.print_verbose(f"target sample number: {target_sample_number}", ALG_VARS_VERBOSE)
+        number_of_samples = self.get_number_of_samples()
+        self.print_verbose(f"video samples count: {number_of_samples}", ALG_VARS_VERBOSE)
+        target_samples_numbers = self.get_target_samples_numbers(target_sample_number, number_of_samples)
+        self.print_verbose(f"target samples: {target_samples_numbers}", ALG_VARS_VERBOSE)
+        self.print_verbose(f"targeting {len(target_samples_numbers)} samples", ALG_VARS_VERBOSE)
+        descriptions_ids, target_samples = self.resolve_samples(target_samples_numbers)
+        return descriptions_ids[0], target_samples
+
+    # resolves the samples of many key frame targets in one sorted pass over the sample tables.
+    # returns (description data index, target samples) per target in the order of the targets
+    def collect_targets_samples(self, targets):
+        if self.is_fragmented():
+            return self.collect_fragmented_targets_samples(targets)
+        self.prefetch_tables_headers()
+        number_of_samples = self.get_number_of_samples()
+        self.print_verbose(f"video samples count: {number_of_samples}", ALG_VARS_VERBOSE)
+        targets_samples_numbers = []
+        for (target_frame_mult, target_frame_offset), target_sample_number in zip(targets, self.get_targets_key_samples(targets)):
+            self.print_verbose(f"target ({target_frame_mult}, {target_frame_offset}) sample number: {target_sample_number}", ALG_VARS_VERBOSE)
+            targets_samples_numbers.append(self.get_target_samples_numbers(target_sample_number, number_of_samples))
+        all_samples_numbers = sorted(set(n for target_samples_numbers in targets_samples_numbers for n in target_samples_numbers))
+        self.print_verbose(f"targeting {len(all_samples_numbers)} samples for {len(targets)} targets", ALG_VARS_VERBOSE)
+        descriptions_ids, all_samples = self.resolve_samples(all_samples_numbers)
+        samples_by_number = {sample[SAMPLE_NUMBER_IDX]: (description_id, sample) for description_id, sample in zip(descriptions_ids, all_samples)}
+        targets_samples = []
+        for target_samples_numbers in targets_samples_numbers:
+            targets_samples.append((samples_by_number[target_samples_numbers[0]][0],
+                                    [samples_by_number[n][1] for n in target_samples_numbers]))
+        return targets_samples
+
+    # loads the stss and the time tables whole, with the media header and the stsc when it is small, in one plan
+    def load_time_index(self):
+        self.ensure_box_exist('mdhd')
+        self.ensure_box_exist('stts')
+        self.prefetch_tables_headers()
+        tables = [self.get_sample_table(box_name) for box_name in ('stss', 'stts', 'ctts') if box_name in self.boxes]
+        self.prefetch([table.get_entries_range(0, table.entries_count) for table in tables if not table.is_loaded()] +
+                      self.get_stsc_prefetch_ranges())
+        for table in tables:
+            if not table.is_loaded():
+                table.load(self.get_bytes)
+
+    def get_presentation_time(self, sample_number):
+        composition_offset = self.sample_tables['ctts'].get_sample_offset(sample_number) if 'ctts' in self.sample_tables else 0
+        return self.sample_tables['stts'].get_sample_time(sample_number) + composition_offset
+
+    def get_keys_times(self):
+        if self.keys_times is None:
+            if self.is_fragmented():
+                self.keys_times = array(SIGNED_LONG_TYPECODE, self.get_fragments_table().get_times())
+            else:
+                self.keys_times = array(SIGNED_LONG_TYPECODE, (self.get_presentation_time(key_sample) for key_sample in self.sample_tables['stss'].entries))
+        return self.keys_times
+
+    # returns the samples from the key sample presented at or before the time up to the sample presented at the time, in decoding
+    # order, and the index of the target frame among their frames in presentation order, which is the order decoders output frames
+    def get_time_target_samples_numbers(self, target_time):
+        key_samples = self.sample_tables['stss'].entries
+        key_index = max(bisect_right(self.get_keys_times(), target_time) - 1, 0)
+        key_sample = key_samples[key_index]
+        next_key_sample = key_samples[key_index + 1] if key_index + 1 < len(key_samples) else self.get_number_of_samples() + 1
+        return self.get_presented_samples({n: self.get_presentation_time(n) for n in range(key_sample, next_key_sample)}, key_sample, target_time)
+
+    # returns the samples from the key sample up to the sample presented at the time and the index of the target frame among their frames.
+    # samples_times are sample number -> presentation time of the samples of the key sample group
+    @staticmethod
+    def get_presented_samples(samples_times, key_sample, target_time):
+        presented_samples = [n for n, presentation_time in samples_times.items() if presentation_time <= target_time]
+        target_sample = max(presented_samples, key=samples_times.get) if presented_samples else key_sample
+        target_samples_numbers = list(range(key_sample, target_sample + 1))
+        frame_index = sum(samples_times[n] < samples_times[target_sample] for n in target_samples_numbers)
+        return target_samples_numbers, frame_index
+
+    # returns the description data index, the target samples and the index of the target frame among their decoded frames
+    def collect_time_target_samples(self, seconds):
+        if self.is_fragmented():
+            target_time = round(seconds * self.get_timescale())
+            self.print_verbose(f"target time: {target_time} (timescale {self.get_timescale()})", ALG_VARS_VERBOSE)
+            return self.collect_fragmented_time_target_samples(target_time)
+        self.load_time_index()
+        target_time = round(seconds * self.get_timescale())
+        self.print_verbose(f"target time: {target_time} (timescale {self.get_timescale()})", ALG_VARS_VERBOSE)
+        target_samples_numbers, frame_index = self.get_time_target_samples_numbers(target_time)
+        self.print_verbose(f"target samples: {target_samples_numbers}. target frame index: {frame_index}", ALG_VARS_VERBOSE)
+        descriptions_ids, target_samples = self.resolve_samples(target_samples_numbers)
+        return descriptions_ids[0], target_samples, frame_index
+
+    # downloads the byte spans of all the targets samples together after checking the total size against the limits
+    def download_samples(self, targets_samples):
+        spans = merge_entries_spans((target_samples[0][SAMPLE_OFFSET_IN_FILE_IDX],
+                                     target_samples[-1][SAMPLE_OFFSET_IN_FILE_IDX] + target_samples[-1][SAMPLE_SIZE_IDX] - 1)
+                                    for target_samples in targets_samples)
+        download_size = sum(last - first + 1 for first, last in spans)
+        if download_size >= self.download_limit:
+            raise DownloadLimitException(download_size)
+        elif download_size > self.download_threshold and not self.confirm_download_size(download_size):
+            raise DownloadLimitException(download_size)
+        self.prefetch([(first, last - first + 1) for first, last in spans], PAYLOAD_PRIORITY)
+
+    def convert_samples_packets(self, target_samples, description_data_id):
+        vsd_type, codec_data, _, _ = self.get_sample_description(description_data_id)
         video_codec = self.detect_codec(vsd_type)
         if video_codec is None:
             raise CodecNotSupportedException(vsd_type)
         self.print_verbose(f'using codec: {video_codec.get_name()}', ALG_VARS_VERBOSE)
-        codec_size, codec_offs, _ = self.find_box(video_codec.get_extension_name(), vsd_offs + 86, vsd_offs + vsd_size)
-        nals_number, codec_private_bytes = video_codec.get_private_data(self.get_bytes(codec_offs + 8, codec_size - 8))
-        samples_converted_packets = bytes()
-        min_byte = target_samples[0][SAMPLE_OFFSET_IN_FILE_IDX]
-        max_byte = target_samples[-1][SAMPLE_OFFSET_IN_FILE_IDX] + target_samples[-1][SAMPLE_SIZE_IDX]
-        download_size = max_byte - min_byte
-        if download_size >= self.download_limit:
-            raise DownloadLimitException(download_size)
-        elif download_size > self.download_threshold:
-            self.stream_handler.describe_stream()
-            print(f"warning!!! download size {round(download_size/MB_SIZE, 2)} MB above download threshhold.")
-            ans = input("procceed?(y/n) ") != 'n'
-            if not ans:
-                raise DownloadLimitException(download_size)
-        self.get_bytes(min_byte, download_size)
+        nals_number, codec_private_bytes = video_codec.get_private_data(codec_data)
+        # the private data and the packets are written to one bytearray instead of concatenating copies
+        converted_samples_packets = bytearray(codec_private_bytes)
         for sample_number, sample_offset_in_file, sample_size in target_samples:
-            sample_packet = self.get_bytes(sample_offset_in_file, sample_size)
-            conevrted_sample_packet = video_codec.decode_packet(sample_packet, sample_size, nals_number)
-            samples_converted_packets += conevrted_sample_packet
-        converted_samples_packets_with_extradata = combine_packet_with_codec_private_data(samples_converted_packets, codec_private_bytes)
-        return converted_samples_packets_with_extradata
-
-    def save_packets_and_extract_last_frame(self, samples_valid_packets):
-        with open("tmp.mp4", "wb") as fw:
-            fw.write(samples_valid_packets)
+            sample_packet = self.get_bytes(sample_offset_in_file, sample_size, PAYLOAD_PRIORITY)
+            video_codec.write_packet(converted_samples_packets, sample_packet, sample_size, nals_number)
+        return converted_samples_packets
+
+    def retrieve_and_decode_samples_bytes(self, target_samples, description_data_id):
+        self.download_samples([target_samples])
+        return self.convert_samples_packets(target_samples, description_data_id)
+
+    def get_decoder(self):
+        if self.decoder is None:
+            self.decoder = get_available_decoder(self.decoders)
+        if self.decoder is None:
+            raise PacketsReaderException('no frame decoder is available')
+        return self.decoder
+
+    # the frame index counts the decoded frames in presentation order. -1 is the last frame
+    def decode_frame(self, samples_valid_packets, description_data_id, frame_index=-1):
+        vsd_type, _, width, height = self.get_sample_description(description_data_id)
+        decoder = self.get_decoder()
+        self.print_verbose(f'decoding with {decoder.get_name()}', ALG_VARS_VERBOSE)
         try:
-            vidcap = cv2.VideoCapture('tmp.mp4')
-            success, image_toshow = vidcap.read()
-            while success:
-                success, tmp_image_to_show = vidcap.read()
-                if success:
-                    image_toshow = tmp_image_to_show
+            with self.metrics.span('decode', decoder=decoder.get_name()):
+                frame = decoder.decode_frame(samples_valid_packets, self.detect_codec(vsd_type), width, height, frame_index)
         except Exception as e:
-            os.remove('tmp.mp4')
             raise PacketsReaderException(str(e))
-        os.remove('tmp.mp4')
-        cv2.imwrite(self.stream_handler.get_file_name(), image_toshow)
+        if frame is None:
+            raise PacketsReaderException('no frame was decoded from the packets')
+        return frame
+
+    # returns the frame, its encoded bytes or a message with the file the frame was written to, by the frame output
+    def output_frame(self, frame, dst_file_name=None):
+        if self.frame_output == ARRAY_FRAME_OUTPUT:
+            return frame
+        # opencv is imported only to encode, since importing it dominates the startup of short lived workers
+        import cv2
+        if self.frame_output == ENCODED_FRAME_OUTPUT:
+            with self.metrics.span('encode', output=self.frame_output):
+                success, encoded_image = cv2.imencode(self.encoded_image_extension, frame)
+            if not success:
+                raise PacketsReaderException(f'could not encode the frame as {self.encoded_image_extension}')
+            return encoded_image.tobytes()
+        dst_file_name = dst_file_name or self.stream_handler.get_file_name()
+        with self.metrics.span('encode', output=self.frame_output):
+            cv2.imwrite(dst_file_name, frame)
+        return f'frame extracted to {dst_file_name}'
+
+    def extract_decoded_frame(self, samples_valid_packets, description_data_id, dst_file_name=None, frame_index=-1):
+        return self.output_frame(self.decode_frame(samples_valid_packets, description_data_id, frame_index), dst_file_name)
+
+    # the steps of the extraction before decoding, for pipelines that decode elsewhere.
+    # returns (description data index, converted packets) per key frame target in the order of the targets
+    def prepare_targets_packets(self, targets):
+        self.stream_handler.start_extraction()
+        if not self.initiated:
+            self.init()
+        with self.metrics.span('collect_target_samples'):
+            targets_samples = self.collect_targets_samples(targets)
+        self.download_samples([target_samples for _, target_samples in targets_samples])
+        return [(description_data_id, self.convert_samples_packets(target_samples, description_data_id))
+                for description_data_id, target_samples in targets_samples]
+
+    # returns (description data index, converted packets, index of the target frame among the decoded frames)
+    def prepare_time_target_packets(self, seconds):
+        self.stream_handler.start_extraction()
+        if not self.initiated:
+            self.init()
+        with self.metrics.span('collect_target_samples'):
+            description_data_id, target_samples, frame_index = self.collect_time_target_samples(seconds)
+        return description_data_id, self.retrieve_and_decode_samples_bytes(target_samples, description_data_id), frame_index
+
+    def get_fetched_bytes(self):
+        return self.fetched_bytes
+
+    def get_cache_stats(self):
+        return self.byte_store.get_stats()
+
+    # reports the status code of an extraction and the hit rate of the byte store. returns (status code, result)
+    def finish_extraction(self, status_code, result):
+        self.metrics.count('extractions', status_code=status_code)
+        if self.metrics.enabled:
+            cache_stats = self.get_cache_stats()
+            accesses = cache_stats['hits'] + cache_stats['misses']
+            self.metrics.observe('cache_hit_rate', cache_stats['hits'] / accesses if accesses else 0)
+        return status_code, result
+
+    # drops the cached bytes before closing the handler since zero copy handlers may only close after their views are gone
+    def close(self):
+        self.byte_store.clear()
+        self.stream_handler.close()
+
+    def print_summary(self):
+        if self.verbose >= SUMMERY_VERBOSE:
+            print(f"success!!!!!")
+            print(f"round trips: {self.round_trips}. until moov was found: {self.moov_round_trips}")
+            print(f"estimated read cost: {round(self.cost_model.get_read_cost(self.round_trips, self.fetched_bytes), 3)} seconds")
+            print(f"used memory: {round(self.get_fetched_bytes() / MB_SIZE, 2)} MB")
+            print(f"saved memory: {round((self.get_file_size() - self.get_fetched_bytes()) / MB_SIZE, 2)} MB")
+            print(f"cache: {self.get_cache_stats()}")
+            if self.shared_cache is not None:
+                print(f"served by the shared cache: {round(self.shared_cache_bytes / MB_SIZE, 2)} MB")
+
+    def print_batch_summary(self, results):
+        if self.verbose >= SUMMERY_VERBOSE:
+            print(f"extracted {sum(result[1] == SUCCESS_CODE for result in results)}/{len(results)} frames.")
+            print(f"round trips: {self.round_trips}.")
+            print(f"used memory: {round(self.get_fetched_bytes() / MB_SIZE, 2)} MB")
 
+    # returns (status code, result). on success the result is the output of the frame, see output_frame
     def extract_frame(self):
         try:
+            self.stream_handler.start_extraction()
             if not self.initiated:
                 self.init()
-            description_data_id, target_samples = self.collect_target_samples()
+            with self.metrics.span('collect_target_samples'):
+                description_data_id, target_samples = self.collect_target_samples()
             converted_samples_packets = self.retrieve_and_decode_samples_bytes(target_samples, description_data_id)
-            self.save_packets_and_extract_last_frame(converted_samples_packets)
+            result = self.extract_decoded_frame(converted_samples_packets, description_data_id)
         except ExtractorExceptionBase as e:
-            return e.get_fail_code(), str(e)
+            return self.finish_extraction(e.get_fail_code(), str(e))
         except Exception as e:
-            return UNKNOWN_ERROR_FAIL_CODE, str(e)
-        if self.verbose >= SUMMERY_VERBOSE:
-            print(f"success!!!!!")
-            print(f"used chunks: {self.chunks_count}.")
-            print(f"used memory: {round((self.chunks_count * self.chunk_size) / MB_SIZE, 2)} MB")
-            print(f"saved memory: {round((self.get_file_size() - (self.chunks_count * self.chunk_size)) / MB_SIZE, 2)} MB")
-        return SUCCESS_CODE, f'frame extracted to {self.stream_handler.get_file_name()}'
+            return self.finish_extraction(UNKNOWN_ERROR_FAIL_CODE, str(e))
+        self.print_summary()
+        return self.finish_extraction(SUCCESS_CODE, result)
+
+    # extracts the frame presented at the time in seconds. only the samples from its key frame up to it are downloaded
+    def extract_frame_at(self, seconds):
+        try:
+            self.stream_handler.start_extraction()
+            if not self.initiated:
+                self.init()
+            with self.metrics.span('collect_target_samples'):
+                description_data_id, target_samples, frame_index = self.collect_time_target_samples(seconds)
+            converted_samples_packets = self.retrieve_and_decode_samples_bytes(target_samples, description_data_id)
+            result = self.extract_decoded_frame(converted_samples_packets, description_data_id, frame_index=frame_index)
+        except ExtractorExceptionBase as e:
+            return self.finish_extraction(e.get_fail_code(), str(e))
+        except Exception as e:
+            return self.finish_extraction(UNKNOWN_ERROR_FAIL_CODE, str(e))
+        self.print_summary()
+        return self.finish_extraction(SUCCESS_CODE, result)
+
+    # the destination of every target in a batch is the handler destination with the target index as a suffix
+    def get_target_file_name(self, target_index):
+        file_name, file_extension = os.path.splitext(self.stream_handler.get_file_name())
+        return f'{file_name}_{target_index}{file_extension}'
+
+    # converts and decodes the downloaded samples of one target of a batch. returns (target, status code, result)
+    def decode_target(self, target_index, target, description_data_id, target_samples):
+        try:
+            converted_samples_packets = self.convert_samples_packets(target_samples, description_data_id)
+            result = self.extract_decoded_frame(converted_samples_packets, description_data_id, self.get_target_file_name(target_index))
+        except ExtractorExceptionBase as e:
+            return target, e.get_fail_code(), str(e)
+        except Exception as e:
+            return target, UNKNOWN_ERROR_FAIL_CODE, str(e)
+        return target, SUCCESS_CODE, result
+
+    # extracts many key frames at once. targets is a list of (target_frame_mult, target_frame_offset) pairs.
+    # returns (target, status code, result) per target in the order of the targets
+    def extract_frames(self, targets):
+        targets = list(targets)
+        try:
+            self.stream_handler.start_extraction()
+            if not self.initiated:
+                self.init()
+            with self.metrics.span('collect_target_samples'):
+                targets_samples = self.collect_targets_samples(targets)
+            self.download_samples([target_samples for _, target_samples in targets_samples])
+        except ExtractorExceptionBase as e:
+            return [(target, *self.finish_extraction(e.get_fail_code(), str(e))) for target in targets]
+        except Exception as e:
+            return [(target, *self.finish_extraction(UNKNOWN_ERROR_FAIL_CODE, str(e))) for target in targets]
+        results = [self.decode_target(target_index, target, description_data_id, target_samples) for
+                   target_index, (target, (description_data_id, target_samples)) in enumerate(zip(targets, targets_samples))]
+        self.print_batch_summary(results)
+        return [(target, *self.finish_extraction(status_code, result)) for target, status_code, result in results]
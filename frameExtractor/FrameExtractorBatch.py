@@ -0,0 +1,240 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from .FrameExtractor import FrameExtractor
+from .FrameExtractorConstants import *
+from .FrameExtractorExceptions import *
+from .extractor_decoders.FrameDecoderBase import get_available_decoder
+from .extractor_handlers.FileStreamHandler import FileStreamHandler
+from .extractor_handlers.HttpStreamHandler import HttpStreamHandler
+
+
+# a manifest is a json lines file. every line is a source with its output and targets:
+# {"source": "video.mp4" or "https://...", "output": "frame.png", "targets": [[0.5, -1]], "times": [12.5]}
+# targets are (target_frame_mult, target_frame_offset) key frames and times are seconds. a source with many frames writes output_i
+def load_manifest(manifest_path):
+    with open(manifest_path) as f:
+        return [BatchJob(**json.loads(line)) for line in f if line.strip()]
+
+
+# runs in the decode processes. raises when the packets could not be decoded
+def decode_frame_job(decoders, packets, video_codec, width, height, frame_index, dst_file_name):
+    decoder = get_available_decoder(decoders)
+    if decoder is None:
+        raise RuntimeError('no frame decoder is available')
+    frame = decoder.decode_frame(packets, video_codec, width, height, frame_index)
+    if frame is None:
+        raise RuntimeError('no frame was decoded from the packets')
+    import cv2
+    if not cv2.imwrite(dst_file_name, frame):
+        raise RuntimeError(f'could not write the frame to {dst_file_name}')
+    return dst_file_name
+
+
+def get_percentile(sorted_values, percentile):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, max(0, -(-len(sorted_values) * percentile // 100) - 1))]
+
+
+class BatchFrameExtractor(FrameExtractor):
+    # the extractors of the batch run on worker threads where there is no user to confirm sizes above the thresholds so only the limits apply
+    def confirm_download_size(self, download_size):
+        return True
+
+
+class BatchJob:
+    def __init__(self, source, output, targets=(), times=()):
+        self.source = source
+        self.output = output
+        self.targets = [tuple(target) for target in targets]
+        self.times = list(times)
+        # (target, status code, result) per target. the key frame targets first and then the times
+        self.results = [None] * (len(self.targets) + len(self.times))
+        self.pending_decodes = 0
+        self.start_time = None
+        self.finished = False
+
+    def get_targets(self):
+        return self.targets + self.times
+
+    def set_result(self, target_index, status_code, result):
+        self.results[target_index] = (self.get_targets()[target_index], status_code, result)
+
+
+class BatchStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.files = 0
+        self.frames = 0
+        self.failed_frames = 0
+        self.fetched_bytes = 0
+        self.latencies = []
+
+    def add_fetched_bytes(self, fetched_bytes):
+        with self.lock:
+            self.fetched_bytes += fetched_bytes
+
+    def add_job(self, job):
+        with self.lock:
+            self.files += 1
+            self.frames += len(job.results)
+            self.failed_frames += sum(result[1] != SUCCESS_CODE for result in job.results)
+            # a job whose io stage failed before starting has no latency
+            if job.start_time is not None:
+                self.latencies.append(time.perf_counter() - job.start_time)
+
+    def finish(self):
+        self.end_time = time.perf_counter()
+
+    def get_report(self):
+        elapsed = (self.end_time or time.perf_counter()) - self.start_time
+        latencies = sorted(self.latencies)
+        return {'files': self.files, 'frames': self.frames, 'failed_frames': self.failed_frames, 'elapsed': elapsed,
+                'files_per_second': self.files / elapsed if elapsed else 0, 'fetched_bytes': self.fetched_bytes,
+                'p50_latency': get_percentile(latencies, 50), 'p99_latency': get_percentile(latencies, 99)}
+
+    def print_report(self):
+        report = self.get_report()
+        print(f"extracted {report['frames'] - report['failed_frames']}/{report['frames']} frames from {report['files']} files "
+              f"in {round(report['elapsed'], 2)} seconds ({round(report['files_per_second'], 2)} files/s).")
+        print(f"fetched: {round(report['fetched_bytes'] / MB_SIZE, 2)} MB")
+        print(f"latency: p50 {round(report['p50_latency'], 3)} s, p99 {round(report['p99_latency'], 3)} s")
+
+
+class BatchPipeline:
+    # extracts the frames of many sources in two stages. reading and parsing run on a thread pool and decoding and encoding
+    # run on a process pool so cv2 work is not serialized by the GIL. both stages are bounded: no more jobs are queued than io
+    # workers can take and io workers block while the decode stage is full, so a slow stage holds back the stage before it
+    def __init__(self, io_workers=DEFAULT_BATCH_IO_WORKERS, decode_workers=None, max_pending_decodes=None, extractor_kwargs=None,
+                 decoders=None, verbose=SUMMERY_VERBOSE):
+        self.io_workers = io_workers
+        self.decode_workers = decode_workers or os.cpu_count() or 1
+        self.max_pending_decodes = max_pending_decodes or self.decode_workers * DEFAULT_BATCH_PENDING_DECODES_PER_WORKER
+        # passed to every extractor. frame output is always to files since the frames are written by the decode processes
+        self.extractor_kwargs = {'verbose': 0, **(extractor_kwargs or {})}
+        self.decoders = decoders if decoders is not None else FrameExtractor.create_default_decoders()
+        self.verbose = verbose
+
+    @staticmethod
+    def create_handler(source, output):
+        if source.startswith(('http://', 'https://')):
+            return HttpStreamHandler(source, output)
+        return FileStreamHandler(source, output)
+
+    # returns (results, stats). results are (source, target, status code, result) in the order of the jobs and their targets
+    def run(self, jobs):
+        jobs = list(jobs)
+        stats = BatchStats()
+        jobs_slots = threading.BoundedSemaphore(self.io_workers * 2)
+        decode_slots = threading.BoundedSemaphore(self.max_pending_decodes)
+        # spawned decode processes are safe to start while the io threads are running
+        with ProcessPoolExecutor(self.decode_workers, mp_context=multiprocessing.get_context('spawn')) as decode_pool:
+            with ThreadPoolExecutor(self.io_workers) as io_pool:
+                io_futures = []
+                for job in jobs:
+                    jobs_slots.acquire()
+                    io_futures.append(io_pool.submit(self.run_job_io, job, decode_pool, decode_slots, stats))
+                    io_futures[-1].add_done_callback(lambda _: jobs_slots.release())
+        for job, io_future in zip(jobs, io_futures):
+            self.check_job_io(job, io_future, stats)
+        stats.finish()
+        if self.verbose >= SUMMERY_VERBOSE:
+            stats.print_report()
+        return [(job.source, *result) for job in jobs for result in job.results], stats
+
+    def run_job_io(self, job, decode_pool, decode_slots, stats):
+        job.start_time = time.perf_counter()
+        extractor = None
+        # (target index, description data index, packets, frame index) per target that reached decoding
+        prepared = []
+        try:
+            extractor = BatchFrameExtractor(self.create_handler(job.source, job.output), **self.extractor_kwargs)
+            if job.targets:
+                for target_index, (description_data_id, packets) in enumerate(extractor.prepare_targets_packets(job.targets)):
+                    prepared.append((target_index, description_data_id, packets, -1))
+            for time_index, seconds in enumerate(job.times):
+                target_index = len(job.targets) + time_index
+                try:
+                    prepared.append((target_index, *extractor.prepare_time_target_packets(seconds)))
+                except ExtractorExceptionBase as e:
+                    job.set_result(target_index, e.get_fail_code(), str(e))
+                except Exception as e:
+                    job.set_result(target_index, UNKNOWN_ERROR_FAIL_CODE, str(e))
+        except ExtractorExceptionBase as e:
+            self.fail_job(job, e.get_fail_code(), str(e))
+        except Exception as e:
+            self.fail_job(job, UNKNOWN_ERROR_FAIL_CODE, str(e))
+        finally:
+            if extractor is not None:
+                stats.add_fetched_bytes(extractor.get_fetched_bytes())
+        job.pending_decodes = len(prepared)
+        if not prepared:
+            self.finish_job(job, extractor, stats)
+            return
+        for prepared_index, (target_index, description_data_id, packets, frame_index) in enumerate(prepared):
+            decode_slots.acquire()
+            try:
+                vsd_type, _, width, height = extractor.get_sample_description(description_data_id)
+                dst_file_name = extractor.get_target_file_name(target_index) if len(job.results) > 1 else job.output
+                decode_future = decode_pool.submit(decode_frame_job, self.decoders, packets, extractor.detect_codec(vsd_type), width, height,
+                                                   frame_index, dst_file_name)
+            except Exception as e:
+                # a broken decode pool fails the targets that were not submitted. the submitted ones finish the job when they are decoded
+                decode_slots.release()
+                self.fail_decodes(job, [target_index for target_index, _, _, _ in prepared[prepared_index:]], extractor, stats, str(e))
+                return
+            decode_future.add_done_callback(partial(self.on_frame_decoded, job, target_index, extractor, decode_slots, stats))
+
+    # fails the jobs whose io stage raised outside its own error handling, so every job has a result per target
+    def check_job_io(self, job, io_future, stats):
+        exception = io_future.exception()
+        if exception is None:
+            return
+        self.fail_job(job, UNKNOWN_ERROR_FAIL_CODE, str(exception))
+        if not job.finished:
+            stats.add_job(job)
+
+    def fail_decodes(self, job, targets_indexes, extractor, stats, message):
+        for target_index in targets_indexes:
+            job.set_result(target_index, UNKNOWN_ERROR_FAIL_CODE, message)
+        with stats.lock:
+            job.pending_decodes -= len(targets_indexes)
+            finished = job.pending_decodes == 0
+        if finished:
+            self.finish_job(job, extractor, stats)
+
+    @staticmethod
+    def fail_job(job, status_code, message):
+        for target_index, result in enumerate(job.results):
+            if result is None:
+                job.set_result(target_index, status_code, message)
+
+    def on_frame_decoded(self, job, target_index, extractor, decode_slots, stats, decode_future):
+        decode_slots.release()
+        exception = decode_future.exception()
+        if exception is not None:
+            job.set_result(target_index, PACKETS_READER_FAIL_CODE, str(exception))
+        else:
+            job.set_result(target_index, SUCCESS_CODE, f'frame extracted to {decode_future.result()}')
+        with stats.lock:
+            job.pending_decodes -= 1
+            finished = job.pending_decodes == 0
+        if finished:
+            self.finish_job(job, extractor, stats)
+
+    @staticmethod
+    def finish_job(job, extractor, stats):
+        job.finished = True
+        if extractor is not None:
+            for _, status_code, result in job.results:
+                extractor.finish_extraction(status_code, result)
+            extractor.close()
+        stats.add_job(job)
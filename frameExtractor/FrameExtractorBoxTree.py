@@ -0,0 +1,93 @@
+from .FrameExtractorConstants import *
+from .FrameExtractorHelpers import *
+
+
+class Box:
+    # a box of the file. the headers of its children are parsed on demand, each of them once, and kept in file order
+    def __init__(self, box_type, offset, size, header_size, children_offset=None):
+        self.box_type = box_type
+        self.offset = offset
+        self.size = size
+        self.header_size = header_size
+        # full boxes and sample entries have fields between their header and their children
+        self.children_offset = children_offset if children_offset is not None else offset + header_size
+        self.children = []
+        self.next_child_offset = self.children_offset
+        self.children_parsed = False
+
+    def get_end(self):
+        return self.offset + self.size
+
+    def __repr__(self):
+        return f'Box({self.box_type}, offset={self.offset}, size={self.size})'
+
+
+class BoxTree:
+    # a lazy index of the boxes of the file. header_reader receives (offset, bytes number, end of the enclosing box) and
+    # returns the bytes. every lookup is served from the parsed headers and only parses further when a box was not seen yet.
+    # a reader that raises while parsing leaves the tree as it was so the lookup can be repeated
+    def __init__(self, file_size, header_reader):
+        self.header_reader = header_reader
+        self.root = Box('', 0, file_size, 0)
+        # boxes parsed by their offset instead of walking their parents, like the mfra located through the mfro
+        # and boxes whose children start after fields, by offset
+        self.detached_boxes = {}
+
+    # returns the box starting at the offset or None when the file is cut or the header is corrupted.
+    # size 0 boxes extend to the end of their parent and size 1 boxes have a 64 bit size after their type
+    def parse_box(self, offset, end, children_offset_in_box=None):
+        if offset + 8 > end:
+            return None
+        header_bytes = self.header_reader(offset, 8, end)
+        if len(header_bytes) < 8:
+            return None
+        box_size = read_unsigned_integer(header_bytes, 0)
+        box_type = read_characters(header_bytes, 4, 4).decode(encoding='latin-1')
+        header_size = 8
+        if box_size == 1:
+            large_size_bytes = self.header_reader(offset + 8, LONG_SIZE, end)
+            if len(large_size_bytes) < LONG_SIZE:
+                return None
+            box_size = read_unsigned_long(large_size_bytes, 0)
+            header_size = 16
+        elif box_size == 0:
+            box_size = end - offset
+        if box_size < header_size:
+            return None
+        children_offset = offset + children_offset_in_box if children_offset_in_box is not None else None
+        return Box(box_type, offset, box_size, header_size, children_offset)
+
+    def parse_next_child(self, box):
+        child = None if box.children_parsed else self.parse_box(box.next_child_offset, box.get_end())
+        if child is None:
+            box.children_parsed = True
+            return None
+        box.children.append(child)
+        box.next_child_offset = child.get_end()
+        return child
+
+    def iterate_children(self, box):
+        index = 0
+        while index < len(box.children) or self.parse_next_child(box) is not None:
+            yield box.children[index]
+            index += 1
+
+    # returns the first child of the type or None. children after it are not parsed
+    def find_child(self, box, box_type):
+        for child in self.iterate_children(box):
+            if child.box_type == box_type:
+                return child
+        return None
+
+    def get_children(self, box, box_type=None):
+        return [child for child in self.iterate_children(box) if box_type is None or child.box_type == box_type]
+
+    # the children of boxes with fields before them, like sample entries and full boxes, start children_offset_in_box after
+    # the box offset
+    def get_box_at(self, offset, end, children_offset_in_box=None):
+        if offset not in self.detached_boxes:
+            box = self.parse_box(offset, end, children_offset_in_box)
+            if box is None:
+                return None
+            self.detached_boxes[offset] = box
+        return self.detached_boxes[offset]
@@ -0,0 +1,163 @@
+from bisect import bisect_right
+
+from .FrameExtractorConstants import *
+
+
+class SparseByteStore:
+    # the downloaded bytes of a file as sorted, non overlapping segments. touching segments of the same priority are merged
+    # so a downloaded range is usually a single segment that can be served as a zero copy memoryview. views of zero copy
+    # handlers are never merged, since that would copy them. they are copied only when a read crosses from one to another.
+    # with a byte budget the least recently used segments are evicted, payload segments before metadata segments
+    def __init__(self, byte_budget=None):
+        self.byte_budget = byte_budget
+        self.starts = []
+        self.segments = []
+        self.priorities = []
+        self.last_uses = []
+        self.use_tick = 0
+        self.stored_bytes = 0
+        # ranges served without fetching, ranges that needed a fetch and evicted segments
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def get_size(self):
+        return self.stored_bytes
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'evicted_bytes': self.evicted_bytes,
+                'stored_bytes': self.stored_bytes}
+
+    def clear(self):
+        self.starts.clear()
+        self.segments.clear()
+        self.priorities.clear()
+        self.last_uses.clear()
+        self.stored_bytes = 0
+
+    # returns the (offset, bytes number) sub ranges of the range that are not stored yet
+    def get_missing_ranges(self, offset, bytes_number, count_access=True):
+        end = offset + bytes_number
+        missing = []
+        position = offset
+        index = max(bisect_right(self.starts, offset) - 1, 0)
+        while position < end and index < len(self.starts):
+            segment_start = self.starts[index]
+            segment_end = segment_start + len(self.segments[index])
+            if segment_start > position:
+                missing.append((position, min(segment_start, end) - position))
+            position = max(position, segment_end)
+            index += 1
+        if position < end:
+            missing.append((position, end - position))
+        if count_access:
+            if missing:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return missing
+
+    # stores the ranges fetched together. they are all used by the current operation so none of them is evicted to make room for another.
+    # the used ranges are the ranges the fetch completed. their parts that were already stored are about to be read too so they are kept as well
+    def add_ranges(self, ranges_data, priority=METADATA_PRIORITY, used_ranges=()):
+        self.use_tick += 1
+        for offset, data in ranges_data:
+            self.store(offset, data, priority)
+        for offset, bytes_number in used_ranges:
+            self.mark_used(offset, bytes_number)
+        self.evict()
+
+    def add(self, offset, data, priority=METADATA_PRIORITY):
+        self.add_ranges([(offset, data)], priority)
+
+    # stores the parts of the data that are not stored yet
+    def store(self, offset, data, priority):
+        for missing_offset, missing_bytes_number in self.get_missing_ranges(offset, len(data), count_access=False):
+            if missing_bytes_number == len(data):
+                self.insert_segment(missing_offset, data, priority)
+                continue
+            missing_data = memoryview(data)[missing_offset - offset: missing_offset - offset + missing_bytes_number]
+            # views of zero copy handlers stay views. other parts are copied so the rest of the data can be freed
+            self.insert_segment(missing_offset, missing_data if isinstance(data, memoryview) else bytes(missing_data), priority)
+        # the segments already holding parts of the data are used too
+        self.mark_used(offset, len(data))
+
+    def mark_used(self, offset, bytes_number):
+        index = max(bisect_right(self.starts, offset) - 1, 0)
+        while index < len(self.starts) and self.starts[index] < offset + bytes_number:
+            if self.starts[index] + len(self.segments[index]) > offset:
+                self.last_uses[index] = self.use_tick
+            index += 1
+
+    def can_merge(self, index, priority):
+        return self.priorities[index] == priority and not isinstance(self.segments[index], memoryview)
+
+    def insert_segment(self, offset, data, priority):
+        self.stored_bytes += len(data)
+        index = bisect_right(self.starts, offset)
+        mergeable = not isinstance(data, memoryview)
+        if mergeable and index > 0 and self.can_merge(index - 1, priority) and self.starts[index - 1] + len(self.segments[index - 1]) == offset:
+            index -= 1
+            self.segments[index] = self.extend_segment(self.segments[index], data)
+        else:
+            self.starts.insert(index, offset)
+            self.segments.insert(index, data)
+            self.priorities.insert(index, priority)
+            self.last_uses.insert(index, self.use_tick)
+        self.last_uses[index] = self.use_tick
+        following_index = index + 1
+        if mergeable and following_index < len(self.starts) and self.can_merge(following_index, priority) and \
+                self.starts[index] + len(self.segments[index]) == self.starts[following_index]:
+            self.segments[index] = self.extend_segment(self.segments[index], self.segments[following_index])
+            del self.starts[following_index], self.segments[following_index], self.priorities[following_index], self.last_uses[following_index]
+
+    # appends data to the segment. in place when the segment is a bytearray without living views
+    @staticmethod
+    def extend_segment(segment, data):
+        if isinstance(segment, bytearray):
+            try:
+                segment += data
+                return segment
+            except BufferError:  # views of the segment are still used so it can't be resized
+                pass
+        extended = bytearray(segment)
+        extended += data
+        return extended
+
+    # evicts least recently used segments until the budget is kept. payload goes first and
+    # segments used by the current operation are never evicted since they are about to be read
+    def evict(self):
+        if self.byte_budget is None or self.stored_bytes <= self.byte_budget:
+            return
+        candidates = sorted((priority, last_use, start) for priority, last_use, start in zip(self.priorities, self.last_uses, self.starts)
+                            if last_use != self.use_tick)
+        for _, _, start in candidates:
+            if self.stored_bytes <= self.byte_budget:
+                break
+            index = bisect_right(self.starts, start) - 1
+            self.stored_bytes -= len(self.segments[index])
+            self.evictions += 1
+            self.evicted_bytes += len(self.segments[index])
+            del self.starts[index], self.segments[index], self.priorities[index], self.last_uses[index]
+
+    # returns a view of the stored bytes of the range, cut at the end of the stored bytes like slicing.
+    # zero copy unless the range crosses touching segments that were not merged
+    def get(self, offset, bytes_number):
+        self.use_tick += 1
+        index = bisect_right(self.starts, offset) - 1
+        end = offset + bytes_number
+        pieces = []
+        position = offset
+        while 0 <= index < len(self.starts) and self.starts[index] <= position < end:
+            segment_start = self.starts[index]
+            piece = memoryview(self.segments[index])[position - segment_start: end - segment_start]
+            if not len(piece):
+                break
+            self.last_uses[index] = self.use_tick
+            pieces.append(piece)
+            position += len(piece)
+            index += 1
+        if len(pieces) == 1:
+            return pieces[0]
+        return memoryview(b''.join(pieces))
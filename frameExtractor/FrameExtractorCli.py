@@ -0,0 +1,58 @@
+import argparse
+import json
+import sys
+
+from .FrameExtractorBatch import BatchPipeline, load_manifest
+from .FrameExtractorConstants import *
+from .FrameExtractorIndexCache import IndexCache
+from .FrameExtractorMetrics import InMemoryMetricsSink
+from .FrameExtractorRangePlanner import ReadCostModel
+from .extractor_decoders.FrameDecoderBase import DECODER_BACKENDS, DEFAULT_DECODER_BACKENDS
+
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description='extracts frames from many mp4 files listed in a manifest.')
+    parser.add_argument('manifest', help='json lines file. every line is {"source": ..., "output": ..., "targets": [[mult, offset]], '
+                                         '"times": [seconds]}')
+    parser.add_argument('--io-workers', type=int, default=DEFAULT_BATCH_IO_WORKERS, help='threads reading and parsing the sources')
+    parser.add_argument('--decode-workers', type=int, default=None, help='processes decoding the frames. default is the cpus count')
+    parser.add_argument('--max-pending-decodes', type=int, default=None, help='decodes that may wait for a decode process')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='read granularity of sources read in whole chunks')
+    parser.add_argument('--fetch-byte-limit', type=int, default=DEFAULT_FETCH_BYTE_LIMIT, help='bytes that may be fetched per source')
+    parser.add_argument('--request-limit', type=int, default=DEFAULT_REQUEST_LIMIT, help='requests that may be made per source')
+    parser.add_argument('--request-latency', type=float, default=DEFAULT_REQUEST_LATENCY, help='seconds every request costs')
+    parser.add_argument('--bytes-per-second', type=float, default=DEFAULT_BYTES_PER_SECOND, help='bandwidth of the sources')
+    parser.add_argument('--index-cache-dir', default=None, help='directory of persistent indexes shared between runs')
+    parser.add_argument('--decoders', nargs='+', choices=list(DECODER_BACKENDS), default=list(DEFAULT_DECODER_BACKENDS),
+                        help='decoder backends in the order they are tried')
+    parser.add_argument('--metrics', action='store_true', help='print the timings and the reads of the extractions as json')
+    parser.add_argument('--quiet', action='store_true', help='print only the failures')
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    args = parse_arguments(arguments)
+    extractor_kwargs = {'chunk_size': args.chunk_size, 'fetch_byte_limit': args.fetch_byte_limit, 'request_limit': args.request_limit,
+                        'cost_model': ReadCostModel(args.request_latency, args.bytes_per_second)}
+    if args.index_cache_dir:
+        extractor_kwargs['index_cache'] = IndexCache(args.index_cache_dir)
+    metrics_sink = InMemoryMetricsSink()
+    if args.metrics:
+        extractor_kwargs['metrics_sinks'] = [metrics_sink]
+    pipeline = BatchPipeline(args.io_workers, args.decode_workers, args.max_pending_decodes, extractor_kwargs, args.decoders,
+                             verbose=0 if args.quiet else SUMMERY_VERBOSE)
+    results, _ = pipeline.run(load_manifest(args.manifest))
+    failed = False
+    for source, target, status_code, result in results:
+        if status_code != SUCCESS_CODE:
+            failed = True
+            print(f"{source} {target}: error ({status_code}): {result}")
+        elif not args.quiet:
+            print(f"{source} {target}: {result}")
+    if args.metrics:
+        print(json.dumps(metrics_sink.get_report(), indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
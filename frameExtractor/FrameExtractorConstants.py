@@ -6,13 +6,63 @@ LONG_SIZE = BYTE_SIZE * 8
 KB_SIZE = BYTE_SIZE * 1024
 MB_SIZE = KB_SIZE * 1000
 
+# array typecodes matching the sizes above
+UNSIGNED_INT_TYPECODE = 'I'
+UNSIGNED_LONG_TYPECODE = 'Q'
+SIGNED_LONG_TYPECODE = 'q'
+
 # extractor constants
 DEFAULT_CHUNK_SIZE = KB_SIZE * 10
-DEFAULT_CHUNKS_LIMIT = 1000
+DEFAULT_FETCH_BYTE_LIMIT = MB_SIZE * 10
+DEFAULT_REQUEST_LIMIT = 200
 DEFAULT_DOWNLOAD_LIMIT = MB_SIZE * 3
 DEFAULT_STSC_SIZE_LIMIT = MB_SIZE * 1.5
 DEFAULT_DOWNLOAD_THRESHHOLD = MB_SIZE * 1.5
-DEFAULT_STSC_SIZE_THRESHOLD = MB_SIZE
+# read cost model. every request costs a fixed latency in seconds and every byte its transfer time
+DEFAULT_REQUEST_LATENCY = 0.05
+DEFAULT_BYTES_PER_SECOND = MB_SIZE * 4
+# the size of each of the head and tail windows fetched before looking for the moov box
+DEFAULT_PROBE_WINDOW_SIZE = KB_SIZE * 64
+
+# byte store priorities. lower priorities are evicted first
+PAYLOAD_PRIORITY = 0
+METADATA_PRIORITY = 1
+
+# index cache constants
+INDEX_CACHE_MAGIC = b'MP4FEIDX'
+INDEX_CACHE_VERSION = 3
+INDEX_CACHE_FILE_EXTENSION = '.idx'
+
+# frame outputs
+FILE_FRAME_OUTPUT = 'file'
+ARRAY_FRAME_OUTPUT = 'array'
+ENCODED_FRAME_OUTPUT = 'encoded'
+DEFAULT_ENCODED_IMAGE_EXTENSION = '.png'
+# the width and height shorts of a visual sample entry
+VISUAL_SAMPLE_ENTRY_WIDTH_OFFSET = 32
+# the sample entries of stsd and the boxes of visual sample entries start after their fields
+STSD_ENTRIES_OFFSET = 16
+VISUAL_SAMPLE_ENTRY_CHILDREN_OFFSET = 86
+# the timescale offset in version 0 and version 1 media headers
+MDHD_TIMESCALE_OFFSET = 20
+MDHD_V1_TIMESCALE_OFFSET = 28
+
+# shared chunk cache constants
+DEFAULT_SHARED_CACHE_BUDGET = MB_SIZE * 256
+
+# batch pipeline constants
+DEFAULT_BATCH_IO_WORKERS = 8
+# decodes waiting for a decode worker per decode worker. io workers block when the decode stage is this far behind
+DEFAULT_BATCH_PENDING_DECODES_PER_WORKER = 2
+
+# extraction daemon constants
+DEFAULT_DAEMON_HOST = '127.0.0.1'
+DEFAULT_DAEMON_PORT = 8765
+DEFAULT_DAEMON_WORKERS = 4
+# requests that may wait for a worker. the requests above it are refused until the queue drains
+DEFAULT_DAEMON_QUEUE_SIZE = 32
+# the track indexes of the most recently requested sources that are kept in memory
+DEFAULT_DAEMON_INDEXES = 256
 
 # verbose levels
 READING_VERBOSE = 100
@@ -33,12 +83,40 @@ SAMPLE_OFFSET_IN_CHUNK_IDX = 1
 SAMPLE_OFFSET_IN_FILE_IDX = 1
 SAMPLE_SIZE_IDX = 2
 
+# sample tables layout
+TABLE_ENTRIES_OFFSET = 16
+STSZ_ENTRIES_OFFSET = 20
+STSC_ENTRY_FIELDS = 3
+# the entries of an stsc page. big stsc tables are decoded page by page around the looked up samples
+STSC_PAGE_ENTRIES = 512
+RUN_LENGTH_ENTRY_FIELDS = 2
+
+# fragmented files layout
+MFRO_SIZE = 16
+TFRA_HEADER_SIZE = 24
+TFRA_ENTRIES_OFFSET = 24
+TFRA_ENTRY_FIELDS = 5
+# the track id offset in version 0 and version 1 track headers
+TKHD_TRACK_ID_OFFSET = 20
+TKHD_V1_TRACK_ID_OFFSET = 28
+TFHD_BASE_DATA_OFFSET_FLAG = 0x01
+TFHD_SAMPLE_DESCRIPTION_INDEX_FLAG = 0x02
+TFHD_DEFAULT_SAMPLE_DURATION_FLAG = 0x08
+TFHD_DEFAULT_SAMPLE_SIZE_FLAG = 0x10
+TRUN_DATA_OFFSET_FLAG = 0x01
+TRUN_FIRST_SAMPLE_FLAGS_FLAG = 0x04
+TRUN_SAMPLE_DURATION_FLAG = 0x100
+TRUN_SAMPLE_SIZE_FLAG = 0x200
+TRUN_SAMPLE_COMPOSITION_OFFSET_FLAG = 0x800
+# the optional per sample fields of a trun in their order: duration, size, flags, composition time offset
+TRUN_SAMPLE_FIELDS_FLAGS = (TRUN_SAMPLE_DURATION_FLAG, TRUN_SAMPLE_SIZE_FLAG, 0x400, TRUN_SAMPLE_COMPOSITION_OFFSET_FLAG)
+
 # extractor status codes
 SUCCESS_CODE = 10
 STSC_LIMIT_FAIL_CODE = 11
 BOX_NOT_FOUND_FAIL_CODE = 12
 DOWNLOAD_LIMIT_FAIL_CODE = 13
-CHUNKS_LIMIT_FAIL_CODE = 14
+FETCH_BUDGET_FAIL_CODE = 14
 PACKETS_READER_FAIL_CODE = 15
 SAMPLE_DESCRIPTION_DATA_NOT_FOUND_FAIL_CODE = 16
 SAMPLE_CONVERT_ERROR_FAIL_CODE = 17
@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .FrameExtractorBatch import BatchFrameExtractor, BatchPipeline
+from .FrameExtractorConstants import *
+from .FrameExtractorExceptions import *
+from .FrameExtractorIndexCache import IndexCache
+from .FrameExtractorSharedCache import SharedChunkCache
+from .extractor_decoders.FrameDecoderBase import DECODER_BACKENDS, DEFAULT_DECODER_BACKENDS, get_available_decoder
+
+IMAGE_CONTENT_TYPES = {'.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.webp': 'image/webp', '.bmp': 'image/bmp'}
+
+
+class ServiceBusyException(Exception):
+    pass
+
+
+class SourceNotAllowedException(Exception):
+    pass
+
+
+# a frame request. the key frame is given by mult and offset like target_frame_mult and target_frame_offset, or the frame by time
+class FrameRequest:
+    def __init__(self, source, mult=1, offset=0, frames_after=0, time=None, image_format=DEFAULT_ENCODED_IMAGE_EXTENSION):
+        self.source = source
+        self.mult = mult
+        self.offset = offset
+        self.frames_after = frames_after
+        self.time = time
+        self.image_format = image_format
+
+    # the parameters come from the query string or from a json body. raises ValueError on bad parameters
+    @classmethod
+    def from_params(cls, params):
+        if not params.get('source'):
+            raise ValueError('source is required')
+        image_format = str(params.get('format', DEFAULT_ENCODED_IMAGE_EXTENSION)).lower()
+        image_format = image_format if image_format.startswith('.') else f'.{image_format}'
+        if image_format not in IMAGE_CONTENT_TYPES:
+            raise ValueError(f'format must be one of {list(IMAGE_CONTENT_TYPES)}')
+        return cls(str(params['source']), float(params.get('mult', 1)), int(params.get('offset', 0)), int(params.get('frames_after', 0)),
+                   float(params['time']) if params.get('time') is not None else None, image_format)
+
+
+class ExtractionService:
+    # keeps the track indexes of the recently requested sources, a shared cache of their blocks and the resolved decoder between
+    # requests, so a request for a warm source reads and parses nothing but its target samples.
+    # at most workers extractions run together and at most queue size requests wait for them. the others are refused right away.
+    # the requests may only read the files under the source root, the working directory by default, and the urls under the
+    # allowed urls, none by default
+    def __init__(self, workers=DEFAULT_DAEMON_WORKERS, queue_size=DEFAULT_DAEMON_QUEUE_SIZE, max_indexes=DEFAULT_DAEMON_INDEXES,
+                 shared_cache: SharedChunkCache = None, decoders=None, extractor_kwargs=None, create_handler=BatchPipeline.create_handler,
+                 verbose=0, source_root=None, allowed_urls=()):
+        self.workers_slots = threading.BoundedSemaphore(workers)
+        self.max_admitted = workers + queue_size
+        self.max_indexes = max_indexes
+        self.shared_cache = shared_cache or SharedChunkCache()
+        self.decoders = decoders if decoders is not None else list(DEFAULT_DECODER_BACKENDS)
+        self.extractor_kwargs = extractor_kwargs or {}
+        self.create_handler = create_handler
+        self.verbose = verbose
+        self.source_root = os.path.realpath(source_root or os.getcwd())
+        self.allowed_urls = [urlsplit(allowed_url) for allowed_url in allowed_urls]
+        self.lock = threading.Lock()
+        # file identity -> track index, in least recently used order
+        self.indexes = OrderedDict()
+        # file identity -> future of the track index being built by the first request of the source
+        self.building = {}
+        self.admitted = 0
+        self.stats = {'requests': 0, 'rejected': 0, 'failed': 0, 'index_hits': 0, 'index_misses': 0}
+
+    # resolves the decoder backend through the registry and imports opencv, which encodes the frames, before the first request.
+    # raises ImportError when either is missing so the daemon refuses to start instead of failing every request
+    def warm_up(self):
+        decoder = get_available_decoder(self.decoders)
+        if decoder is None:
+            raise ImportError(f'none of the decoder backends {self.get_decoders_names()} is available')
+        import cv2  # noqa: F401
+        self.decoders = [decoder]
+        return decoder
+
+    def get_decoders_names(self):
+        return [decoder if isinstance(decoder, str) else decoder.get_name() for decoder in self.decoders]
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, 'in_progress': self.admitted, 'indexes': len(self.indexes), 'shared_cache': self.shared_cache.get_stats(),
+                    'decoders': self.get_decoders_names()}
+
+    def count(self, stat_name):
+        with self.lock:
+            self.stats[stat_name] += 1
+
+    def admit(self):
+        with self.lock:
+            if self.admitted >= self.max_admitted:
+                self.stats['rejected'] += 1
+                return False
+            self.admitted += 1
+            self.stats['requests'] += 1
+            return True
+
+    def is_url_allowed(self, url):
+        split_url = urlsplit(url)
+        return any(split_url.scheme == allowed_url.scheme and split_url.netloc.lower() == allowed_url.netloc.lower() and
+                   split_url.path.startswith(allowed_url.path) for allowed_url in self.allowed_urls)
+
+    # returns the url or the real path of the file the source names, relative paths are under the source root.
+    # raises SourceNotAllowedException for urls that are not allowed and for paths that lead out of the source root
+    def resolve_source(self, source):
+        if source.startswith(('http://', 'https://')):
+            if not self.is_url_allowed(source):
+                raise SourceNotAllowedException(f'{source} is not under an allowed url')
+            return source
+        path = os.path.realpath(os.path.join(self.source_root, source))
+        if os.path.commonpath([self.source_root, path]) != self.source_root:
+            raise SourceNotAllowedException(f'{source} is not under the source root')
+        return path
+
+    def create_extractor(self, frame_request, source, track_index=None):
+        return BatchFrameExtractor(self.create_handler(source, os.devnull), verbose=0, target_frame_mult=frame_request.mult,
+                              target_frame_offset=frame_request.offset, frames_after=frame_request.frames_after,
+                              shared_cache=self.shared_cache, frame_output=ENCODED_FRAME_OUTPUT,
+                              encoded_image_extension=frame_request.image_format, decoders=self.decoders, track_index=track_index,
+                              **self.extractor_kwargs)
+
+    # returns the track index of the file or None when the file can't be indexed, and whether it was already in memory.
+    # the first request of a file builds the index with its own extractor and the concurrent requests of the file wait for it
+    def get_track_index(self, file_identity, extractor):
+        with self.lock:
+            track_index = self.indexes.get(file_identity)
+            if track_index is not None:
+                self.indexes.move_to_end(file_identity)
+                self.stats['index_hits'] += 1
+                return track_index, True
+            future = self.building.get(file_identity)
+            owner = future is None
+            if owner:
+                future = self.building[file_identity] = Future()
+            self.stats['index_misses'] += 1
+        if not owner:
+            # the index is warm only when the build that was waited on succeeded
+            track_index = future.result()
+            return track_index, track_index is not None
+        track_index = None
+        try:
+            track_index = extractor.build_track_index()
+        # files that can't be indexed are extracted cold every time
+        except ExtractorExceptionBase:
+            pass
+        finally:
+            with self.lock:
+                del self.building[file_identity]
+                if track_index is not None:
+                    self.indexes[file_identity] = track_index
+                    while len(self.indexes) > self.max_indexes:
+                        self.indexes.popitem(last=False)
+            future.set_result(track_index)
+        return track_index, False
+
+    # returns (status code, result, headers). the result is the encoded image on success and the error message on failure.
+    # raises SourceNotAllowedException, ServiceBusyException when the queue is full and the errors of opening the source
+    def extract(self, frame_request: FrameRequest):
+        source = self.resolve_source(frame_request.source)
+        if not self.admit():
+            raise ServiceBusyException(f'{self.max_admitted} requests are already in progress')
+        try:
+            with self.workers_slots:
+                start_time = time.perf_counter()
+                extractor = self.create_extractor(frame_request, source)
+                try:
+                    file_identity = extractor.stream_handler.get_file_identity()
+                    track_index, index_warm = self.get_track_index(file_identity, extractor) if file_identity is not None else (None, False)
+                    if track_index is None and extractor.initiated:
+                        # the failed build left the extractor half initiated
+                        extractor.close()
+                        extractor = self.create_extractor(frame_request, source)
+                    elif track_index is not None and not extractor.initiated:
+                        extractor.use_track_index(track_index)
+                    if frame_request.time is not None:
+                        status_code, result = extractor.extract_frame_at(frame_request.time)
+                    else:
+                        status_code, result = extractor.extract_frame()
+                    headers = {'X-Extractor-Status': status_code, 'X-Index-Warm': int(index_warm), 'X-Fetched-Bytes': extractor.get_fetched_bytes(),
+                               'X-Shared-Cache-Bytes': extractor.shared_cache_bytes, 'X-Extraction-Ms': round((time.perf_counter() - start_time) * 1000, 2)}
+                finally:
+                    extractor.close()
+            if status_code != SUCCESS_CODE:
+                self.count('failed')
+            return status_code, result, headers
+        finally:
+            with self.lock:
+                self.admitted -= 1
+
+
+class ExtractionRequestHandler(BaseHTTPRequestHandler):
+    # GET /frame?source=video.mp4&mult=0.5&offset=0&format=jpg or &time=12.5 answers with the encoded frame.
+    # POST /frame takes the same parameters as a json object. GET /stats answers with the service counters
+    server_version = 'FrameExtractorDaemon'
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/stats':
+            self.send_json(200, self.server.service.get_stats())
+        elif url.path == '/frame':
+            self.handle_frame({key: values[-1] for key, values in parse_qs(url.query).items()})
+        else:
+            self.send_json(404, {'error': f'unknown path {url.path}'})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/frame':
+            self.send_json(404, {'error': f'unknown path {url.path}'})
+            return
+        try:
+            params = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError as e:
+            self.send_json(400, {'error': f'bad json body: {e}'})
+            return
+        self.handle_frame(params if isinstance(params, dict) else {})
+
+    def handle_frame(self, params):
+        service: ExtractionService = self.server.service
+        try:
+            frame_request = FrameRequest.from_params(params)
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        try:
+            status_code, result, headers = service.extract(frame_request)
+        except SourceNotAllowedException as e:
+            self.send_json(403, {'error': str(e)})
+            return
+        except ServiceBusyException as e:
+            self.send_json(503, {'error': str(e)}, {'Retry-After': 1})
+            return
+        except FileNotFoundError as e:
+            self.send_json(404, {'error': str(e)})
+            return
+        except Exception as e:
+            self.send_json(502, {'error': f'could not open {frame_request.source}: {e}'})
+            return
+        if status_code != SUCCESS_CODE:
+            self.send_json(422, {'status_code': status_code, 'error': result}, headers)
+            return
+        self.send_body(200, IMAGE_CONTENT_TYPES[frame_request.image_format], result, headers)
+
+    def send_json(self, status, obj, headers=None):
+        self.send_body(status, 'application/json', json.dumps(obj).encode(), headers)
+
+    def send_body(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # unix socket clients have no address
+    def address_string(self):
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.service.verbose >= SUMMERY_VERBOSE:
+            super().log_message(format, *args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+# serves the service on a unix socket when it is given and on the host and port otherwise
+def create_server(service, host=DEFAULT_DAEMON_HOST, port=DEFAULT_DAEMON_PORT, unix_socket=None):
+    if unix_socket is not None:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, ExtractionRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ExtractionRequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description='serves frame extractions over localhost http or a unix socket and keeps the indexes '
+                                                 'of the recently requested sources in memory.')
+    parser.add_argument('--host', default=DEFAULT_DAEMON_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_DAEMON_PORT)
+    parser.add_argument('--unix-socket', default=None, help='path of a unix socket to serve on instead of the host and port')
+    parser.add_argument('--source-root', default=None, help='directory of the files the requests may read, the working directory by default')
+    parser.add_argument('--allow-url', action='append', default=[], dest='allowed_urls',
+                        help='url prefix the requests may read, like https://cdn.example.com/videos/. may be given many times')
+    parser.add_argument('--workers', type=int, default=DEFAULT_DAEMON_WORKERS, help='extractions that run together')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_DAEMON_QUEUE_SIZE, help='requests that may wait for a worker')
+    parser.add_argument('--max-indexes', type=int, default=DEFAULT_DAEMON_INDEXES, help='track indexes kept in memory')
+    parser.add_argument('--cache-budget', type=int, default=DEFAULT_SHARED_CACHE_BUDGET, help='bytes of the sources kept in memory')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='read granularity of sources read in whole chunks')
+    parser.add_argument('--fetch-byte-limit', type=int, default=DEFAULT_FETCH_BYTE_LIMIT, help='bytes that may be fetched per request')
+    parser.add_argument('--request-limit', type=int, default=DEFAULT_REQUEST_LIMIT, help='reads that may be made per request')
+    parser.add_argument('--index-cache-dir', default=None, help='directory of persistent indexes, used when a source is not in memory')
+    parser.add_argument('--decoders', nargs='+', choices=list(DECODER_BACKENDS), default=list(DEFAULT_DECODER_BACKENDS),
+                        help='decoder backends in the order they are tried')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    args = parse_arguments(arguments)
+    extractor_kwargs = {'chunk_size': args.chunk_size, 'fetch_byte_limit': args.fetch_byte_limit, 'request_limit': args.request_limit}
+    if args.index_cache_dir:
+        extractor_kwargs['index_cache'] = IndexCache(args.index_cache_dir)
+    service = ExtractionService(args.workers, args.queue_size, args.max_indexes, SharedChunkCache(args.chunk_size, args.cache_budget),
+                                args.decoders, extractor_kwargs, verbose=SUMMERY_VERBOSE if args.verbose else 0, source_root=args.source_root,
+                                allowed_urls=args.allowed_urls)
+    try:
+        service.warm_up()
+    except ImportError as e:
+        print(f'could not start: {e}')
+        return 1
+    server = create_server(service, args.host, args.port, args.unix_socket)
+    print(f"serving on {args.unix_socket or f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix_socket is not None and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
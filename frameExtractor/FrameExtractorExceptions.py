@@ -1,4 +1,4 @@
-from FrameExtractorConstants import *
+from .FrameExtractorConstants import *
 
 
 class ExtractorExceptionBase(Exception):
@@ -28,12 +28,13 @@ class DownloadLimitException(ExtractorExceptionBase):
         super().__init__(f'download size too big: {download_size} bytes', DOWNLOAD_LIMIT_FAIL_CODE)
 
 
-class ChunksLimitException(ExtractorExceptionBase):
-    def __init__(self, current_chunks, new_chunks_number):
-        self.current_chunks = current_chunks
-        self.new_chunks_number = new_chunks_number
-        super().__init__(f'reached chunks limit. current chunks count: {current_chunks}. ' +
-                         f'asked to retrieve more {new_chunks_number} chunks', CHUNKS_LIMIT_FAIL_CODE)
+class FetchBudgetException(ExtractorExceptionBase):
+    def __init__(self, fetched_bytes, requests_count, new_bytes_number):
+        self.fetched_bytes = fetched_bytes
+        self.requests_count = requests_count
+        self.new_bytes_number = new_bytes_number
+        super().__init__(f'reached fetch budget. fetched {fetched_bytes} bytes in {requests_count} requests. ' +
+                         f'asked to retrieve more {new_bytes_number} bytes', FETCH_BUDGET_FAIL_CODE)
 
 
 class PacketsReaderException(ExtractorExceptionBase):
@@ -0,0 +1,117 @@
+from array import array
+
+from .FrameExtractorConstants import *
+from .FrameExtractorHelpers import *
+from .FrameExtractorSampleTables import SampleTable
+
+
+class TrackFragmentRandomAccessTable(SampleTable):
+    # tfra. every entry is (time, moof offset, traf number, trun number, sample number) of a random access sample of the track.
+    # the sizes of the fields depend on the box version and lengths so the entries are decoded field by field
+    entries_offset = TFRA_ENTRIES_OFFSET
+    entry_fields = TFRA_ENTRY_FIELDS
+
+    def __init__(self, box_offset, entries_count, version, lengths):
+        super().__init__(box_offset, entries_count)
+        time_size = LONG_SIZE if version == 1 else INT_SIZE
+        self.fields_sizes = (time_size, time_size, ((lengths >> 4) & 3) + 1, ((lengths >> 2) & 3) + 1, (lengths & 3) + 1)
+        self.entry_size = sum(self.fields_sizes)
+
+    def decode_entries(self, entries_bytes, entries_number):
+        entries = array(UNSIGNED_LONG_TYPECODE)
+        offset = 0
+        for _ in range(entries_number):
+            for field_size in self.fields_sizes:
+                entries.append(int.from_bytes(entries_bytes[offset: offset + field_size], 'big'))
+                offset += field_size
+        return entries
+
+    def get_random_access_sample(self, bytes_reader, entry):
+        return tuple(self.read_entries(bytes_reader, entry, 1))
+
+    # the presentation times of the random access samples. the table must be loaded
+    def get_times(self):
+        return self.entries[::self.entry_fields]
+
+
+# yields (box type, box offset, box size) of the boxes in data[start: end]. boxes inside a moof never use 64 bit sizes
+def iterate_boxes(data, start, end):
+    offset = start
+    while offset + 8 <= end:
+        box_size = read_unsigned_integer(data, offset)
+        if box_size < 8:
+            return
+        yield read_characters(data, offset + 4, 4).decode(encoding='UTF-8'), offset, box_size
+        offset += box_size
+
+
+# returns (sample description index, samples) of the track fragment of the track in the moof bytes or None if there is none.
+# samples are (offset in file, sample size, sample duration, composition offset) in decoding order, grouped by their trun.
+# trex_defaults are the (sample description index, sample size, sample duration) defaults of the track from the moov
+def parse_track_fragment(moof_bytes, moof_offset, track_id, trex_defaults):
+    for box_type, traf_offset, traf_size in iterate_boxes(moof_bytes, 8, len(moof_bytes)):
+        if box_type != 'traf':
+            continue
+        description_index, default_sample_size, default_sample_duration = trex_defaults
+        base_data_offset = moof_offset
+        truns_samples = []
+        data_position = None
+        for child_type, child_offset, _ in iterate_boxes(moof_bytes, traf_offset + 8, traf_offset + traf_size):
+            if child_type == 'tfhd':
+                flags = read_unsigned_integer(moof_bytes, child_offset + 8) & 0xFFFFFF
+                # a traf of another track. skips to the next traf
+                if read_unsigned_integer(moof_bytes, child_offset + 12) != track_id:
+                    break
+                field_offset = child_offset + 16
+                # without an explicit base the data is relative to the moof, which is what the default-base-is-moof flag states
+                if flags & TFHD_BASE_DATA_OFFSET_FLAG:
+                    base_data_offset = read_unsigned_long(moof_bytes, field_offset)
+                    field_offset += LONG_SIZE
+                if flags & TFHD_SAMPLE_DESCRIPTION_INDEX_FLAG:
+                    description_index = read_unsigned_integer(moof_bytes, field_offset)
+                    field_offset += INT_SIZE
+                if flags & TFHD_DEFAULT_SAMPLE_DURATION_FLAG:
+                    default_sample_duration = read_unsigned_integer(moof_bytes, field_offset)
+                    field_offset += INT_SIZE
+                if flags & TFHD_DEFAULT_SAMPLE_SIZE_FLAG:
+                    default_sample_size = read_unsigned_integer(moof_bytes, field_offset)
+            elif child_type == 'trun':
+                samples, data_position = parse_track_run(moof_bytes, child_offset, base_data_offset, data_position, default_sample_size,
+                                                         default_sample_duration)
+                truns_samples.append(samples)
+        else:
+            return description_index, truns_samples
+    return None
+
+
+# returns the (offset in file, sample size, sample duration, composition offset) of the samples of the trun and the file offset
+# following their data. version 1 composition offsets are signed so all the offsets are read as signed, like ctts
+def parse_track_run(moof_bytes, trun_offset, base_data_offset, data_position, default_sample_size, default_sample_duration):
+    flags = read_unsigned_integer(moof_bytes, trun_offset + 8) & 0xFFFFFF
+    samples_count = read_unsigned_integer(moof_bytes, trun_offset + 12)
+    field_offset = trun_offset + 16
+    # a trun without a data offset continues the data of the previous trun of the traf
+    if flags & TRUN_DATA_OFFSET_FLAG:
+        data_offset = read_unsigned_integer(moof_bytes, field_offset)
+        data_position = base_data_offset + (data_offset - (1 << 32) if data_offset & (1 << 31) else data_offset)
+        field_offset += INT_SIZE
+    elif data_position is None:
+        data_position = base_data_offset
+    if flags & TRUN_FIRST_SAMPLE_FLAGS_FLAG:
+        field_offset += INT_SIZE
+    sample_fields = [flag for flag in TRUN_SAMPLE_FIELDS_FLAGS if flags & flag]
+    samples = []
+    for _ in range(samples_count):
+        sample_size, sample_duration, composition_offset = default_sample_size, default_sample_duration, 0
+        for flag in sample_fields:
+            if flag == TRUN_SAMPLE_SIZE_FLAG:
+                sample_size = read_unsigned_integer(moof_bytes, field_offset)
+            elif flag == TRUN_SAMPLE_DURATION_FLAG:
+                sample_duration = read_unsigned_integer(moof_bytes, field_offset)
+            elif flag == TRUN_SAMPLE_COMPOSITION_OFFSET_FLAG:
+                composition_offset = read_unsigned_integer(moof_bytes, field_offset)
+                composition_offset = composition_offset - (1 << 32) if composition_offset & (1 << 31) else composition_offset
+            field_offset += INT_SIZE
+        samples.append((data_position, sample_size, sample_duration, composition_offset))
+        data_position += sample_size
+    return samples, data_position
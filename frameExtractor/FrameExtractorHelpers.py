@@ -1,7 +1,9 @@
 import struct
+import sys
+from array import array
 
-from FrameExtractorConstants import LONG_SIZE, INT_SIZE, SHORT_SIZE, BYTE_SIZE
-from FrameExtractorExceptions import SampleConvertErrorException
+from .FrameExtractorConstants import LONG_SIZE, INT_SIZE, SHORT_SIZE, BYTE_SIZE, UNSIGNED_INT_TYPECODE, UNSIGNED_LONG_TYPECODE
+from .FrameExtractorExceptions import SampleConvertErrorException
 
 
 # bytes unpacking helper methods
@@ -25,21 +27,52 @@ def read_bytes(bytes_to_read_from, offset, number_of_bytes):
     return bytes_to_read_from[offset: offset + number_of_bytes]
 
 
+# always a bytes copy so it can be decoded even when read from a memoryview
+def read_characters(bytes_to_read_from, offset, number_of_characters):
+    return bytes(bytes_to_read_from[offset: offset + number_of_characters])
+
+
+# bulk unpacking helper methods. decode a whole run of big endian table entries in one call
+def read_unsigned_integers_array(bytes_to_read_from, offset, number_of_integers):
+    return _read_big_endian_array(UNSIGNED_INT_TYPECODE, bytes_to_read_from, offset, number_of_integers * INT_SIZE)
+
+
+def read_unsigned_longs_array(bytes_to_read_from, offset, number_of_longs):
+    return _read_big_endian_array(UNSIGNED_LONG_TYPECODE, bytes_to_read_from, offset, number_of_longs * LONG_SIZE)
+
+
+def _read_big_endian_array(typecode, bytes_to_read_from, offset, number_of_bytes):
+    entries = array(typecode)
+    entries.frombytes(bytes_to_read_from[offset: offset + number_of_bytes])
+    if sys.byteorder == 'little':
+        entries.byteswap()
+    return entries
+
+
 # packets converting helpers
+ANNEX_B_START_CODE = bytes([0, 0, 0, 1])
+# the nal units of avcc packets are prefixed by their length in 1, 2 or 4 bytes
+NAL_LENGTH_STRUCTS = {BYTE_SIZE: struct.Struct('!B'), SHORT_SIZE: struct.Struct('!H'), INT_SIZE: struct.Struct('!I')}
+
+
+# appends the annex b form of the packet to the output bytearray. the nal units are copied once, from a memoryview of the packet,
+# so converting many packets into one output is linear in their size
+def write_avcc_packet_as_annex_b(output, sample_packet_bytes, sample_packet_size, nal_length_size):
+    nal_length_struct = NAL_LENGTH_STRUCTS.get(nal_length_size)
+    if nal_length_struct is None:
+        raise SampleConvertErrorException(f"nal length size {nal_length_size} is not supported")
+    packet_view = memoryview(sample_packet_bytes)
+    offset_in_packet = 0
+    while offset_in_packet + nal_length_size <= sample_packet_size:
+        size = nal_length_struct.unpack_from(packet_view, offset_in_packet)[0]
+        offset_in_packet += nal_length_size
+        if offset_in_packet + size > sample_packet_size:
+            raise SampleConvertErrorException(f"nal of {size} bytes at {offset_in_packet} runs past the sample size {sample_packet_size}")
+        output += ANNEX_B_START_CODE
+        output += packet_view[offset_in_packet: offset_in_packet + size]
+        offset_in_packet += size
+    return output
+
+
 def convert_avcc_packet_to_annex_b(sample_packet_bytes, sample_packet_size, nal_length_size):
-    res = bytes()
-    if nal_length_size == 4:
-        offset_in_packet = 0
-        while offset_in_packet < sample_packet_size:
-            size = read_unsigned_integer(sample_packet_bytes, offset_in_packet)
-            offset_in_packet += INT_SIZE
-            res += bytes([0, 0, 0, 1])
-            res += read_bytes(sample_packet_bytes, offset_in_packet, size)
-            offset_in_packet += size
-    else:
-        raise SampleConvertErrorException("nal length size defferent then 4 is not supported")
-    return res
-
-
-def combine_packet_with_codec_private_data(sample_packet_decoded, codec_private_bytes):
-    return codec_private_bytes + sample_packet_decoded
+    return write_avcc_packet_as_annex_b(bytearray(), sample_packet_bytes, sample_packet_size, nal_length_size)
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+
+from .FrameExtractorConstants import *
+from .FrameExtractorSampleTables import create_sample_table
+
+# index file layout (all big endian):
+#   magic, version, identity length + identity json, timescale (0 when unknown)
+#   boxes count, (name, size, offset) per box
+#   tables count, (name, box offset, entries count, constant sample size, stored entries count, entries bytes) per table
+#   descriptions count, (id, type, width, height, codec data length, codec data) per sample description
+INDEX_HEADER_FORMAT = '!8sHI'
+INDEX_TIMESCALE_FORMAT = '!I'
+INDEX_COUNT_FORMAT = '!H'
+INDEX_BOX_FORMAT = '!4sQQ'
+INDEX_TABLE_FORMAT = '!4sQIIQ'
+INDEX_DESCRIPTION_FORMAT = '!H4sHHI'
+
+
+class IndexCache:
+    # persists the video trak boxes, decoded sample tables and sample descriptions of files,
+    # so extractors in other processes can skip reading the moov box
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def serialize_identity(file_identity):
+        return json.dumps(list(file_identity)).encode('UTF-8')
+
+    def get_index_path(self, file_identity):
+        identity_hash = hashlib.sha1(self.serialize_identity(file_identity)).hexdigest()
+        return os.path.join(self.cache_dir, f'{identity_hash}{INDEX_CACHE_FILE_EXTENSION}')
+
+    # returns (boxes, sample tables, sample descriptions, timescale) or None if there is no valid index for the identity
+    def load(self, file_identity):
+        try:
+            with open(self.get_index_path(file_identity), 'rb') as f:
+                index_bytes = f.read()
+        except OSError:
+            return None
+        try:
+            return self.parse_index(index_bytes, self.serialize_identity(file_identity))
+        except (struct.error, KeyError, UnicodeDecodeError):
+            return None
+
+    def parse_index(self, index_bytes, expected_identity):
+        offset = 0
+
+        def unpack(fmt):
+            nonlocal offset
+            values = struct.unpack_from(fmt, index_bytes, offset)
+            offset += struct.calcsize(fmt)
+            return values
+
+        def take(bytes_number):
+            nonlocal offset
+            if offset + bytes_number > len(index_bytes):
+                raise struct.error('index file cut')
+            taken = index_bytes[offset: offset + bytes_number]
+            offset += bytes_number
+            return taken
+
+        magic, version, identity_length = unpack(INDEX_HEADER_FORMAT)
+        if magic != INDEX_CACHE_MAGIC or version != INDEX_CACHE_VERSION or take(identity_length) != expected_identity:
+            return None
+        timescale = unpack(INDEX_TIMESCALE_FORMAT)[0] or None
+        boxes = {}
+        for _ in range(unpack(INDEX_COUNT_FORMAT)[0]):
+            box_name, box_size, box_offset = unpack(INDEX_BOX_FORMAT)
+            boxes[box_name.decode(encoding='UTF-8')] = (box_size, box_offset)
+        sample_tables = {}
+        for _ in range(unpack(INDEX_COUNT_FORMAT)[0]):
+            box_name, box_offset, entries_count, constant_sample_size, stored_entries = unpack(INDEX_TABLE_FORMAT)
+            table = create_sample_table(box_name.decode(encoding='UTF-8'), box_offset, entries_count, constant_sample_size)
+            table.set_entries(table.decode_entries(take(stored_entries * table.entry_size), stored_entries))
+            sample_tables[box_name.decode(encoding='UTF-8')] = table
+        sample_descriptions = {}
+        for _ in range(unpack(INDEX_COUNT_FORMAT)[0]):
+            description_id, description_type, width, height, codec_data_length = unpack(INDEX_DESCRIPTION_FORMAT)
+            sample_descriptions[description_id] = (description_type.decode(encoding='UTF-8'), take(codec_data_length), width, height)
+        if offset != len(index_bytes):
+            return None
+        return boxes, sample_tables, sample_descriptions, timescale
+
+    def store(self, file_identity, boxes, sample_tables, sample_descriptions, timescale=None):
+        identity = self.serialize_identity(file_identity)
+        parts = [struct.pack(INDEX_HEADER_FORMAT, INDEX_CACHE_MAGIC, INDEX_CACHE_VERSION, len(identity)), identity,
+                 struct.pack(INDEX_TIMESCALE_FORMAT, timescale or 0), struct.pack(INDEX_COUNT_FORMAT, len(boxes))]
+        for box_name, (box_size, box_offset) in boxes.items():
+            parts.append(struct.pack(INDEX_BOX_FORMAT, box_name.encode('UTF-8'), box_size, box_offset))
+        parts.append(struct.pack(INDEX_COUNT_FORMAT, len(sample_tables)))
+        for box_name, table in sample_tables.items():
+            entries = table.entries[:]
+            if sys.byteorder == 'little':
+                entries.byteswap()
+            parts.append(struct.pack(INDEX_TABLE_FORMAT, box_name.encode('UTF-8'), table.box_offset, table.entries_count,
+                                     getattr(table, 'constant_sample_size', 0), len(entries) // table.entry_fields))
+            parts.append(entries.tobytes())
+        parts.append(struct.pack(INDEX_COUNT_FORMAT, len(sample_descriptions)))
+        for description_id, (description_type, codec_data, width, height) in sample_descriptions.items():
+            parts.append(struct.pack(INDEX_DESCRIPTION_FORMAT, description_id, description_type.encode('UTF-8'), width, height, len(codec_data)))
+            parts.append(codec_data)
+        # write to a temporary file and rename so concurrent workers never read a half written index
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(b''.join(parts))
+            os.replace(tmp_path, self.get_index_path(file_identity))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,107 @@
+import threading
+import time
+
+
+class MetricsSink:
+    # receives the measurements of the extractors. subclasses export them to a metrics system.
+    # spans are timed phases, counters are summed and values are distributions like the requests sizes
+    def record_span(self, name, duration, attributes):
+        pass
+
+    def record_counter(self, name, value, attributes):
+        pass
+
+    def record_value(self, name, value, attributes):
+        pass
+
+
+class InMemoryMetricsSink(MetricsSink):
+    # aggregates the measurements in memory. may be shared by extractors running on many threads
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+        self.values = {}
+
+    # the attributes are part of the metric key, like requests{handler=FileStreamHandler}
+    @staticmethod
+    def get_key(name, attributes):
+        if not attributes:
+            return name
+        return name + '{' + ','.join(f'{key}={value}' for key, value in sorted(attributes.items())) + '}'
+
+    def record_span(self, name, duration, attributes):
+        with self.lock:
+            self.spans.setdefault(self.get_key(name, attributes), []).append(duration)
+
+    def record_counter(self, name, value, attributes):
+        key = self.get_key(name, attributes)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def record_value(self, name, value, attributes):
+        with self.lock:
+            self.values.setdefault(self.get_key(name, attributes), []).append(value)
+
+    def get_report(self):
+        with self.lock:
+            return {'spans': {key: {'count': len(durations), 'total': sum(durations), 'max': max(durations)} for key, durations in self.spans.items()},
+                    'counters': dict(self.counters),
+                    'values': {key: {'count': len(values), 'total': sum(values), 'max': max(values)} for key, values in self.values.items()}}
+
+
+class Span:
+    def __init__(self, instrumentation, name, attributes):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.attributes = attributes
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    # spans that end with an exception are marked as failed
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.attributes['failed'] = True
+        self.instrumentation.record_span(self.name, time.perf_counter() - self.start_time, self.attributes)
+        return False
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Instrumentation:
+    # forwards the measurements of an extractor to its sinks. without sinks every call returns right away
+    # and spans are a shared no op context manager, so disabled instrumentation costs a call per measurement
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.enabled = bool(self.sinks)
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, attributes)
+
+    def record_span(self, name, duration, attributes):
+        for sink in self.sinks:
+            sink.record_span(name, duration, attributes)
+
+    def count(self, name, value=1, **attributes):
+        if self.enabled:
+            for sink in self.sinks:
+                sink.record_counter(name, value, attributes)
+
+    def observe(self, name, value, **attributes):
+        if self.enabled:
+            for sink in self.sinks:
+                sink.record_value(name, value, attributes)
@@ -0,0 +1,38 @@
+from .FrameExtractorConstants import *
+
+
+class ReadCostModel:
+    # the cost of reading in seconds: a fixed latency per request plus the transfer time of the bytes.
+    # a local file has almost no request latency while the reads of a remote source are dominated by it
+    def __init__(self, request_latency=DEFAULT_REQUEST_LATENCY, bytes_per_second=DEFAULT_BYTES_PER_SECOND):
+        self.request_latency = request_latency
+        self.bytes_per_second = bytes_per_second
+
+    def get_read_cost(self, requests_number, bytes_number):
+        return requests_number * self.request_latency + bytes_number / self.bytes_per_second
+
+    # downloading up to this many extra bytes costs less than another request
+    def get_break_even_size(self):
+        return int(self.request_latency * self.bytes_per_second)
+
+
+class RangePlanner:
+    # collects every byte range a phase of the extraction needs before anything is fetched, and merges ranges
+    # whose gaps are cheaper to download than to pay another request for
+    def __init__(self, gap_threshold):
+        self.gap_threshold = gap_threshold
+        self.ranges = []
+
+    def add_range(self, offset, bytes_number):
+        if bytes_number > 0:
+            self.ranges.append((offset, offset + bytes_number))
+
+    # returns the merged plan as sorted (offset, bytes number) pairs
+    def get_plan(self):
+        plan = []
+        for start, end in sorted(self.ranges):
+            if plan and start - plan[-1][1] <= self.gap_threshold:
+                plan[-1][1] = max(plan[-1][1], end)
+            else:
+                plan.append([start, end])
+        return [(start, end - start) for start, end in plan]
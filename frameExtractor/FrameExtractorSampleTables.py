@@ -0,0 +1,304 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from .FrameExtractorConstants import *
+from .FrameExtractorHelpers import *
+
+
+# merges sorted (first, last) entry spans that overlap or touch so every span is read and decoded in one call
+def merge_entries_spans(spans):
+    merged = []
+    for first, last in sorted(spans):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return merged
+
+
+class SampleTable:
+    # the offset of the first entry from the start of the box, the bytes of one entry and the integers in one entry
+    entries_offset = TABLE_ENTRIES_OFFSET
+    entry_size = INT_SIZE
+    entry_fields = 1
+
+    def __init__(self, box_offset, entries_count):
+        self.box_offset = box_offset
+        self.entries_count = entries_count
+        # the whole decoded table. None until the table is loaded
+        self.entries = None
+
+    def decode_entries(self, entries_bytes, entries_number):
+        return read_unsigned_integers_array(entries_bytes, 0, entries_number * self.entry_fields)
+
+    def is_loaded(self):
+        return self.entries is not None
+
+    def set_entries(self, entries):
+        self.entries = entries
+
+    # read the whole table once so every later lookup is served from memory
+    def load(self, bytes_reader):
+        self.set_entries(self.read_entries(bytes_reader, 0, self.entries_count))
+
+    # the (offset, bytes number) range of entries [first_entry, first_entry + entries_number) in the file
+    def get_entries_range(self, first_entry, entries_number):
+        return self.box_offset + self.entries_offset + first_entry * self.entry_size, entries_number * self.entry_size
+
+    # the ranges that still have to be fetched to read the given (first entry, entries number) spans
+    def get_missing_ranges(self, entries_spans):
+        if self.entries is not None:
+            return []
+        return [self.get_entries_range(first_entry, entries_number) for first_entry, entries_number in entries_spans]
+
+    # read entries [first_entry, first_entry + entries_number) with a single get_bytes call
+    def read_entries(self, bytes_reader, first_entry, entries_number):
+        if self.entries is not None:
+            return self.entries[first_entry * self.entry_fields: (first_entry + entries_number) * self.entry_fields]
+        entries_bytes = bytes_reader(*self.get_entries_range(first_entry, entries_number))
+        return self.decode_entries(entries_bytes, entries_number)
+
+
+class SyncSampleTable(SampleTable):
+    # stss. sorted numbers of the key samples
+    def get_key_sample(self, bytes_reader, entry):
+        return self.read_entries(bytes_reader, entry, 1)[0]
+
+
+class SampleSizeTable(SampleTable):
+    # stsz. when all the samples have the same size the box has no table
+    entries_offset = STSZ_ENTRIES_OFFSET
+
+    def __init__(self, box_offset, entries_count, constant_sample_size):
+        super().__init__(box_offset, entries_count)
+        self.constant_sample_size = constant_sample_size
+
+    def load(self, bytes_reader):
+        if self.constant_sample_size:
+            self.set_entries(array(UNSIGNED_INT_TYPECODE))
+        else:
+            super().load(bytes_reader)
+
+    def get_samples_ranges(self, chunks_samples):
+        if self.constant_sample_size:
+            return []
+        return self.get_missing_ranges((first - 1, last - first + 1) for first, last in merge_entries_spans(chunks_samples))
+
+    # receives (chunk first sample, sample number) pairs and returns (offset in chunk, sample size) for each of them
+    def get_samples_offsets_in_chunks(self, bytes_reader, chunks_samples):
+        if self.constant_sample_size:
+            return [((sample_number - chunk_first_sample) * self.constant_sample_size, self.constant_sample_size)
+                    for chunk_first_sample, sample_number in chunks_samples]
+        spans = merge_entries_spans(chunks_samples)
+        spans_first_samples = [first for first, _ in spans]
+        spans_prefix_sums = []
+        for first, last in spans:
+            sizes = self.read_entries(bytes_reader, first - 1, last - first + 1)
+            spans_prefix_sums.append(list(accumulate(sizes, initial=0)))
+        to_return = []
+        for chunk_first_sample, sample_number in chunks_samples:
+            span_index = bisect_right(spans_first_samples, chunk_first_sample) - 1
+            prefix_sums = spans_prefix_sums[span_index]
+            span_first_sample = spans_first_samples[span_index]
+            sample_index = sample_number - span_first_sample
+            offset_in_chunk = prefix_sums[sample_index] - prefix_sums[chunk_first_sample - span_first_sample]
+            to_return.append((offset_in_chunk, prefix_sums[sample_index + 1] - prefix_sums[sample_index]))
+        return to_return
+
+
+class ChunkOffsetTable(SampleTable):
+    # stco
+    def get_chunks_ranges(self, chunks_numbers):
+        return self.get_missing_ranges((first - 1, last - first + 1) for first, last in
+                                       merge_entries_spans((chunk_number, chunk_number) for chunk_number in chunks_numbers))
+
+    def get_chunks_offsets(self, bytes_reader, chunks_numbers):
+        offsets = {}
+        for first, last in merge_entries_spans((chunk_number, chunk_number) for chunk_number in chunks_numbers):
+            entries = self.read_entries(bytes_reader, first - 1, last - first + 1)
+            for i, chunk_offset in enumerate(entries):
+                offsets[first + i] = chunk_offset
+        return [offsets[chunk_number] for chunk_number in chunks_numbers]
+
+
+class LargeChunkOffsetTable(ChunkOffsetTable):
+    # co64
+    entry_size = LONG_SIZE
+
+    def decode_entries(self, entries_bytes, entries_number):
+        return read_unsigned_longs_array(entries_bytes, 0, entries_number)
+
+
+class SampleToChunkTable(SampleTable):
+    # stsc. every entry is (first chunk, samples per chunk, sample description index).
+    # small tables are loaded whole. big tables are decoded in pages around the looked up samples: the first sample of an entry
+    # is the sum of the entries before it, so pages are decoded next to the sparse checkpoints of the pages whose first sample
+    # is known. the first page starts at sample 1 and the chunks and samples totals bound the table from its end
+    entry_size = INT_SIZE * STSC_ENTRY_FIELDS
+    entry_fields = STSC_ENTRY_FIELDS
+    page_entries = STSC_PAGE_ENTRIES
+
+    def __init__(self, box_offset, entries_count):
+        super().__init__(box_offset, entries_count)
+        self.first_chunks = None
+        self.samples_per_chunk = None
+        self.description_ids = None
+        # the number of the first sample described by every entry
+        self.first_samples = None
+        self.chunks_count = None
+        # sorted page indexes with a known first sample, and their first samples
+        self.checkpoints_pages = None
+        self.checkpoints_samples = None
+        # decoded pages: page index -> (first chunks, samples per chunk, description ids, first samples)
+        self.pages = {}
+
+    def set_entries(self, entries):
+        super().set_entries(entries)
+        self.first_chunks = entries[0::STSC_ENTRY_FIELDS]
+        self.samples_per_chunk = entries[1::STSC_ENTRY_FIELDS]
+        self.description_ids = entries[2::STSC_ENTRY_FIELDS]
+        entries_samples = ((next_first_chunk - first_chunk) * samples_per_chunk for first_chunk, next_first_chunk, samples_per_chunk in
+                           zip(self.first_chunks, self.first_chunks[1:], self.samples_per_chunk))
+        self.first_samples = array(UNSIGNED_LONG_TYPECODE, accumulate(entries_samples, initial=1))
+
+    def get_pages_count(self):
+        return (self.entries_count + self.page_entries - 1) // self.page_entries
+
+    # starts the paged lookup. the page after the last one starts after the last chunk and the last sample
+    def set_totals(self, chunks_count, samples_count):
+        if self.checkpoints_pages is None:
+            self.chunks_count = chunks_count
+            self.checkpoints_pages = [0, self.get_pages_count()]
+            self.checkpoints_samples = [1, samples_count + 1]
+
+    def add_checkpoint(self, page, first_sample):
+        index = bisect_left(self.checkpoints_pages, page)
+        if index == len(self.checkpoints_pages) or self.checkpoints_pages[index] != page:
+            self.checkpoints_pages.insert(index, page)
+            self.checkpoints_samples.insert(index, first_sample)
+
+    # the (first page, last page) span to decode next on the way to the page of the sample. None when that page is decoded.
+    # between two checkpoints the pages are decoded from the nearer checkpoint up to the page estimated by interpolation
+    def get_sample_pages_span(self, sample_number):
+        index = min(max(bisect_right(self.checkpoints_samples, sample_number) - 1, 0), len(self.checkpoints_pages) - 2)
+        first_page, next_page = self.checkpoints_pages[index], self.checkpoints_pages[index + 1]
+        if next_page == first_page + 1:
+            return None if first_page in self.pages else (first_page, first_page)
+        first_sample, next_sample = self.checkpoints_samples[index], self.checkpoints_samples[index + 1]
+        estimated_page = first_page + (sample_number - first_sample) * (next_page - first_page) // max(next_sample - first_sample, 1)
+        estimated_page = min(max(estimated_page, first_page), next_page - 1)
+        if estimated_page - first_page <= next_page - 1 - estimated_page:
+            return first_page, estimated_page
+        return estimated_page, next_page - 1
+
+    def get_pages_spans(self, samples_numbers):
+        if self.entries is not None:
+            return []
+        return merge_entries_spans({pages_span for pages_span in map(self.get_sample_pages_span, samples_numbers) if pages_span is not None})
+
+    # the entries of the pages and the first entry of the next page, which ends the last entry of the span
+    def get_pages_entries_span(self, first_page, last_page):
+        first_entry = first_page * self.page_entries
+        return first_entry, min((last_page + 1) * self.page_entries + 1, self.entries_count) - first_entry
+
+    def get_pages_ranges(self, pages_spans):
+        return self.get_missing_ranges(self.get_pages_entries_span(first_page, last_page) for first_page, last_page in pages_spans)
+
+    def load_pages(self, bytes_reader, pages_spans):
+        for first_page, last_page in pages_spans:
+            self.decode_pages(first_page, last_page, self.read_entries(bytes_reader, *self.get_pages_entries_span(first_page, last_page)))
+
+    # the samples of the span are counted from zero and shifted by a checkpoint inside the span or right after it
+    def decode_pages(self, first_page, last_page, entries):
+        first_entry = first_page * self.page_entries
+        entries_number = min((last_page + 1) * self.page_entries, self.entries_count) - first_entry
+        first_chunks = entries[0::STSC_ENTRY_FIELDS]
+        samples_per_chunk = entries[1::STSC_ENTRY_FIELDS]
+        description_ids = entries[2::STSC_ENTRY_FIELDS]
+        next_first_chunks = first_chunks[1:] if len(first_chunks) > entries_number else first_chunks[1:] + array(UNSIGNED_INT_TYPECODE, [self.chunks_count + 1])
+        entries_samples = ((next_first_chunk - first_chunk) * samples_per_chunk for first_chunk, next_first_chunk, samples_per_chunk in
+                           zip(first_chunks, next_first_chunks, samples_per_chunk))
+        relative_first_samples = list(accumulate(entries_samples, initial=0))
+        index = bisect_left(self.checkpoints_pages, first_page)
+        checkpoint_page, checkpoint_sample = self.checkpoints_pages[index], self.checkpoints_samples[index]
+        shift = checkpoint_sample - relative_first_samples[min((checkpoint_page - first_page) * self.page_entries, entries_number)]
+        first_samples = array(UNSIGNED_LONG_TYPECODE, (relative_first_sample + shift for relative_first_sample in relative_first_samples))
+        for page in range(first_page, last_page + 1):
+            page_first_entry = (page - first_page) * self.page_entries
+            page_end_entry = min(page_first_entry + self.page_entries, entries_number)
+            self.pages[page] = (first_chunks[page_first_entry:page_end_entry], samples_per_chunk[page_first_entry:page_end_entry],
+                                description_ids[page_first_entry:page_end_entry], first_samples[page_first_entry:page_end_entry])
+            self.add_checkpoint(page, first_samples[page_first_entry])
+        self.add_checkpoint(last_page + 1, first_samples[entries_number])
+
+    # returns (chunk number, chunk first sample, sample description index) of the chunk holding the sample
+    def get_sample_chunk(self, sample_number):
+        if self.entries is not None:
+            page = (self.first_chunks, self.samples_per_chunk, self.description_ids, self.first_samples)
+        else:
+            page = self.pages[self.checkpoints_pages[bisect_right(self.checkpoints_samples, sample_number) - 1]]
+        first_chunks, samples_per_chunk, description_ids, first_samples = page
+        entry = bisect_right(first_samples, sample_number) - 1
+        entry_chunk_index = (sample_number - first_samples[entry]) // samples_per_chunk[entry]
+        return (first_chunks[entry] + entry_chunk_index,
+                first_samples[entry] + entry_chunk_index * samples_per_chunk[entry],
+                description_ids[entry])
+
+
+class RunLengthSampleTable(SampleTable):
+    # a table of (samples count, value) runs. the tables are loaded whole and looked up by sample number
+    entry_size = INT_SIZE * RUN_LENGTH_ENTRY_FIELDS
+    entry_fields = RUN_LENGTH_ENTRY_FIELDS
+
+    def __init__(self, box_offset, entries_count):
+        super().__init__(box_offset, entries_count)
+        self.samples_counts = None
+        self.values = None
+        # the number of the first sample of every run
+        self.first_samples = None
+
+    def set_entries(self, entries):
+        super().set_entries(entries)
+        self.samples_counts = entries[0::RUN_LENGTH_ENTRY_FIELDS]
+        self.values = entries[1::RUN_LENGTH_ENTRY_FIELDS]
+        self.first_samples = array(UNSIGNED_LONG_TYPECODE, accumulate(self.samples_counts, initial=1))
+
+    def get_sample_entry(self, sample_number):
+        return min(bisect_right(self.first_samples, sample_number) - 1, len(self.values) - 1)
+
+
+class TimeToSampleTable(RunLengthSampleTable):
+    # stts. every entry is (samples count, sample duration). the decoding time of a sample is the sum of the durations before it
+    def __init__(self, box_offset, entries_count):
+        super().__init__(box_offset, entries_count)
+        # the decoding time of the first sample of every run
+        self.first_times = None
+
+    def set_entries(self, entries):
+        super().set_entries(entries)
+        self.first_times = array(UNSIGNED_LONG_TYPECODE, accumulate((samples_count * duration for samples_count, duration in
+                                                                     zip(self.samples_counts, self.values)), initial=0))
+
+    def get_sample_time(self, sample_number):
+        entry = self.get_sample_entry(sample_number)
+        return self.first_times[entry] + (sample_number - self.first_samples[entry]) * self.values[entry]
+
+
+class CompositionOffsetTable(RunLengthSampleTable):
+    # ctts. every entry is (samples count, composition offset). version 1 offsets are signed so all the offsets are read as signed
+    def get_sample_offset(self, sample_number):
+        if not self.values:
+            return 0
+        offset = self.values[self.get_sample_entry(sample_number)]
+        return offset - (1 << 32) if offset & (1 << 31) else offset
+
+
+SAMPLE_TABLES_CLASSES = {'stss': SyncSampleTable, 'stsc': SampleToChunkTable, 'stsz': SampleSizeTable, 'stco': ChunkOffsetTable,
+                         'co64': LargeChunkOffsetTable, 'stts': TimeToSampleTable, 'ctts': CompositionOffsetTable}
+
+
+def create_sample_table(box_name, box_offset, entries_count, constant_sample_size=0):
+    if box_name == 'stsz':
+        return SampleSizeTable(box_offset, entries_count, constant_sample_size)
+    return SAMPLE_TABLES_CLASSES[box_name](box_offset, entries_count)
@@ -0,0 +1,147 @@
+import bisect
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from .FrameExtractorConstants import *
+
+
+class SharedChunkCache:
+    # process wide cache of file blocks keyed by (file identity, block offset), shared by all the extractors that opt into it.
+    # concurrent misses of the same block are fetched once: the first caller fetches and the others wait for its result
+    def __init__(self, block_size=DEFAULT_CHUNK_SIZE, byte_budget=DEFAULT_SHARED_CACHE_BUDGET):
+        self.block_size = block_size
+        self.byte_budget = byte_budget
+        self.lock = threading.Lock()
+        # (file identity, block offset) -> block bytes, in least recently used order
+        self.blocks = OrderedDict()
+        self.stored_bytes = 0
+        # (file identity, block offset) -> future of the block bytes
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    def get_stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'waits': self.waits, 'stored_bytes': self.stored_bytes}
+
+    def get_blocks_offsets(self, offset, bytes_number):
+        return range(offset - offset % self.block_size, offset + bytes_number, self.block_size)
+
+    # returns (cached blocks, owned futures, waited futures) of the blocks of the ranges. the caller fetches the owned blocks
+    def claim_blocks(self, file_identity, ranges):
+        blocks = {}
+        owned_futures = {}
+        waited_futures = {}
+        with self.lock:
+            for offset, bytes_number in ranges:
+                for block_offset in self.get_blocks_offsets(offset, bytes_number):
+                    key = (file_identity, block_offset)
+                    if block_offset in blocks or block_offset in owned_futures or block_offset in waited_futures:
+                        continue
+                    if key in self.blocks:
+                        self.blocks.move_to_end(key)
+                        blocks[block_offset] = self.blocks[key]
+                        self.hits += 1
+                    elif key in self.in_flight:
+                        waited_futures[block_offset] = self.in_flight[key]
+                        self.waits += 1
+                    else:
+                        owned_futures[block_offset] = self.in_flight[key] = Future()
+                        self.misses += 1
+        return blocks, owned_futures, waited_futures
+
+    # reads (offset, bytes number) ranges of the file. fetch receives the missing ranges and returns range offset -> range bytes.
+    # the fetched ranges are aligned to the read alignment of the handler, whatever the block size.
+    # returns (range offset -> range bytes, requests made, bytes fetched, cached bytes). blocks served from the cache or by
+    # another caller cost nothing and their bytes are the cached bytes
+    def read_ranges(self, file_identity, ranges, fetch, read_alignment=1):
+        blocks, owned_futures, waited_futures = self.claim_blocks(file_identity, ranges)
+        cached_bytes = sum(len(block) for block in blocks.values())
+        # the owned blocks are fetched before waiting on others so two callers never wait on each other
+        requests_count = fetched_bytes = 0
+        if owned_futures:
+            runs = self.get_runs(owned_futures, read_alignment)
+            try:
+                runs_dict = fetch(runs)
+            except BaseException as e:
+                self.fail_blocks(file_identity, owned_futures, e)
+                raise
+            owned_blocks, fetched_bytes = self.store_blocks(file_identity, owned_futures, runs, runs_dict)
+            blocks.update(owned_blocks)
+            requests_count = 1
+        for block_offset, future in waited_futures.items():
+            blocks[block_offset] = future.result()
+            cached_bytes += len(blocks[block_offset])
+        return self.join_ranges(ranges, blocks), requests_count, fetched_bytes, cached_bytes
+
+    # the awaitable twin of read_ranges for async extractors. fetch is a coroutine function and the blocks fetched by other
+    # callers, async or not, are awaited without blocking the loop
+    async def read_ranges_async(self, file_identity, ranges, fetch, read_alignment=1):
+        # asyncio is imported here since importing it dominates the import of the synchronous extractor
+        import asyncio
+        blocks, owned_futures, waited_futures = self.claim_blocks(file_identity, ranges)
+        cached_bytes = sum(len(block) for block in blocks.values())
+        requests_count = fetched_bytes = 0
+        if owned_futures:
+            runs = self.get_runs(owned_futures, read_alignment)
+            try:
+                runs_dict = await fetch(runs)
+            except BaseException as e:
+                self.fail_blocks(file_identity, owned_futures, e)
+                raise
+            owned_blocks, fetched_bytes = self.store_blocks(file_identity, owned_futures, runs, runs_dict)
+            blocks.update(owned_blocks)
+            requests_count = 1
+        for block_offset, future in waited_futures.items():
+            blocks[block_offset] = await asyncio.wrap_future(future)
+            cached_bytes += len(blocks[block_offset])
+        return self.join_ranges(ranges, blocks), requests_count, fetched_bytes, cached_bytes
+
+    def join_ranges(self, ranges, blocks):
+        to_return = {}
+        for offset, bytes_number in ranges:
+            range_bytes = b''.join(blocks[block_offset] for block_offset in self.get_blocks_offsets(offset, bytes_number))
+            first_block_offset = offset - offset % self.block_size
+            to_return[offset] = range_bytes[offset - first_block_offset: offset - first_block_offset + bytes_number]
+        return to_return
+
+    # the (offset, bytes number) runs of touching owned blocks, widened to the read alignment. handlers that read whole chunks
+    # get reads on their chunk boundaries and the widened bytes outside the owned blocks are dropped
+    def get_runs(self, owned_futures, read_alignment=1):
+        runs = []
+        for block_offset in sorted(owned_futures):
+            run_offset = block_offset - block_offset % read_alignment
+            run_end = -(-(block_offset + self.block_size) // read_alignment) * read_alignment
+            if runs and runs[-1][1] >= run_offset:
+                runs[-1][1] = max(runs[-1][1], run_end)
+            else:
+                runs.append([run_offset, run_end])
+        return [(run_offset, run_end - run_offset) for run_offset, run_end in runs]
+
+    def fail_blocks(self, file_identity, owned_futures, exception):
+        with self.lock:
+            for block_offset, future in owned_futures.items():
+                del self.in_flight[(file_identity, block_offset)]
+                future.set_exception(exception)
+
+    # returns (block offset -> block bytes, bytes fetched)
+    def store_blocks(self, file_identity, owned_futures, runs, runs_dict):
+        blocks = {}
+        runs_offsets = [run_offset for run_offset, _ in runs]
+        for block_offset in owned_futures:
+            run_offset = runs_offsets[bisect.bisect_right(runs_offsets, block_offset) - 1]
+            run_bytes = runs_dict.get(run_offset, bytes())
+            blocks[block_offset] = bytes(run_bytes[block_offset - run_offset: block_offset - run_offset + self.block_size])
+        with self.lock:
+            for block_offset, future in owned_futures.items():
+                key = (file_identity, block_offset)
+                del self.in_flight[key]
+                self.blocks[key] = blocks[block_offset]
+                self.stored_bytes += len(blocks[block_offset])
+                future.set_result(blocks[block_offset])
+            while self.byte_budget is not None and self.stored_bytes > self.byte_budget and self.blocks:
+                _, evicted_block = self.blocks.popitem(last=False)
+                self.stored_bytes -= len(evicted_block)
+        return blocks, sum(len(run_bytes) for run_bytes in runs_dict.values())
@@ -0,0 +1,19 @@
+from types import MappingProxyType
+
+
+class TrackIndex:
+    # the parsed video track of a file: its boxes, whole sample tables, sample descriptions and timescale, and for fragmented files
+    # the track id, the trex defaults and the whole tfra. it never changes after it is built, so extractors on many threads share
+    # it without locks while each of them keeps its own targets, reads and accounting
+    def __init__(self, file_size, boxes, sample_tables, sample_descriptions, timescale=None, track_id=None, trex_defaults=None,
+                 keys_times=None):
+        self.file_size = file_size
+        # read only views. an extractor that tries to change the shared index fails instead of racing with the others
+        self.boxes = MappingProxyType(dict(boxes))
+        self.sample_tables = MappingProxyType(dict(sample_tables))
+        self.sample_descriptions = MappingProxyType(dict(sample_descriptions))
+        self.timescale = timescale
+        self.track_id = track_id
+        self.trex_defaults = trex_defaults
+        # the presentation times of the key samples, so the time seeks of every extractor are binary searches
+        self.keys_times = keys_times
@@ -6,8 +6,21 @@ class FrameExtractorCodec:
     def get_extension_name(self):
         raise NotImplementedError()
 
+    # the ffmpeg decoder name of the codec
+    def get_decoder_name(self):
+        raise NotImplementedError()
+
+    # the ffmpeg demuxer name of the raw elementary stream the converted packets form
+    def get_raw_format(self):
+        raise NotImplementedError()
+
     def get_private_data(self, codec_data):
         raise NotImplementedError()
 
     def decode_packet(self, packet, packet_size, nal_length):
         raise NotImplementedError()
+
+    # appends the converted packet to the output bytearray of all the converted packets
+    def write_packet(self, output, packet, packet_size, nal_length):
+        output += self.decode_packet(packet, packet_size, nal_length)
+        return output
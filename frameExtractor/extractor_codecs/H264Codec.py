@@ -1,5 +1,5 @@
 from .FrameExtractorCodecBase import FrameExtractorCodec
-from frameExtractor.FrameExtractorHelpers import *
+from ..FrameExtractorHelpers import *
 
 
 class H264Codec(FrameExtractorCodec):
@@ -9,6 +9,12 @@ class H264Codec(FrameExtractorCodec):
     def get_extension_name(self):
         return 'avcC'
 
+    def get_decoder_name(self):
+        return 'h264'
+
+    def get_raw_format(self):
+        return 'h264'
+
     def get_private_data(self, codec_data):
         nals_number = (read_unsigned_byte(codec_data, 4) & 3) + 1
         nals_types = 0  # we want only sps and pps
@@ -29,3 +35,6 @@ class H264Codec(FrameExtractorCodec):
 
     def decode_packet(self, packet, packet_size, nal_length):
         return convert_avcc_packet_to_annex_b(packet, packet_size, nal_length)
+
+    def write_packet(self, output, packet, packet_size, nal_length):
+        return write_avcc_packet_as_annex_b(output, packet, packet_size, nal_length)
@@ -1,5 +1,5 @@
 from .FrameExtractorCodecBase import FrameExtractorCodec
-from frameExtractor.FrameExtractorHelpers import *
+from ..FrameExtractorHelpers import *
 
 
 class H265Codec(FrameExtractorCodec):
@@ -9,9 +9,16 @@ class H265Codec(FrameExtractorCodec):
     def get_extension_name(self):
         return 'hvcC'
 
+    def get_decoder_name(self):
+        return 'hevc'
+
+    def get_raw_format(self):
+        return 'hevc'
+
     def get_private_data(self, codec_data):
         codec_private_bytes = bytes()
-        nals_number = (read_unsigned_byte(codec_data, 22) & 3) + 1
+        # the length size is in the byte before the number of nal arrays
+        nals_number = (read_unsigned_byte(codec_data, 21) & 3) + 1
         offset_in_box = 23
         nals_types = 0  # we want to iterate only vps, sps and pps
         while offset_in_box < len(codec_data) and nals_types < 3:
@@ -30,3 +37,6 @@ class H265Codec(FrameExtractorCodec):
 
     def decode_packet(self, packet, packet_size, nal_length):
         return convert_avcc_packet_to_annex_b(packet, packet_size, nal_length)
+
+    def write_packet(self, output, packet, packet_size, nal_length):
+        return write_avcc_packet_as_annex_b(output, packet, packet_size, nal_length)
@@ -8,6 +8,12 @@ class MPEG4Codec(FrameExtractorCodec):
     def get_extension_name(self):
         return 'esds'
 
+    def get_decoder_name(self):
+        return 'mpeg4'
+
+    def get_raw_format(self):
+        return 'm4v'
+
     def get_private_data(self, codec_data):
         return 4, codec_data[25:]
 
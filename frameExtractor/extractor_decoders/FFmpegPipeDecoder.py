@@ -0,0 +1,42 @@
+import shutil
+import subprocess
+
+import numpy
+
+from .FrameDecoderBase import FrameDecoder
+
+BGR_CHANNELS = 3
+
+
+class FFmpegPipeDecoder(FrameDecoder):
+    # pipes the packets through an ffmpeg process and reads the frames back as raw bgr pixels.
+    # the frames are scaled to the sample description dimensions so every frame can be cut from the output by its index
+    def __init__(self, ffmpeg_path='ffmpeg'):
+        self.ffmpeg_path = ffmpeg_path
+
+    def get_name(self):
+        return 'ffmpeg'
+
+    def is_available(self):
+        return shutil.which(self.ffmpeg_path) is not None
+
+    # the frames pass through as they are decoded. otherwise ffmpeg duplicates or drops frames by the timestamps it makes up for the
+    # raw stream and the frame index, counted in samples, points to another frame. ffmpeg before 5.1 only knows the older vsync option
+    def run_ffmpeg(self, packets, video_codec, width, height, passthrough_option):
+        return subprocess.run([self.ffmpeg_path, '-loglevel', 'error', '-f', video_codec.get_raw_format(), '-i', 'pipe:0',
+                               '-vf', f'scale={width}:{height}', passthrough_option, 'passthrough', '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+                               'pipe:1'], input=packets, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def decode_frame(self, packets, video_codec, width, height, frame_index=-1):
+        packets = bytes(packets)
+        process = self.run_ffmpeg(packets, video_codec, width, height, '-fps_mode')
+        if process.returncode != 0 and b'fps_mode' in process.stderr:
+            process = self.run_ffmpeg(packets, video_codec, width, height, '-vsync')
+        if process.returncode != 0:
+            raise RuntimeError(process.stderr.decode(errors='replace').strip())
+        frame_size = width * height * BGR_CHANNELS
+        frames_number = len(process.stdout) // frame_size if frame_size else 0
+        if not -frames_number <= frame_index < frames_number:
+            return None
+        frame_offset = (frame_index % frames_number) * frame_size
+        return numpy.frombuffer(process.stdout, dtype=numpy.uint8, count=frame_size, offset=frame_offset).reshape((height, width, BGR_CHANNELS))
@@ -0,0 +1,48 @@
+import importlib
+
+
+class FrameDecoder:
+    def get_name(self):
+        raise NotImplementedError()
+
+    # whether the decoder dependencies exist in this environment
+    def is_available(self):
+        raise NotImplementedError()
+
+    # decodes the annex b packets and returns a frame as a bgr numpy array, or None if there is no such frame.
+    # the frame index counts the frames in presentation order, the order decoders output them. -1 is the last frame
+    def decode_frame(self, packets, video_codec, width, height, frame_index=-1):
+        raise NotImplementedError()
+
+
+# decoder backends by name as (module, class). a backend module and the libraries it needs are imported on its first use,
+# so extractors that never decode don't pay for opencv or pyav
+DECODER_BACKENDS = {'pyav': ('.PyAVDecoder', 'PyAVDecoder'),
+                    'ffmpeg': ('.FFmpegPipeDecoder', 'FFmpegPipeDecoder'),
+                    'opencv': ('.OpenCVFileDecoder', 'OpenCVFileDecoder')}
+DEFAULT_DECODER_BACKENDS = ('pyav', 'ffmpeg', 'opencv')
+
+
+# module names starting with a dot are relative to this package
+def register_decoder_backend(name, module_name, class_name):
+    DECODER_BACKENDS[name] = (module_name, class_name)
+
+
+# returns None when the libraries of the backend can't be imported
+def create_decoder(name):
+    module_name, class_name = DECODER_BACKENDS[name]
+    try:
+        module = importlib.import_module(module_name, __package__)
+    except ImportError:
+        return None
+    return getattr(module, class_name)()
+
+
+# decoders are decoder instances or backend names, created only when the decoders before them are not available
+def get_available_decoder(decoders):
+    for decoder in decoders:
+        if isinstance(decoder, str):
+            decoder = create_decoder(decoder)
+        if decoder is not None and decoder.is_available():
+            return decoder
+    return None
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+import cv2
+
+from .FrameDecoderBase import FrameDecoder
+
+
+class OpenCVFileDecoder(FrameDecoder):
+    # the last resort. writes the packets to a unique temporary file and decodes it with opencv
+    def get_name(self):
+        return 'opencv'
+
+    def is_available(self):
+        return True
+
+    def decode_frame(self, packets, video_codec, width, height, frame_index=-1):
+        fd, tmp_file_name = tempfile.mkstemp(suffix='.mp4')
+        try:
+            with os.fdopen(fd, "wb") as fw:
+                fw.write(packets)
+            vidcap = cv2.VideoCapture(tmp_file_name)
+            target_image = None
+            decoded_frames = 0
+            success, image = vidcap.read()
+            while success and (frame_index < 0 or decoded_frames <= frame_index):
+                if frame_index < 0 or decoded_frames == frame_index:
+                    target_image = image
+                decoded_frames += 1
+                success, image = vidcap.read()
+            vidcap.release()
+            return target_image
+        finally:
+            os.remove(tmp_file_name)
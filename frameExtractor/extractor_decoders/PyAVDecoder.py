@@ -0,0 +1,29 @@
+from .FrameDecoderBase import FrameDecoder
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+class PyAVDecoder(FrameDecoder):
+    # feeds the packets to a libavcodec context in memory. no container is needed since the packets are a raw elementary stream
+    def get_name(self):
+        return 'pyav'
+
+    def is_available(self):
+        return av is not None
+
+    def decode_frame(self, packets, video_codec, width, height, frame_index=-1):
+        codec_context = av.CodecContext.create(video_codec.get_decoder_name(), 'r')
+        target_frame = None
+        decoded_frames = 0
+        # parsing without data flushes the parser and decoding without a packet flushes the delayed frames
+        for packet in codec_context.parse(bytes(packets)) + codec_context.parse() + [None]:
+            for frame in codec_context.decode(packet):
+                if frame_index < 0 or decoded_frames == frame_index:
+                    target_frame = frame
+                decoded_frames += 1
+            if 0 <= frame_index < decoded_frames:
+                break
+        return target_frame.to_ndarray(format='bgr24') if target_frame is not None else None
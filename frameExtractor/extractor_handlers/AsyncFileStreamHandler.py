@@ -0,0 +1,31 @@
+import asyncio
+
+from .AsyncStreamHandlerBase import AsyncStreamHandler
+from .FileStreamHandler import FileStreamHandler
+
+
+class AsyncFileStreamHandler(AsyncStreamHandler):
+    # reads local files in the default executor so the event loop is never blocked on disk
+    def __init__(self, src_file_name, dst_file_name):
+        self.file_handler = FileStreamHandler(src_file_name, dst_file_name)
+
+    def get_file_size(self):
+        return self.file_handler.get_file_size()
+
+    def get_file_name(self):
+        return self.file_handler.get_file_name()
+
+    def get_file_identity(self):
+        return self.file_handler.get_file_identity()
+
+    async def read_chunks(self, offset, chunks_number, chunk_size):
+        return await asyncio.get_running_loop().run_in_executor(None, self.file_handler.read_chunks, offset, chunks_number, chunk_size)
+
+    def get_read_alignment(self, chunk_size):
+        return self.file_handler.get_read_alignment(chunk_size)
+
+    async def read_ranges(self, ranges, chunk_size):
+        return await asyncio.get_running_loop().run_in_executor(None, self.file_handler.read_ranges, ranges, chunk_size)
+
+    def describe_stream(self):
+        self.file_handler.describe_stream()
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from .AsyncStreamHandlerBase import AsyncStreamHandler
+from .ResilientStreamHandler import Deadline, DeadlineExceededError, RetryPolicy, TokenBucket, extraction_deadlines
+
+
+class AsyncResilientStreamHandler(AsyncStreamHandler):
+    # the retries, deadline, rate limiter and hedged reads of ResilientStreamHandler for async handlers.
+    # every wait is awaited so the event loop keeps serving the other extractions
+    def __init__(self, stream_handler: AsyncStreamHandler, retry_policy: RetryPolicy = None, deadline=None, rate_limiter: TokenBucket = None,
+                 hedge_delay=None, clock=time.monotonic, sleep=asyncio.sleep):
+        self.stream_handler = stream_handler
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.sleep = sleep
+        self.deadline = Deadline(deadline, clock)
+        self.rate_limiter = rate_limiter
+        self.hedge_delay = hedge_delay
+        self.stats = {'attempts': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0}
+
+    # every task keeps the deadline of its own extraction
+    def start_extraction(self):
+        extraction_deadlines.set({**(extraction_deadlines.get() or {}), self: Deadline(self.deadline.seconds, self.deadline.clock)})
+        self.stream_handler.start_extraction()
+
+    def get_deadline(self):
+        return (extraction_deadlines.get() or {}).get(self, self.deadline)
+
+    async def call(self, read, *args):
+        retry_number = 0
+        while True:
+            self.get_deadline().check()
+            if self.rate_limiter is not None:
+                await self.sleep(self.get_deadline().check_delay(self.rate_limiter.reserve()))
+            self.stats['attempts'] += 1
+            try:
+                return await self.call_hedged(read, *args)
+            except Exception as e:
+                if not self.retry_policy.is_retryable(e) or retry_number + 1 >= self.retry_policy.max_attempts:
+                    raise
+            await self.sleep(self.get_deadline().check_delay(self.retry_policy.get_delay(retry_number)))
+            retry_number += 1
+            self.stats['retries'] += 1
+
+    # the reads still running when an answer arrives or the deadline passes are cancelled
+    async def call_hedged(self, read, *args):
+        tasks = [asyncio.ensure_future(read(*args))]
+        try:
+            if self.hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=self.get_wait_timeout(self.hedge_delay))
+                if not done:
+                    self.get_deadline().check()
+                if not done and (self.rate_limiter is None or self.rate_limiter.try_take()):
+                    self.stats['hedges'] += 1
+                    tasks.append(asyncio.ensure_future(read(*args)))
+            error = None
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=self.get_wait_timeout(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceededError(f'the read deadline of {self.get_deadline().seconds} seconds passed')
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.stats['hedge_wins'] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def get_wait_timeout(self, timeout=None):
+        remaining = self.get_deadline().get_remaining()
+        if remaining is None:
+            return timeout
+        return max(min(remaining, timeout) if timeout is not None else remaining, 0)
+
+    def get_file_name(self):
+        return self.stream_handler.get_file_name()
+
+    def get_file_size(self):
+        return self.stream_handler.get_file_size()
+
+    async def read_chunks(self, offset, chunk_number, chunk_size):
+        return await self.call(self.stream_handler.read_chunks, offset, chunk_number, chunk_size)
+
+    async def read_ranges(self, ranges, chunk_size):
+        return await self.call(self.stream_handler.read_ranges, ranges, chunk_size)
+
+    def get_read_alignment(self, chunk_size):
+        return self.stream_handler.get_read_alignment(chunk_size)
+
+    def describe_stream(self):
+        self.stream_handler.describe_stream()
+
+    def get_file_identity(self):
+        return self.stream_handler.get_file_identity()
+
+    def close(self):
+        self.stream_handler.close()
@@ -0,0 +1,35 @@
+import asyncio
+
+
+# async stream handler base class. the file size and name must be known once the handler is created
+class AsyncStreamHandler:
+    def get_file_name(self):
+        raise NotImplementedError()
+
+    def get_file_size(self):
+        raise NotImplementedError()
+
+    async def read_chunks(self, offset, chunk_number, chunk_size):
+        raise NotImplementedError()
+
+    # vectored read. the default downloads all the ranges concurrently
+    async def read_ranges(self, ranges, chunk_size):
+        ranges_chunks = await asyncio.gather(*[self.read_chunks(offset, -(-bytes_number // chunk_size), chunk_size)
+                                               for offset, bytes_number in ranges])
+        return {offset: b''.join(chunks_dict[chunk_offset] for chunk_offset in sorted(chunks_dict))[:bytes_number]
+                for (offset, bytes_number), chunks_dict in zip(ranges, ranges_chunks)}
+
+    def get_read_alignment(self, chunk_size):
+        return chunk_size
+
+    def describe_stream(self):
+        raise NotImplementedError()
+
+    def get_file_identity(self):
+        return None
+
+    def start_extraction(self):
+        pass
+
+    def close(self):
+        pass
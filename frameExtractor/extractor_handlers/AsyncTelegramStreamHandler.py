@@ -0,0 +1,32 @@
+from .AsyncStreamHandlerBase import AsyncStreamHandler
+from examples.TelethonClient import TelethonClient
+
+
+class AsyncTelegramStreamHandler(AsyncStreamHandler):
+    # awaits the telethon client on the running loop instead of blocking on run_until_complete. create it with create()
+    def __init__(self, client, channel_id, file_name, message_to_target, verbose=1):
+        self.channel_id = channel_id
+        self.file_name = file_name
+        self.tel_client = TelethonClient(client, verbose)
+        self.client = client
+        self.message_to_target = message_to_target
+
+    @classmethod
+    async def create(cls, client, channel_id, file_name, verbose=1):
+        message_to_target = await TelethonClient(client, verbose).get_last_video_in_channel(channel_id)
+        return cls(client, channel_id, file_name, message_to_target, verbose)
+
+    def get_file_size(self):
+        return self.message_to_target.file.size
+
+    def get_file_name(self):
+        return self.file_name
+
+    def get_file_identity(self):
+        return f'telegram/{self.channel_id}/{self.message_to_target.id}', self.get_file_size(), None
+
+    async def read_chunks(self, offset, chunks_number, chunk_size):
+        return await self.tel_client.get_video_chunks(self.message_to_target, offset, chunks_number, chunk_size)
+
+    def describe_stream(self):
+        print("this is an example of extracting the middle key frame from the last video in telegram channel")
@@ -7,7 +7,9 @@ class FileStreamHandler(StreamHandler):
     def __init__(self, src_file_name, dst_file_name):
         self.src_file_name = src_file_name
         self.dst_file_name = dst_file_name
-        self.file_size = os.stat(src_file_name).st_size
+        src_stat = os.stat(src_file_name)
+        self.file_size = src_stat.st_size
+        self.file_mtime = src_stat.st_mtime_ns
 
     def get_file_size(self):
         return self.file_size
@@ -15,6 +17,9 @@ class FileStreamHandler(StreamHandler):
     def get_file_name(self):
         return self.dst_file_name
 
+    def get_file_identity(self):
+        return os.path.abspath(self.src_file_name), self.file_size, str(self.file_mtime)
+
     def read_chunks(self, offset, chunks_number, chunk_size):
         to_return = {}
         with open(self.src_file_name, 'rb') as f:
@@ -23,5 +28,16 @@ class FileStreamHandler(StreamHandler):
                 to_return[offset + i * chunk_size] = f.read(chunk_size)
         return to_return
 
+    def get_read_alignment(self, chunk_size):
+        return 1
+
+    def read_ranges(self, ranges, chunk_size):
+        to_return = {}
+        with open(self.src_file_name, 'rb') as f:
+            for offset, bytes_number in ranges:
+                f.seek(offset)
+                to_return[offset] = f.read(bytes_number)
+        return to_return
+
     def describe_stream(self):
         print("this is an example of extracting the middle key frame from local file")
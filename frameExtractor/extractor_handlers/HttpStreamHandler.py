@@ -0,0 +1,193 @@
+import http.client
+import queue
+import re
+import threading
+from urllib.parse import urlsplit
+
+from .StreamHandlerBase import StreamHandler
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 30
+CONTENT_RANGE_PATTERN = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+MULTIPART_BOUNDARY_PATTERN = re.compile(r'boundary=("?[^";]+"?)')
+
+
+# an error response of the server. its status tells the retries whether it is transient
+class HttpStatusError(http.client.HTTPException):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class HttpConnectionPool:
+    # keep-alive connections per (scheme, host, port, pool size, timeout). shared by all the handlers of the process
+    pools = {}
+    pools_lock = threading.Lock()
+
+    def __init__(self, scheme, host, port, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle_connections = queue.LifoQueue(maxsize=pool_size)
+        # turned off after the first answer of the server that ignores multiple ranges
+        self.multipart_supported = True
+
+    @classmethod
+    def get_pool(cls, scheme, host, port, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        with cls.pools_lock:
+            key = (scheme, host, port, pool_size, timeout)
+            if key not in cls.pools:
+                cls.pools[key] = cls(scheme, host, port, pool_size, timeout)
+            return cls.pools[key]
+
+    def acquire(self):
+        try:
+            return self.idle_connections.get_nowait()
+        except queue.Empty:
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def release(self, connection):
+        try:
+            self.idle_connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    # sends the request and reads the whole response. a reused connection that was closed by the server is retried once.
+    # a whole file answer to a range request is read only up to the body limit and its connection is closed with the rest unread
+    def request(self, method, path, headers, body_limit=None):
+        for attempt in range(2):
+            connection = self.acquire()
+            try:
+                connection.request(method, path, headers=headers)
+                response = connection.getresponse()
+                if body_limit is not None and response.status == 200:
+                    body = response.read(body_limit)
+                    connection.close()
+                    return response, body
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionError, http.client.BadStatusLine):
+                connection.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self.release(connection)
+            return response, body
+
+
+class HttpStreamHandler(StreamHandler):
+    # reads a remote file with Range requests over pooled keep-alive connections.
+    # all the ranges of a plan are requested together as multipart/byteranges when the server supports it
+    def __init__(self, url, dst_file_name, headers=None, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.url = url
+        self.dst_file_name = dst_file_name
+        self.headers = dict(headers or {})
+        split_url = urlsplit(url)
+        self.path = split_url.path or '/'
+        if split_url.query:
+            self.path += '?' + split_url.query
+        default_port = 443 if split_url.scheme == 'https' else 80
+        self.pool = HttpConnectionPool.get_pool(split_url.scheme, split_url.hostname, split_url.port or default_port, pool_size, timeout)
+        self.file_size, self.etag, self.last_modified = self.probe_file()
+
+    def request(self, method, extra_headers, body_limit=None):
+        response, body = self.pool.request(method, self.path, {**self.headers, **extra_headers}, body_limit)
+        if response.status >= 400:
+            raise HttpStatusError(f'{method} {self.url} failed: {response.status} {response.reason}', response.status)
+        return response, body
+
+    # the size comes from HEAD or from the Content-Range of a one byte request for servers that don't answer HEAD properly
+    def probe_file(self):
+        response, _ = self.pool.request('HEAD', self.path, self.headers)
+        content_length = response.getheader('Content-Length')
+        if response.status < 400 and content_length is not None:
+            return int(content_length), response.getheader('ETag'), response.getheader('Last-Modified')
+        response, _ = self.request('GET', {'Range': 'bytes=0-0'})
+        content_range = CONTENT_RANGE_PATTERN.match(response.getheader('Content-Range') or '')
+        if content_range is None or content_range.group(3) == '*':
+            raise http.client.HTTPException(f'could not get the size of {self.url}')
+        return int(content_range.group(3)), response.getheader('ETag'), response.getheader('Last-Modified')
+
+    def get_file_size(self):
+        return self.file_size
+
+    def get_file_name(self):
+        return self.dst_file_name
+
+    def get_file_identity(self):
+        return self.url, self.file_size, self.etag or self.last_modified
+
+    def read_range(self, offset, bytes_number):
+        last_byte = min(offset + bytes_number, self.file_size) - 1
+        if last_byte < offset:
+            return bytes()
+        response, body = self.request('GET', {'Range': f'bytes={offset}-{last_byte}'}, last_byte + 1)
+        if response.status == 200:  # the server ignored the range. only the file start up to the range end was read
+            return body[offset: last_byte + 1]
+        return body
+
+    def read_chunks(self, offset, chunks_number, chunk_size):
+        range_bytes = self.read_range(offset, chunks_number * chunk_size)
+        return {offset + i * chunk_size: range_bytes[i * chunk_size: (i + 1) * chunk_size] for i in range(0, chunks_number)}
+
+    def get_read_alignment(self, chunk_size):
+        return 1
+
+    def read_ranges(self, ranges, chunk_size):
+        ranges = [(offset, min(offset + bytes_number, self.file_size) - offset) for offset, bytes_number in ranges if offset < self.file_size]
+        if len(ranges) == 1 or not self.pool.multipart_supported:
+            return {offset: self.read_range(offset, bytes_number) for offset, bytes_number in ranges}
+        ranges_header = ','.join(f'{offset}-{offset + bytes_number - 1}' for offset, bytes_number in ranges)
+        response, body = self.request('GET', {'Range': f'bytes={ranges_header}'}, max(offset + bytes_number for offset, bytes_number in ranges))
+        content_type = response.getheader('Content-Type') or ''
+        if response.status == 206 and content_type.startswith('multipart/byteranges'):
+            parts = self.parse_multipart_body(content_type, body)
+        elif response.status == 206:  # the server merged the ranges to a single one
+            parts = {}
+            content_range = CONTENT_RANGE_PATTERN.match(response.getheader('Content-Range') or '')
+            if content_range is not None:
+                parts[int(content_range.group(1))] = body
+        else:  # the server ignored the ranges. the file start up to the last range end was read
+            self.pool.multipart_supported = False
+            parts = {0: body}
+        return {offset: self.slice_parts(parts, offset, bytes_number) for offset, bytes_number in ranges}
+
+    # the parts are cut by the lengths in their Content-Range headers so binary data that looks like a boundary is never split
+    @staticmethod
+    def parse_multipart_body(content_type, body):
+        boundary = MULTIPART_BOUNDARY_PATTERN.search(content_type)
+        if boundary is None:
+            return {}
+        delimiter = b'--' + boundary.group(1).strip('"').encode('latin-1')
+        parts = {}
+        position = body.find(delimiter)
+        while position >= 0 and body[position + len(delimiter): position + len(delimiter) + 2] != b'--':
+            headers_end = body.find(b'\r\n\r\n', position)
+            if headers_end < 0:
+                break
+            headers = body[position + len(delimiter): headers_end].decode('latin-1')
+            content_range = CONTENT_RANGE_PATTERN.search(headers)
+            if content_range is None:
+                break
+            part_start, part_end = int(content_range.group(1)), int(content_range.group(2))
+            data_start = headers_end + 4
+            parts[part_start] = body[data_start: data_start + part_end - part_start + 1]
+            position = body.find(delimiter, data_start + part_end - part_start + 1)
+        return parts
+
+    # servers may coalesce or reorder the requested ranges so every range is cut from the part that holds it
+    def slice_parts(self, parts, offset, bytes_number):
+        for part_offset, part_bytes in parts.items():
+            if part_offset <= offset and offset + bytes_number <= part_offset + len(part_bytes):
+                return part_bytes[offset - part_offset: offset - part_offset + bytes_number]
+        return self.read_range(offset, bytes_number)
+
+    def describe_stream(self):
+        print(f"extracting a frame from {self.url}")
@@ -0,0 +1,50 @@
+import mmap
+import os
+
+from .StreamHandlerBase import StreamHandler
+
+
+class MmapFileStreamHandler(StreamHandler):
+    # maps the source file once and serves every read as a memoryview of the mapping without copying or extra syscalls.
+    # the mapping stays open until close(). the views handed out must be released before closing
+    def __init__(self, src_file_name, dst_file_name):
+        self.src_file_name = src_file_name
+        self.dst_file_name = dst_file_name
+        with open(src_file_name, 'rb') as f:
+            src_stat = os.fstat(f.fileno())
+            self.file_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_size = src_stat.st_size
+        self.file_mtime = src_stat.st_mtime_ns
+        self.file_view = memoryview(self.file_mmap)
+
+    def get_file_size(self):
+        return self.file_size
+
+    def get_file_name(self):
+        return self.dst_file_name
+
+    def get_file_identity(self):
+        return os.path.abspath(self.src_file_name), self.file_size, str(self.file_mtime)
+
+    def read_chunks(self, offset, chunks_number, chunk_size):
+        return {chunk_offset: self.file_view[chunk_offset: chunk_offset + chunk_size] for chunk_offset in
+                range(offset, offset + chunks_number * chunk_size, chunk_size)}
+
+    def get_read_alignment(self, chunk_size):
+        return 1
+
+    def read_ranges(self, ranges, chunk_size):
+        return {offset: self.file_view[offset: offset + bytes_number] for offset, bytes_number in ranges}
+
+    def describe_stream(self):
+        print("this is an example of extracting a key frame from a memory mapped local file")
+
+    def close(self):
+        self.file_view.release()
+        self.file_mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
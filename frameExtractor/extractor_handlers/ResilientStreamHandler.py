@@ -0,0 +1,201 @@
+import http.client
+import random
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+
+from .StreamHandlerBase import StreamHandler
+
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 0.1
+DEFAULT_MAX_DELAY = 5
+# transient network and server errors. other errors, like a missing file, are bugs or bad input and fail right away
+RETRYABLE_ERRORS = (ConnectionError, TimeoutError, socket.timeout, http.client.HTTPException)
+# the error responses worth retrying. errors with another status, like 404, fail right away
+RETRYABLE_STATUS = 429
+RETRYABLE_MIN_STATUS = 500
+HEDGE_WORKERS = 4
+
+
+class DeadlineExceededError(TimeoutError):
+    pass
+
+
+class RetryPolicy:
+    # exponential backoff with full jitter: the delay before retry n is uniform in [0, min(max delay, base delay * 2^n)],
+    # so clients that failed together don't retry together
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 retryable_errors=RETRYABLE_ERRORS, rnd=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable_errors = retryable_errors
+        self.random = rnd or random.Random()
+
+    def is_retryable(self, error):
+        if isinstance(error, DeadlineExceededError) or not isinstance(error, self.retryable_errors):
+            return False
+        status = getattr(error, 'status', None)
+        return status is None or status == RETRYABLE_STATUS or status >= RETRYABLE_MIN_STATUS
+
+    def get_delay(self, retry_number):
+        return self.random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry_number))
+
+
+class TokenBucket:
+    # limits the requests rate to a source. one bucket is shared by the handlers of the same source, on any thread.
+    # a request may take a token the bucket does not have yet and waits until it is refilled, so waiting requests keep their order
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated_time = clock()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_time) * self.rate)
+        self.updated_time = now
+
+    # takes a token and returns how many seconds to wait before using it
+    def reserve(self):
+        with self.lock:
+            self.refill()
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    # takes a token only if one is available right away
+    def try_take(self):
+        with self.lock:
+            self.refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+# the deadlines of the extractions of the current thread or task by their handler. an extraction sets its own deadline so the
+# extractions that share a handler on other threads or tasks keep theirs
+extraction_deadlines = ContextVar('extraction_deadlines', default=None)
+
+
+class Deadline:
+    # the end time of an extraction. None never expires
+    def __init__(self, seconds=None, clock=time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self.end_time = clock() + seconds if seconds is not None else None
+
+    def get_remaining(self):
+        return self.end_time - self.clock() if self.end_time is not None else None
+
+    def check(self):
+        remaining = self.get_remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError(f'the read deadline of {self.seconds} seconds passed')
+
+    # returns the delay or raises when waiting it would pass the deadline
+    def check_delay(self, delay):
+        remaining = self.get_remaining()
+        if remaining is not None and delay >= remaining:
+            raise DeadlineExceededError(f'the read deadline of {self.seconds} seconds passed')
+        return delay
+
+
+class ResilientStreamHandler(StreamHandler):
+    # wraps any handler with retries of failed reads, a deadline for the extraction, a rate limiter shared by the handlers of the
+    # source and hedged reads: a read slower than the hedge delay is requested again and the first answer wins.
+    # hedging reads on threads, so the wrapped handler reads must be thread safe. the clock and the sleep are replaceable for tests
+    def __init__(self, stream_handler: StreamHandler, retry_policy: RetryPolicy = None, deadline=None, rate_limiter: TokenBucket = None,
+                 hedge_delay=None, clock=time.monotonic, sleep=time.sleep):
+        self.stream_handler = stream_handler
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.sleep = sleep
+        self.deadline = Deadline(deadline, clock)
+        self.rate_limiter = rate_limiter
+        self.hedge_delay = hedge_delay
+        self.executor = ThreadPoolExecutor(HEDGE_WORKERS) if hedge_delay is not None else None
+        self.stats = {'attempts': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0}
+
+    # the deadline is per extraction, so every extraction starts its own in its thread
+    def start_extraction(self):
+        extraction_deadlines.set({**(extraction_deadlines.get() or {}), self: Deadline(self.deadline.seconds, self.deadline.clock)})
+        self.stream_handler.start_extraction()
+
+    # the deadline of the extraction in this thread. reads outside extractions count from the handler creation
+    def get_deadline(self):
+        return (extraction_deadlines.get() or {}).get(self, self.deadline)
+
+    def call(self, read, *args):
+        retry_number = 0
+        while True:
+            self.get_deadline().check()
+            if self.rate_limiter is not None:
+                self.sleep(self.get_deadline().check_delay(self.rate_limiter.reserve()))
+            self.stats['attempts'] += 1
+            try:
+                return self.call_hedged(read, *args) if self.executor is not None else read(*args)
+            except Exception as e:
+                if not self.retry_policy.is_retryable(e) or retry_number + 1 >= self.retry_policy.max_attempts:
+                    raise
+            self.sleep(self.get_deadline().check_delay(self.retry_policy.get_delay(retry_number)))
+            retry_number += 1
+            self.stats['retries'] += 1
+
+    # the hedge is sent only when the rate limiter has a token to spare. a read that outlives the deadline is left behind
+    def call_hedged(self, read, *args):
+        futures = [self.executor.submit(read, *args)]
+        done, _ = wait(futures, timeout=self.get_wait_timeout(self.hedge_delay))
+        if not done:
+            self.get_deadline().check()
+        if not done and (self.rate_limiter is None or self.rate_limiter.try_take()):
+            self.stats['hedges'] += 1
+            futures.append(self.executor.submit(read, *args))
+        error = None
+        pending = futures
+        while pending:
+            done, pending = wait(pending, timeout=self.get_wait_timeout(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceededError(f'the read deadline of {self.get_deadline().seconds} seconds passed')
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self.stats['hedge_wins'] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def get_wait_timeout(self, timeout=None):
+        remaining = self.get_deadline().get_remaining()
+        if remaining is None:
+            return timeout
+        return max(min(remaining, timeout) if timeout is not None else remaining, 0)
+
+    def get_file_name(self):
+        return self.stream_handler.get_file_name()
+
+    def get_file_size(self):
+        return self.call(self.stream_handler.get_file_size)
+
+    def read_chunks(self, offset, chunk_number, chunk_size):
+        return self.call(self.stream_handler.read_chunks, offset, chunk_number, chunk_size)
+
+    def read_ranges(self, ranges, chunk_size):
+        return self.call(self.stream_handler.read_ranges, ranges, chunk_size)
+
+    def get_read_alignment(self, chunk_size):
+        return self.stream_handler.get_read_alignment(chunk_size)
+
+    def describe_stream(self):
+        self.stream_handler.describe_stream()
+
+    def get_file_identity(self):
+        return self.stream_handler.get_file_identity()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.stream_handler.close()
@@ -9,5 +9,32 @@ class StreamHandler:
     def read_chunks(self, offset, chunk_number, chunk_size):
         raise NotImplementedError()
 
+    # vectored read. receives sorted (offset, bytes number) ranges and returns range offset -> range bytes.
+    # handlers that can serve many ranges in one request should override it. chunk_size is the granularity for handlers
+    # that can only read whole chunks
+    def read_ranges(self, ranges, chunk_size):
+        to_return = {}
+        for offset, bytes_number in ranges:
+            chunks_dict = self.read_chunks(offset, -(-bytes_number // chunk_size), chunk_size)
+            to_return[offset] = b''.join(chunks_dict[chunk_offset] for chunk_offset in sorted(chunks_dict))[:bytes_number]
+        return to_return
+
+    # the granularity the ranges passed to read_ranges are aligned to. handlers reading exact ranges return 1
+    def get_read_alignment(self, chunk_size):
+        return chunk_size
+
     def describe_stream(self):
         raise NotImplementedError()
+
+    # identifies the source across processes as (name, size, version tag like an ETag or mtime or None).
+    # handlers that return None can't use the persistent index cache
+    def get_file_identity(self):
+        return None
+
+    # called when an extraction starts. handlers with state per extraction, like a deadline, reset it
+    def start_extraction(self):
+        pass
+
+    # releases resources held for the lifetime of the handler
+    def close(self):
+        pass
@@ -1,3 +1,5 @@
+import asyncio
+
 from .StreamHandlerBase import StreamHandler
 from examples.TelethonClient import TelethonClient
 
@@ -16,10 +18,24 @@ class TelegramStreamHandler(StreamHandler):
     def get_file_name(self):
         return self.file_name
 
+    def get_file_identity(self):
+        # telegram media can't change in place so the message is enough to identify the video
+        return f'telegram/{self.channel_id}/{self.message_to_target.id}', self.get_file_size(), None
+
     def read_chunks(self, offset, chunks_number, chunk_size):
         to_return = self.run_async(self.tel_client.get_video_chunks, self.message_to_target, offset, chunks_number, chunk_size)
         return to_return
 
+    def read_ranges(self, ranges, chunk_size):
+        # all the ranges are downloaded concurrently so the plan costs a single round trip
+        return self.run_async(self.read_ranges_async, ranges, chunk_size)
+
+    async def read_ranges_async(self, ranges, chunk_size):
+        ranges_chunks = await asyncio.gather(*[self.tel_client.get_video_chunks(self.message_to_target, offset, -(-bytes_number // chunk_size), chunk_size)
+                                               for offset, bytes_number in ranges])
+        return {offset: b''.join(chunks_dict[chunk_offset] for chunk_offset in sorted(chunks_dict))[:bytes_number]
+                for (offset, bytes_number), chunks_dict in zip(ranges, ranges_chunks)}
+
     def describe_stream(self):
         print("this is an example of extracting the middle key frame from the last video in telegram channel")
 
@@ -0,0 +1,13 @@
+from frameExtractor.extractor_decoders.FrameDecoderBase import FrameDecoder
+
+
+# returns the packets it was given as the frame, so extractions are compared without decoding
+class RecordingDecoder(FrameDecoder):
+    def get_name(self):
+        return 'recording'
+
+    def is_available(self):
+        return True
+
+    def decode_frame(self, packets, video_codec, width, height, frame_index=-1):
+        return bytes(packets), video_codec.get_name(), width, height, frame_index
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from benchmarks.corpus import LAYOUTS, make_fragmented_mp4, make_mp4
+from frameExtractor.AsyncFrameExtractor import AsyncFrameExtractor
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.extractor_handlers.AsyncFileStreamHandler import AsyncFileStreamHandler
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from tests import RecordingDecoder
+
+TARGETS = [(0, 0), (0.5, -1), (1, -1), (0.3, 7)]
+TIMES = [0, 3.3, 50, 1000]
+
+
+class ConcurrencyTrackingAsyncFileStreamHandler(AsyncFileStreamHandler):
+    def __init__(self, src_file_name, dst_file_name, counters):
+        super().__init__(src_file_name, dst_file_name)
+        self.counters = counters
+
+    async def read_ranges(self, ranges, chunk_size):
+        self.counters['requests'] += 1
+        self.counters['in_flight'] += 1
+        self.counters['max_in_flight'] = max(self.counters['max_in_flight'], self.counters['in_flight'])
+        try:
+            return await super().read_ranges(ranges, chunk_size)
+        finally:
+            self.counters['in_flight'] -= 1
+
+
+class AsyncFrameExtractorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.files_paths = []
+        for file_name, data in (('moov_end.mp4', make_mp4(**LAYOUTS['moov_end'])), ('huge_stsc.mp4', make_mp4(**LAYOUTS['huge_stsc'])),
+                                ('fragmented.mp4', make_fragmented_mp4())):
+            self.files_paths.append(os.path.join(self.tmp_dir.name, file_name))
+            with open(self.files_paths[-1], 'wb') as f:
+                f.write(data)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def get_extractor_kwargs(**kwargs):
+        return {'verbose': 0, 'decoders': [RecordingDecoder()], 'frame_output': ARRAY_FRAME_OUTPUT, **kwargs}
+
+    def create_extractors(self, file_path, **kwargs):
+        return (FrameExtractor(FileStreamHandler(file_path, os.devnull), **self.get_extractor_kwargs(**kwargs)),
+                AsyncFrameExtractor(AsyncFileStreamHandler(file_path, os.devnull), **self.get_extractor_kwargs(**kwargs)))
+
+    def assert_same_extraction(self, extractor, async_extractor, result, async_result):
+        self.assertEqual(async_result, result)
+        self.assertEqual(async_result[0], SUCCESS_CODE)
+        self.assertEqual(async_extractor.round_trips, extractor.round_trips)
+        self.assertEqual(async_extractor.get_fetched_bytes(), extractor.get_fetched_bytes())
+
+    def test_extract_frame(self):
+        for file_path in self.files_paths:
+            for target_frame_mult, target_frame_offset in TARGETS:
+                with self.subTest(file_path=file_path, target=(target_frame_mult, target_frame_offset)):
+                    extractor, async_extractor = self.create_extractors(file_path, target_frame_mult=target_frame_mult,
+                                                                        target_frame_offset=target_frame_offset, frames_after=2)
+                    self.assert_same_extraction(extractor, async_extractor, extractor.extract_frame(), asyncio.run(async_extractor.extract_frame()))
+
+    def test_extract_frame_at(self):
+        for file_path in self.files_paths:
+            for seconds in TIMES:
+                with self.subTest(file_path=file_path, seconds=seconds):
+                    extractor, async_extractor = self.create_extractors(file_path)
+                    self.assert_same_extraction(extractor, async_extractor, extractor.extract_frame_at(seconds),
+                                                asyncio.run(async_extractor.extract_frame_at(seconds)))
+
+    def test_extract_frames(self):
+        for file_path in self.files_paths:
+            with self.subTest(file_path=file_path):
+                extractor, async_extractor = self.create_extractors(file_path)
+                results = extractor.extract_frames(TARGETS)
+                self.assertEqual(asyncio.run(async_extractor.extract_frames(TARGETS)), results)
+                self.assertEqual([status_code for _, status_code, _ in results], [SUCCESS_CODE] * len(TARGETS))
+                self.assertEqual(async_extractor.round_trips, extractor.round_trips)
+
+    def test_extract_frames_under_byte_budget(self):
+        for file_path in self.files_paths:
+            with self.subTest(file_path=file_path):
+                extractor, async_extractor = self.create_extractors(file_path, cache_byte_budget=5000)
+                results = extractor.extract_frames(TARGETS)
+                self.assertEqual([status_code for _, status_code, _ in results], [SUCCESS_CODE] * len(TARGETS))
+                self.assertEqual(asyncio.run(async_extractor.extract_frames(TARGETS)), results)
+                self.assertGreater(async_extractor.get_cache_stats()['evictions'], 0)
+
+    def test_concurrent_extractions_on_one_loop(self):
+        file_path = self.files_paths[0]
+        counters = {'requests': 0, 'in_flight': 0, 'max_in_flight': 0}
+        extractors = [FrameExtractor(FileStreamHandler(file_path, os.devnull), **self.get_extractor_kwargs(target_frame_mult=target_frame_mult,
+                                                                                                            target_frame_offset=target_frame_offset))
+                      for target_frame_mult, target_frame_offset in TARGETS]
+        async_extractors = [AsyncFrameExtractor(ConcurrencyTrackingAsyncFileStreamHandler(file_path, os.devnull, counters),
+                                                **self.get_extractor_kwargs(target_frame_mult=target_frame_mult, target_frame_offset=target_frame_offset))
+                            for target_frame_mult, target_frame_offset in TARGETS]
+
+        async def extract_all():
+            return await asyncio.gather(*[async_extractor.extract_frame() for async_extractor in async_extractors])
+        self.assertEqual(asyncio.run(extract_all()), [extractor.extract_frame() for extractor in extractors])
+        self.assertEqual(counters['requests'], sum(extractor.round_trips for extractor in extractors))
+        # the reads of the extractions were awaited together
+        self.assertGreater(counters['max_in_flight'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+from benchmarks.corpus import LAYOUTS, make_mp4
+from frameExtractor.FrameExtractorBatch import BatchJob, BatchPipeline
+from frameExtractor.FrameExtractorConstants import *
+
+NO_DECODER_MESSAGE = 'no frame decoder is available'
+
+
+# counts the decodes submitted to the pool that did not finish yet
+class CountingDecodePool:
+    def __init__(self, decode_pool, counters):
+        self.decode_pool = decode_pool
+        self.counters = counters
+
+    def submit(self, *args):
+        with self.counters['lock']:
+            self.counters['in_flight'] += 1
+            self.counters['max_in_flight'] = max(self.counters['max_in_flight'], self.counters['in_flight'])
+        decode_future = self.decode_pool.submit(*args)
+        decode_future.add_done_callback(self.on_done)
+        return decode_future
+
+    def on_done(self, _):
+        with self.counters['lock']:
+            self.counters['in_flight'] -= 1
+
+
+class CountingBatchPipeline(BatchPipeline):
+    def __init__(self, counters, **kwargs):
+        super().__init__(**kwargs)
+        self.counters = counters
+
+    def run_job_io(self, job, decode_pool, decode_slots, stats):
+        super().run_job_io(job, CountingDecodePool(decode_pool, self.counters), decode_slots, stats)
+
+
+# a decode pool that broke after accepting its first decode
+class BreakingDecodePool:
+    def __init__(self, decode_pool):
+        self.decode_pool = decode_pool
+        self.submitted = 0
+
+    def submit(self, *args):
+        if self.submitted:
+            raise BrokenProcessPool('the decode pool is broken')
+        self.submitted += 1
+        return self.decode_pool.submit(*args)
+
+
+class BreakingBatchPipeline(BatchPipeline):
+    def run_job_io(self, job, decode_pool, decode_slots, stats):
+        super().run_job_io(job, BreakingDecodePool(decode_pool), decode_slots, stats)
+
+
+class FailingBatchPipeline(BatchPipeline):
+    def run_job_io(self, job, decode_pool, decode_slots, stats):
+        if job.source.endswith('failing.mp4'):
+            raise RuntimeError('the io stage failed')
+        super().run_job_io(job, decode_pool, decode_slots, stats)
+
+
+# without decoders every target that reaches decoding fails with NO_DECODER_MESSAGE
+class BatchPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'video.mp4')
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_job(self, source=None, **kwargs):
+        return BatchJob(source or self.file_path, os.path.join(self.tmp_dir.name, 'frame.png'), **kwargs)
+
+    def test_download_above_threshold_is_not_confirmed(self):
+        file_path = os.path.join(self.tmp_dir.name, 'long_gop.mp4')
+        with open(file_path, 'wb') as f:
+            f.write(make_mp4(**LAYOUTS['long_gop']))
+        # the samples of the frame are above the threshold and below the limit. without decoders the job fails only when decoding
+        pipeline = BatchPipeline(io_workers=1, decode_workers=1, extractor_kwargs={'download_threshold': MB_SIZE}, decoders=[], verbose=0)
+        results, stats = pipeline.run([self.create_job(file_path, times=[12.5])])
+        self.assertEqual(results, [(file_path, 12.5, PACKETS_READER_FAIL_CODE, NO_DECODER_MESSAGE)])
+        self.assertGreater(stats.fetched_bytes, MB_SIZE)
+
+    def test_mixed_frame_and_time_targets(self):
+        targets, times = [(0, 0), (0.5, -1)], [3.3, 50]
+        pipeline = BatchPipeline(io_workers=1, decode_workers=1, decoders=[], verbose=0)
+        results, stats = pipeline.run([self.create_job(targets=targets, times=times)])
+        # the key frame targets come first and then the times
+        self.assertEqual(results, [(self.file_path, target, PACKETS_READER_FAIL_CODE, NO_DECODER_MESSAGE) for target in targets + times])
+        self.assertEqual((stats.files, stats.frames, stats.failed_frames), (1, 4, 4))
+
+    def test_pending_decodes_are_bounded(self):
+        counters = {'lock': threading.Lock(), 'in_flight': 0, 'max_in_flight': 0}
+        pipeline = CountingBatchPipeline(counters, io_workers=4, decode_workers=1, max_pending_decodes=2, decoders=[], verbose=0)
+        jobs = [self.create_job(targets=[(0, 0), (0.3, 0), (0.5, -1), (1, -1)]) for _ in range(4)]
+        results, stats = pipeline.run(jobs)
+        self.assertEqual(len(results), 16)
+        self.assertEqual(stats.failed_frames, 16)
+        self.assertGreaterEqual(counters['max_in_flight'], 1)
+        self.assertLessEqual(counters['max_in_flight'], 2)
+        self.assertEqual(counters['in_flight'], 0)
+
+    def test_failures_are_reported_in_the_stats(self):
+        pipeline = BatchPipeline(io_workers=2, decode_workers=1, decoders=[], verbose=0)
+        missing_path = os.path.join(self.tmp_dir.name, 'missing.mp4')
+        results, stats = pipeline.run([self.create_job(times=[3.3]), self.create_job(missing_path, targets=[(0, 0)], times=[3.3])])
+        self.assertEqual(results[0], (self.file_path, 3.3, PACKETS_READER_FAIL_CODE, NO_DECODER_MESSAGE))
+        # the source that can't be opened fails all its targets with the same error
+        self.assertEqual([(source, target, status_code) for source, target, status_code, _ in results[1:]],
+                         [(missing_path, (0, 0), UNKNOWN_ERROR_FAIL_CODE), (missing_path, 3.3, UNKNOWN_ERROR_FAIL_CODE)])
+        self.assertEqual(results[1][3], results[2][3])
+        report = stats.get_report()
+        self.assertEqual((report['files'], report['frames'], report['failed_frames']), (2, 3, 3))
+
+    def test_failed_io_stage_fails_its_targets(self):
+        failing_path = os.path.join(self.tmp_dir.name, 'failing.mp4')
+        pipeline = FailingBatchPipeline(io_workers=2, decode_workers=1, decoders=[], verbose=0)
+        results, stats = pipeline.run([self.create_job(failing_path, targets=[(0, 0)], times=[3.3]), self.create_job(times=[3.3])])
+        self.assertEqual(results, [(failing_path, (0, 0), UNKNOWN_ERROR_FAIL_CODE, 'the io stage failed'),
+                                   (failing_path, 3.3, UNKNOWN_ERROR_FAIL_CODE, 'the io stage failed'),
+                                   (self.file_path, 3.3, PACKETS_READER_FAIL_CODE, NO_DECODER_MESSAGE)])
+        self.assertEqual((stats.files, stats.frames, stats.failed_frames), (2, 3, 3))
+
+    def test_broken_decode_pool_fails_the_remaining_targets(self):
+        pipeline = BreakingBatchPipeline(io_workers=1, decode_workers=1, decoders=[], verbose=0)
+        results, stats = pipeline.run([self.create_job(targets=[(0, 0), (0.5, -1)], times=[3.3])])
+        self.assertEqual(results, [(self.file_path, (0, 0), PACKETS_READER_FAIL_CODE, NO_DECODER_MESSAGE),
+                                   (self.file_path, (0.5, -1), UNKNOWN_ERROR_FAIL_CODE, 'the decode pool is broken'),
+                                   (self.file_path, 3.3, UNKNOWN_ERROR_FAIL_CODE, 'the decode pool is broken')])
+        self.assertEqual((stats.files, stats.frames, stats.failed_frames), (1, 3, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
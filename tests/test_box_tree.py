@@ -0,0 +1,137 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from benchmarks.corpus import LAYOUTS, box, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorBoxTree import BoxTree
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from tests import RecordingDecoder
+
+TARGETS = [(0, 0), (0.5, -1), (1, -1)]
+
+
+class RangesRecordingFileStreamHandler(FileStreamHandler):
+    def __init__(self, src_file_name, dst_file_name):
+        super().__init__(src_file_name, dst_file_name)
+        self.ranges = []
+
+    def read_ranges(self, ranges, chunk_size):
+        self.ranges.extend(ranges)
+        return super().read_ranges(ranges, chunk_size)
+
+
+def get_top_level_boxes(data):
+    box_tree = BoxTree(len(data), lambda offset, bytes_number, end: data[offset: offset + bytes_number])
+    return [(child.box_type, child.offset, child.size, child.header_size) for child in box_tree.iterate_children(box_tree.root)]
+
+
+class BoxTreeTest(unittest.TestCase):
+    def setUp(self):
+        self.data = box('ftyp', b'isom' + bytes(4)) + box('free', bytes(100)) + box('moov', box('mvhd', bytes(100)) + box('trak', box('tkhd', bytes(80))))
+        self.reads = []
+
+    def read_header(self, offset, bytes_number, end):
+        self.reads.append((offset, bytes_number, end))
+        return self.data[offset: offset + bytes_number]
+
+    def test_boxes_are_parsed_once_and_on_demand(self):
+        box_tree = BoxTree(len(self.data), self.read_header)
+        self.assertEqual(box_tree.find_child(box_tree.root, 'ftyp').offset, 0)
+        self.assertEqual(self.reads, [(0, 8, len(self.data))])
+        moov = box_tree.find_child(box_tree.root, 'moov')
+        trak = box_tree.find_child(moov, 'trak')
+        self.assertEqual((trak.offset, trak.size), (132 + 108, 96))
+        reads_number = len(self.reads)
+        # the parsed headers serve repeated lookups and a missing box parses the rest of its parent only once
+        self.assertIs(box_tree.find_child(moov, 'trak'), trak)
+        self.assertIsNone(box_tree.find_child(moov, 'mdia'))
+        self.assertIsNone(box_tree.find_child(moov, 'mdia'))
+        self.assertEqual(len(self.reads), reads_number)
+        # every header is read inside its parent
+        for offset, bytes_number, end in self.reads:
+            self.assertLessEqual(offset + 8, end)
+            self.assertIn(end, (len(self.data), moov.get_end()))
+
+    def test_failed_read_can_be_repeated(self):
+        failing_reads = [ConnectionError()]
+
+        def read_header(offset, bytes_number, end):
+            if offset > 0 and failing_reads:
+                raise failing_reads.pop()
+            return self.read_header(offset, bytes_number, end)
+        box_tree = BoxTree(len(self.data), read_header)
+        with self.assertRaises(ConnectionError):
+            box_tree.find_child(box_tree.root, 'moov')
+        self.assertEqual(box_tree.find_child(box_tree.root, 'moov').offset, 124)
+        self.assertEqual([child.box_type for child in box_tree.root.children], ['ftyp', 'free', 'moov'])
+
+    def test_64_bit_and_size_0_boxes(self):
+        data = (box('ftyp', b'isom' + bytes(4)) + struct.pack('!I', 1) + b'free' + struct.pack('!Q', 40) + bytes(24) +
+                struct.pack('!I', 0) + b'mdat' + bytes(50))
+        self.assertEqual(get_top_level_boxes(data), [('ftyp', 0, 16, 8), ('free', 16, 40, 16), ('mdat', 56, 58, 8)])
+
+    def test_corrupted_and_cut_boxes_end_the_parent(self):
+        self.assertEqual(get_top_level_boxes(box('ftyp', bytes(8)) + struct.pack('!I', 4) + b'free' + bytes(20)), [('ftyp', 0, 16, 8)])
+        self.assertEqual(get_top_level_boxes(box('ftyp', bytes(8)) + b'\x00\x00\x00'), [('ftyp', 0, 16, 8)])
+        self.assertEqual(get_top_level_boxes(box('ftyp', bytes(8)) + struct.pack('!I', 1) + b'mdat' + bytes(4)), [('ftyp', 0, 16, 8)])
+
+
+class LargeBoxesExtractionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def extract(self, data, **kwargs):
+        file_path = os.path.join(self.tmp_dir.name, 'video.mp4')
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        stream_handler = RangesRecordingFileStreamHandler(file_path, os.devnull)
+        extractor = FrameExtractor(stream_handler, verbose=0, decoders=[RecordingDecoder()], frame_output=ARRAY_FRAME_OUTPUT, **kwargs)
+        return extractor, stream_handler, extractor.extract_frames(TARGETS)
+
+    def test_64_bit_mdat(self):
+        data = make_mp4(**LAYOUTS['moov_end'])
+        _, _, expected_results = self.extract(data)
+        ftyp_size = struct.unpack_from('!I', data, 0)[0]
+        mdat_size = struct.unpack_from('!I', data, ftyp_size)[0]
+        # the compatible brands make room for the large size so the samples keep their offsets
+        large_data = box('ftyp', data[8: 16]) + struct.pack('!I', 1) + b'mdat' + struct.pack('!Q', mdat_size + 8) + data[ftyp_size + 8:]
+        self.assertEqual(len(large_data), len(data))
+        extractor, _, results = self.extract(large_data)
+        self.assertEqual(results, expected_results)
+        mdat = extractor.get_box_tree().find_child(extractor.get_box_tree().root, 'mdat')
+        self.assertEqual((mdat.size, mdat.header_size), (mdat_size + 8, 16))
+
+    def test_mdat_to_the_end_of_the_file(self):
+        data = bytearray(make_mp4(**LAYOUTS['moov_start']))
+        _, _, expected_results = self.extract(data)
+        mdat_offset = data.index(b'mdat') - 4
+        data[mdat_offset: mdat_offset + 4] = bytes(4)
+        extractor, _, results = self.extract(data)
+        self.assertEqual(results, expected_results)
+        mdat = extractor.get_box_tree().find_child(extractor.get_box_tree().root, 'mdat')
+        self.assertEqual(mdat.get_end(), len(data))
+
+    def test_headers_readahead_stays_in_the_enclosing_box(self):
+        data = make_mp4(**LAYOUTS['moov_end'])
+        extractor, stream_handler, _ = self.extract(data, probe_window_size=0)
+        mdat_offset = struct.unpack_from('!I', data, 0)[0]
+        # the first read is read ahead over the file start and the mdat is skipped. the moov is read ahead up to its end
+        self.assertEqual(stream_handler.ranges[0], (0, extractor.readahead_size))
+        moov = extractor.get_box_tree().find_child(extractor.get_box_tree().root, 'moov')
+        self.assertEqual(moov.get_end(), len(data))
+        self.assertEqual(stream_handler.ranges[1], (moov.offset, min(extractor.readahead_size, len(data) - moov.offset)))
+        self.assertGreater(moov.offset, mdat_offset + extractor.readahead_size)
+        extractor.byte_store.clear()
+        stream_handler.ranges.clear()
+        extractor.get_bytes(moov.offset, 8, readahead_end=moov.offset + 100)
+        self.assertEqual(stream_handler.ranges, [(moov.offset, 100)])
+
+
+if __name__ == '__main__':
+    unittest.main()
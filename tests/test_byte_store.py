@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.corpus import LAYOUTS, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorByteStore import SparseByteStore
+from frameExtractor.FrameExtractorConstants import PAYLOAD_PRIORITY
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from frameExtractor.extractor_handlers.MmapFileStreamHandler import MmapFileStreamHandler
+
+TARGETS = [(0, 0), (0.5, -1), (1, -1)]
+
+
+class SparseByteStoreTest(unittest.TestCase):
+    def test_batch_above_budget_is_kept(self):
+        byte_store = SparseByteStore(byte_budget=100)
+        ranges = [(0, bytes(60)), (100, bytes(60)), (200, bytes(60))]
+        byte_store.add_ranges(ranges)
+        for offset, data in ranges:
+            self.assertEqual(byte_store.get_missing_ranges(offset, len(data)), [])
+        self.assertEqual(byte_store.evictions, 0)
+        # the next batch may evict the ranges of the previous one
+        byte_store.add_ranges([(300, bytes(60))])
+        self.assertLessEqual(byte_store.get_size(), 100)
+        self.assertEqual(byte_store.get_missing_ranges(300, 60), [])
+
+    def test_partly_stored_range_is_kept(self):
+        for source in (bytes(range(150)), memoryview(bytearray(range(150)))):
+            byte_store = SparseByteStore(byte_budget=100)
+            byte_store.add(0, source[0:100])
+            # the fetch completes the stored part of the range so that part is not evicted for the new bytes
+            byte_store.add_ranges([(100, source[100:150])], PAYLOAD_PRIORITY, [(50, 100)])
+            self.assertEqual(bytes(byte_store.get(50, 100)), bytes(source[50:150]))
+            # the next fetch may evict it
+            byte_store.add_ranges([(200, bytes(50))], PAYLOAD_PRIORITY, [(200, 50)])
+            self.assertLessEqual(byte_store.get_size(), 100)
+
+    def test_mmap_extraction_under_budget(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'video.mp4')
+            with open(file_path, 'wb') as f:
+                f.write(make_mp4(**LAYOUTS['huge_stsc']))
+            expected_packets = FrameExtractor(FileStreamHandler(file_path, os.devnull), verbose=0).prepare_targets_packets(TARGETS)
+            for stream_handler in (FileStreamHandler(file_path, os.devnull), MmapFileStreamHandler(file_path, os.devnull)):
+                extractor = FrameExtractor(stream_handler, verbose=0, cache_byte_budget=5000)
+                self.assertEqual(extractor.prepare_targets_packets(TARGETS), expected_packets)
+                extractor.close()
+
+    def test_touching_views_are_not_copied(self):
+        source = bytearray(range(256))
+        source_view = memoryview(source)
+        byte_store = SparseByteStore()
+        byte_store.add_ranges([(0, source_view[0:100]), (100, source_view[100:200])])
+        byte_store.add(200, source_view[200:256])
+        self.assertTrue(all(isinstance(segment, memoryview) and segment.obj is source for segment in byte_store.segments))
+        self.assertIs(byte_store.get(10, 50).obj, source)
+        self.assertIs(byte_store.get(120, 80).obj, source)
+        # a read crossing views is copied
+        self.assertEqual(bytes(byte_store.get(90, 120)), bytes(source[90:210]))
+
+    def test_touching_bytes_are_merged(self):
+        byte_store = SparseByteStore()
+        byte_store.add_ranges([(0, bytes(100)), (100, bytes(100))])
+        self.assertEqual(len(byte_store.segments), 1)
+
+    def test_mmap_extraction_keeps_views(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'video.mp4')
+            with open(file_path, 'wb') as f:
+                f.write(make_mp4())
+            extractor = FrameExtractor(MmapFileStreamHandler(file_path, os.devnull), verbose=0)
+            expected_packets = FrameExtractor(FileStreamHandler(file_path, os.devnull), verbose=0).prepare_targets_packets(TARGETS)
+            self.assertEqual(extractor.prepare_targets_packets(TARGETS), expected_packets)
+            self.assertTrue(all(isinstance(segment, memoryview) for segment in extractor.byte_store.segments))
+            extractor.close()
+
+    def test_budget_below_plan_does_not_add_requests(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'video.mp4')
+            with open(file_path, 'wb') as f:
+                f.write(make_mp4())
+            track_index = FrameExtractor(FileStreamHandler(file_path, os.devnull), verbose=0).build_track_index()
+            unbounded_extractor = FrameExtractor(FileStreamHandler(file_path, os.devnull), verbose=0, track_index=track_index)
+            expected_packets = unbounded_extractor.prepare_targets_packets(TARGETS)
+            # the samples of all the targets are fetched in one plan that is bigger than the budget
+            bounded_extractor = FrameExtractor(FileStreamHandler(file_path, os.devnull), verbose=0, track_index=track_index,
+                                               cache_byte_budget=1024)
+            self.assertEqual(bounded_extractor.prepare_targets_packets(TARGETS), expected_packets)
+            self.assertEqual(bounded_extractor.round_trips, 1)
+
+if __name__ == '__main__':
+    unittest.main()
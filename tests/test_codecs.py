@@ -0,0 +1,78 @@
+import struct
+import unittest
+
+from benchmarks.corpus import PPS, SPS
+from frameExtractor.FrameExtractorExceptions import SampleConvertErrorException
+from frameExtractor.FrameExtractorHelpers import convert_avcc_packet_to_annex_b
+from frameExtractor.extractor_codecs.H264Codec import H264Codec
+from frameExtractor.extractor_codecs.H265Codec import H265Codec
+from frameExtractor.extractor_codecs.MPEG4Codec import MPEG4Codec
+
+NALS = [b'\x65' + bytes(range(200)), b'\x06\x05', b'\x41' + bytes(300)]
+NAL_LENGTH_FORMATS = {1: '!B', 2: '!H', 4: '!I'}
+
+
+def make_avcc_packet(nals, nal_length_size):
+    return b''.join(struct.pack(NAL_LENGTH_FORMATS[nal_length_size], len(nal)) + nal for nal in nals)
+
+
+def make_annex_b_packet(nals):
+    return b''.join(b'\x00\x00\x00\x01' + nal for nal in nals)
+
+
+class PacketConversionTest(unittest.TestCase):
+    def test_nal_length_sizes(self):
+        for nal_length_size in NAL_LENGTH_FORMATS:
+            with self.subTest(nal_length_size):
+                # a one byte length can't describe the 300 bytes nal
+                nals = NALS[:2] if nal_length_size == 1 else NALS
+                packet = make_avcc_packet(nals, nal_length_size)
+                for sample_packet in (packet, bytearray(packet), memoryview(packet)):
+                    self.assertEqual(convert_avcc_packet_to_annex_b(sample_packet, len(packet), nal_length_size), make_annex_b_packet(nals))
+
+    def test_packets_are_appended_to_the_output(self):
+        output = bytearray(b'private')
+        for nals in (NALS[:1], NALS[1:]):
+            packet = make_avcc_packet(nals, 4)
+            self.assertIs(H264Codec().write_packet(output, packet, len(packet), 4), output)
+        self.assertEqual(output, b'private' + make_annex_b_packet(NALS))
+
+    def test_bytes_after_the_sample_size_are_ignored(self):
+        packet = make_avcc_packet(NALS, 4)
+        self.assertEqual(convert_avcc_packet_to_annex_b(packet + bytes(10), len(packet), 4), make_annex_b_packet(NALS))
+        self.assertEqual(convert_avcc_packet_to_annex_b(packet, 3, 4), b'')
+
+    def test_nal_past_the_sample_size(self):
+        packet = make_avcc_packet(NALS, 4)
+        with self.assertRaises(SampleConvertErrorException):
+            convert_avcc_packet_to_annex_b(packet + bytes(10), len(packet) - 100, 4)
+
+    def test_unsupported_nal_length_size(self):
+        with self.assertRaises(SampleConvertErrorException):
+            convert_avcc_packet_to_annex_b(make_avcc_packet(NALS, 4), 10, 3)
+
+    def test_many_small_nals(self):
+        nals = [bytes([i % 256]) for i in range(100000)]
+        packet = make_avcc_packet(nals, 1)
+        self.assertEqual(convert_avcc_packet_to_annex_b(packet, len(packet), 1), make_annex_b_packet(nals))
+
+
+class CodecPrivateDataTest(unittest.TestCase):
+    def test_h264(self):
+        avcc = bytes([1, 0x42, 0, 0x1e, 0xfd, 0xe1]) + struct.pack('!H', len(SPS)) + SPS + bytes([1]) + struct.pack('!H', len(PPS)) + PPS
+        self.assertEqual(H264Codec().get_private_data(avcc), (2, make_annex_b_packet([SPS, PPS])))
+
+    def test_h265(self):
+        vps, sps, pps = b'\x40\x01\x0c', b'\x42\x01\x01\x60', b'\x44\x01\xc1'
+        arrays = b''.join(bytes([nal_type]) + struct.pack('!HH', 1, len(nal)) + nal for nal_type, nal in ((32, vps), (33, sps), (34, pps)))
+        hvcc = bytes(21) + bytes([0xfd]) + bytes([3]) + arrays
+        self.assertEqual(H265Codec().get_private_data(hvcc), (2, make_annex_b_packet([vps, sps, pps])))
+
+    def test_mpeg4_packets_are_kept(self):
+        packet = b'\x00\x00\x01\xb6' + bytes(20)
+        output = bytearray(b'header')
+        self.assertEqual(MPEG4Codec().write_packet(output, packet, len(packet), 4), b'header' + packet)
+
+
+if __name__ == '__main__':
+    unittest.main()
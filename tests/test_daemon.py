@@ -0,0 +1,238 @@
+import http.client
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from concurrent.futures import Future
+from contextlib import redirect_stdout
+
+from benchmarks.corpus import LAYOUTS, make_mp4
+from frameExtractor import FrameExtractorDaemon
+from frameExtractor.FrameExtractorBatch import BatchPipeline
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.FrameExtractorDaemon import ExtractionService, FrameRequest, ServiceBusyException, SourceNotAllowedException, create_server
+from frameExtractor.extractor_decoders.FrameDecoderBase import DECODER_BACKENDS, register_decoder_backend
+
+
+class DaemonWarmUpTest(unittest.TestCase):
+    def setUp(self):
+        register_decoder_backend('missing', 'frameExtractor.extractor_decoders.MissingDecoder', 'MissingDecoder')
+
+    def tearDown(self):
+        del DECODER_BACKENDS['missing']
+
+    def test_warm_up_fails_without_a_decoder(self):
+        with self.assertRaises(ImportError):
+            ExtractionService(decoders=['missing']).warm_up()
+
+    def test_daemon_refuses_to_start_without_a_decoder(self):
+        self.assertEqual(FrameExtractorDaemon.main(['--port', '0', '--decoders', 'missing']), 1)
+
+    def test_download_above_threshold_is_not_confirmed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'video.mp4')
+            with open(file_path, 'wb') as f:
+                f.write(make_mp4(**LAYOUTS['long_gop']))
+            service = ExtractionService(decoders=['missing'], extractor_kwargs={'download_threshold': MB_SIZE}, source_root=tmp_dir)
+            output = io.StringIO()
+            # the samples of the frame are above the threshold and below the limit. without a decoder the request fails only when decoding
+            with redirect_stdout(output):
+                status_code, result, headers = service.extract(FrameRequest(file_path, time=12.5))
+            self.assertEqual((status_code, result), (PACKETS_READER_FAIL_CODE, 'no frame decoder is available'))
+            self.assertGreater(headers['X-Fetched-Bytes'], MB_SIZE)
+            self.assertEqual(output.getvalue(), '')
+
+
+ALLOWED_URL = 'https://videos.example.com/public/'
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, unix_socket):
+        super().__init__('localhost')
+        self.unix_socket = unix_socket
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix_socket)
+
+
+# without a decoder every extraction reads and indexes its source and fails only when decoding
+class ExtractionServiceTest(unittest.TestCase):
+    def setUp(self):
+        register_decoder_backend('missing', 'frameExtractor.extractor_decoders.MissingDecoder', 'MissingDecoder')
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.files_paths = []
+        for file_index in range(3):
+            self.files_paths.append(os.path.join(self.tmp_dir.name, f'video_{file_index}.mp4'))
+            with open(self.files_paths[-1], 'wb') as f:
+                f.write(make_mp4(seed=file_index))
+
+    def tearDown(self):
+        del DECODER_BACKENDS['missing']
+        self.tmp_dir.cleanup()
+
+    def create_service(self, **kwargs):
+        return ExtractionService(decoders=['missing'], source_root=self.tmp_dir.name, **kwargs)
+
+    def get_index_warm(self, service, file_path):
+        status_code, result, headers = service.extract(FrameRequest(file_path, mult=0.5))
+        self.assertEqual((status_code, result), (PACKETS_READER_FAIL_CODE, 'no frame decoder is available'))
+        return headers['X-Index-Warm']
+
+    def test_repeated_requests_hit_the_index(self):
+        service = self.create_service()
+        first_headers = service.extract(FrameRequest(self.files_paths[0], mult=0.5))[2]
+        second_headers = service.extract(FrameRequest(self.files_paths[0], mult=0.5))[2]
+        self.assertEqual((first_headers['X-Index-Warm'], second_headers['X-Index-Warm']), (0, 1))
+        # the warm request read nothing from the source, its samples were kept by the shared cache
+        self.assertEqual(second_headers['X-Fetched-Bytes'], 0)
+        self.assertGreater(second_headers['X-Shared-Cache-Bytes'], 0)
+        stats = service.get_stats()
+        self.assertEqual((stats['requests'], stats['failed'], stats['index_hits'], stats['index_misses'], stats['indexes']), (2, 2, 1, 1, 1))
+
+    def test_least_recently_used_index_is_evicted(self):
+        service = self.create_service(max_indexes=2)
+        first_path, second_path, third_path = self.files_paths
+        self.assertEqual([self.get_index_warm(service, file_path) for file_path in (first_path, second_path, first_path, third_path)],
+                         [0, 0, 1, 0])
+        self.assertEqual(service.get_stats()['indexes'], 2)
+        # the second file was used least recently so its index was evicted for the third file
+        self.assertEqual([self.get_index_warm(service, file_path) for file_path in (first_path, third_path, second_path)], [1, 1, 0])
+
+    def test_waiting_on_a_failed_build_is_cold(self):
+        service = self.create_service()
+        future = service.building['identity'] = Future()
+        future.set_result(None)
+        self.assertEqual(service.get_track_index('identity', None), (None, False))
+
+    def test_sources_are_resolved_under_the_source_root(self):
+        service = self.create_service(allowed_urls=[ALLOWED_URL])
+        source_root = os.path.realpath(self.tmp_dir.name)
+        self.assertEqual(service.resolve_source('video_0.mp4'), os.path.join(source_root, 'video_0.mp4'))
+        self.assertEqual(service.resolve_source(self.files_paths[0]), os.path.join(source_root, 'video_0.mp4'))
+        self.assertEqual(service.resolve_source(f'{ALLOWED_URL}video.mp4'), f'{ALLOWED_URL}video.mp4')
+        os.symlink(os.path.dirname(source_root), os.path.join(source_root, 'parent'))
+        for source in ('../video_0.mp4', '/etc/passwd', 'parent/video_0.mp4', 'https://videos.example.com/private/video.mp4',
+                       'https://videos.example.com.evil.com/public/video.mp4', 'http://videos.example.com/public/video.mp4',
+                       'http://169.254.169.254/latest/meta-data'):
+            with self.subTest(source=source):
+                with self.assertRaises(SourceNotAllowedException):
+                    service.resolve_source(source)
+        with self.assertRaises(SourceNotAllowedException):
+            service.extract(FrameRequest('../video_0.mp4'))
+        self.assertEqual(service.get_stats()['requests'], 0)
+
+    def test_full_queue_is_rejected(self):
+        started, release = threading.Event(), threading.Event()
+
+        # holds the only worker until the test releases it
+        def create_blocking_handler(source, output):
+            started.set()
+            release.wait()
+            return BatchPipeline.create_handler(source, output)
+        service = self.create_service(workers=1, queue_size=0, create_handler=create_blocking_handler)
+        worker = threading.Thread(target=service.extract, args=(FrameRequest(self.files_paths[0]),))
+        worker.start()
+        try:
+            self.assertTrue(started.wait(10))
+            with self.assertRaises(ServiceBusyException):
+                service.extract(FrameRequest(self.files_paths[1]))
+            server = create_server(service, '127.0.0.1', 0)
+            server_thread = threading.Thread(target=server.serve_forever)
+            server_thread.start()
+            try:
+                connection = http.client.HTTPConnection(*server.server_address)
+                connection.request('GET', f'/frame?source={self.files_paths[1]}')
+                response = connection.getresponse()
+                self.assertEqual(response.status, 503)
+                self.assertEqual(response.getheader('Retry-After'), '1')
+                self.assertIn('error', json.loads(response.read()))
+                connection.close()
+            finally:
+                server.shutdown()
+                server.server_close()
+                server_thread.join()
+        finally:
+            release.set()
+            worker.join()
+        stats = service.get_stats()
+        self.assertEqual((stats['requests'], stats['rejected'], stats['in_progress']), (1, 2, 0))
+
+
+class ExtractionServerTest(unittest.TestCase):
+    def setUp(self):
+        register_decoder_backend('missing', 'frameExtractor.extractor_decoders.MissingDecoder', 'MissingDecoder')
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source_root = os.path.join(self.tmp_dir.name, 'videos')
+        os.mkdir(self.source_root)
+        self.file_path = os.path.join(self.source_root, 'video.mp4')
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4())
+        self.outside_path = os.path.join(self.tmp_dir.name, 'outside.mp4')
+        with open(self.outside_path, 'wb') as f:
+            f.write(make_mp4())
+        self.servers = []
+
+    def tearDown(self):
+        for server, server_thread in self.servers:
+            server.shutdown()
+            server.server_close()
+            server_thread.join()
+        del DECODER_BACKENDS['missing']
+        self.tmp_dir.cleanup()
+
+    def start_server(self, **kwargs):
+        server = create_server(ExtractionService(decoders=['missing'], source_root=self.source_root, allowed_urls=[ALLOWED_URL]), **kwargs)
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.start()
+        self.servers.append((server, server_thread))
+        return server
+
+    @staticmethod
+    def request(connection, method, path, body=None):
+        connection.request(method, path, body, {'Content-Type': 'application/json'} if body is not None else {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+
+    def check_endpoints(self, create_connection):
+        status, headers, body = self.request(create_connection(), 'GET', f'/frame?source={self.file_path}&mult=0.5&format=jpg')
+        self.assertEqual(status, 422)
+        self.assertEqual(json.loads(body), {'status_code': PACKETS_READER_FAIL_CODE, 'error': 'no frame decoder is available'})
+        self.assertEqual(headers['X-Index-Warm'], '0')
+        status, headers, body = self.request(create_connection(), 'POST', '/frame', json.dumps({'source': self.file_path, 'time': 3.3}))
+        self.assertEqual(status, 422)
+        self.assertEqual(headers['X-Index-Warm'], '1')
+        status, _, body = self.request(create_connection(), 'GET', '/stats')
+        self.assertEqual(status, 200)
+        stats = json.loads(body)
+        self.assertEqual((stats['requests'], stats['index_hits'], stats['decoders']), (2, 1, ['missing']))
+        self.assertEqual(self.request(create_connection(), 'GET', '/frame')[0], 400)
+        self.assertEqual(self.request(create_connection(), 'GET', f'/frame?source={self.file_path}&format=gif')[0], 400)
+        self.assertEqual(self.request(create_connection(), 'POST', '/frame', '{not json')[0], 400)
+        self.assertEqual(self.request(create_connection(), 'GET', f'/frame?source={self.file_path}.missing')[0], 404)
+        self.assertEqual(self.request(create_connection(), 'GET', '/unknown')[0], 404)
+        self.assertEqual(self.request(create_connection(), 'POST', '/stats', '{}')[0], 404)
+        # sources out of the source root and urls that are not allowed are refused before they are opened
+        for source in (self.outside_path, '../outside.mp4', 'http://127.0.0.1:1/video.mp4', 'https://videos.example.com.evil.com/video.mp4'):
+            status, _, body = self.request(create_connection(), 'POST', '/frame', json.dumps({'source': source}))
+            self.assertEqual(status, 403, source)
+            self.assertIn('error', json.loads(body))
+        self.assertEqual(self.request(create_connection(), 'GET', '/frame?source=video.mp4')[0], 422)
+        self.assertEqual(json.loads(self.request(create_connection(), 'GET', '/stats')[2])['requests'], 4)
+
+    def test_http_endpoints(self):
+        server = self.start_server(host='127.0.0.1', port=0)
+        self.check_endpoints(lambda: http.client.HTTPConnection(*server.server_address))
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'unix sockets are not supported')
+    def test_unix_socket_endpoints(self):
+        unix_socket = os.path.join(self.tmp_dir.name, 'daemon.sock')
+        self.start_server(unix_socket=unix_socket)
+        self.check_endpoints(lambda: UnixHTTPConnection(unix_socket))
+
+
+if __name__ == '__main__':
+    unittest.main()
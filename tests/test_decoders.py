@@ -0,0 +1,131 @@
+import importlib.util
+import json
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+from benchmarks.corpus import PPS, SPS, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.extractor_decoders.FrameDecoderBase import DECODER_BACKENDS, FrameDecoder, get_available_decoder, register_decoder_backend
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from tests import RecordingDecoder
+
+
+class UnavailableDecoder(FrameDecoder):
+    def get_name(self):
+        return 'unavailable'
+
+    def is_available(self):
+        return False
+
+    def decode_frame(self, packets, video_codec, width, height, frame_index=-1):
+        raise AssertionError('an unavailable decoder was used')
+
+
+class FailingDecoder(RecordingDecoder):
+    def decode_frame(self, packets, video_codec, width, height, frame_index=-1):
+        raise RuntimeError('corrupted packets')
+
+
+class EmptyDecoder(RecordingDecoder):
+    def decode_frame(self, packets, video_codec, width, height, frame_index=-1):
+        return None
+
+
+class DecoderSelectionTest(unittest.TestCase):
+    def setUp(self):
+        register_decoder_backend('missing', 'frameExtractor.extractor_decoders.MissingDecoder', 'MissingDecoder')
+        register_decoder_backend('recording', 'tests', 'RecordingDecoder')
+
+    def tearDown(self):
+        del DECODER_BACKENDS['missing']
+        del DECODER_BACKENDS['recording']
+
+    def test_first_available_decoder_is_used(self):
+        recording_decoder = RecordingDecoder()
+        self.assertIs(get_available_decoder([UnavailableDecoder(), recording_decoder, FailingDecoder()]), recording_decoder)
+        self.assertIsInstance(get_available_decoder(['missing', UnavailableDecoder(), 'recording']), RecordingDecoder)
+
+    def test_no_decoder_is_available(self):
+        self.assertIsNone(get_available_decoder(['missing', UnavailableDecoder()]))
+        self.assertIsNone(get_available_decoder([]))
+
+
+class InMemoryDecodingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'video.mp4')
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def extract_frame(self, decoders):
+        return FrameExtractor(FileStreamHandler(self.file_path, os.devnull), verbose=0, decoders=decoders, frame_output=ARRAY_FRAME_OUTPUT).extract_frame()
+
+    def test_array_output_is_the_decoded_frame(self):
+        status_code, (packets, codec_name, width, height, _) = self.extract_frame([UnavailableDecoder(), RecordingDecoder()])
+        self.assertEqual(status_code, SUCCESS_CODE)
+        self.assertEqual((codec_name, width, height), ('avc1', 320, 240))
+        # the sps and pps of the avcC come first, followed by the key sample with its length prefix replaced by a start code
+        self.assertTrue(packets.startswith(b'\x00\x00\x00\x01' + SPS + b'\x00\x00\x00\x01' + PPS + b'\x00\x00\x00\x01\x65'))
+
+    def test_decoding_failures(self):
+        self.assertEqual(self.extract_frame([UnavailableDecoder()]),
+                         (PACKETS_READER_FAIL_CODE, 'no frame decoder is available'))
+        self.assertEqual(self.extract_frame([FailingDecoder()]), (PACKETS_READER_FAIL_CODE, 'corrupted packets'))
+        self.assertEqual(self.extract_frame([EmptyDecoder()]), (PACKETS_READER_FAIL_CODE, 'no frame was decoded from the packets'))
+
+
+# stands in for ffmpeg. records its arguments and answers with two black 2x2 frames, or fails on the options given to it
+FAKE_FFMPEG_TEMPLATE = '''#!{python}
+import json, sys
+with open({arguments_path!r}, 'a') as f:
+    f.write(json.dumps(sys.argv[1:]) + '\\n')
+for option in {unknown_options!r}:
+    if option in sys.argv:
+        sys.stderr.write("Unrecognized option '" + option[1:] + "'.\\n")
+        sys.exit(1)
+sys.stdout.buffer.write(bytes(2 * 2 * 3 * 2))
+'''
+
+
+@unittest.skipUnless(importlib.util.find_spec('numpy') and os.name == 'posix', 'the ffmpeg decoder needs numpy')
+class FFmpegPipeDecoderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.arguments_path = os.path.join(self.tmp_dir.name, 'arguments')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def decode_with_fake_ffmpeg(self, unknown_options=()):
+        from frameExtractor.extractor_codecs.H264Codec import H264Codec
+        from frameExtractor.extractor_decoders.FFmpegPipeDecoder import FFmpegPipeDecoder
+        ffmpeg_path = os.path.join(self.tmp_dir.name, 'ffmpeg')
+        with open(ffmpeg_path, 'w') as f:
+            f.write(FAKE_FFMPEG_TEMPLATE.format(python=sys.executable, arguments_path=self.arguments_path, unknown_options=list(unknown_options)))
+        os.chmod(ffmpeg_path, os.stat(ffmpeg_path).st_mode | stat.S_IEXEC)
+        frame = FFmpegPipeDecoder(ffmpeg_path).decode_frame(b'packets', H264Codec(), 2, 2, frame_index=1)
+        with open(self.arguments_path) as f:
+            return frame, [json.loads(line) for line in f]
+
+    def test_frames_pass_through(self):
+        frame, runs_arguments = self.decode_with_fake_ffmpeg()
+        self.assertEqual(frame.shape, (2, 2, 3))
+        self.assertEqual(len(runs_arguments), 1)
+        self.assertIn(['-fps_mode', 'passthrough'], [runs_arguments[0][i: i + 2] for i in range(len(runs_arguments[0]))])
+
+    def test_older_ffmpeg_passes_through_with_vsync(self):
+        frame, runs_arguments = self.decode_with_fake_ffmpeg(['-fps_mode'])
+        self.assertEqual(frame.shape, (2, 2, 3))
+        self.assertEqual(len(runs_arguments), 2)
+        self.assertIn(['-vsync', 'passthrough'], [runs_arguments[1][i: i + 2] for i in range(len(runs_arguments[1]))])
+
+
+if __name__ == '__main__':
+    unittest.main()
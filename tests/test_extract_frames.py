@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.corpus import LAYOUTS, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from tests import RecordingDecoder
+
+# the first, middle and last key frames, a repeated target and a target with overlapping samples
+TARGETS = [(0, 0), (0.5, -1), (1, -1), (0.5, -1), (0.5, -2)]
+
+
+class ExtractFramesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.files_paths = []
+        for layout_name in ('moov_start', 'huge_stsc'):
+            self.files_paths.append(os.path.join(self.tmp_dir.name, f'{layout_name}.mp4'))
+            with open(self.files_paths[-1], 'wb') as f:
+                f.write(make_mp4(**LAYOUTS[layout_name]))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def create_extractor(file_path, **kwargs):
+        return FrameExtractor(FileStreamHandler(file_path, os.devnull), verbose=0, decoders=[RecordingDecoder()], frame_output=ARRAY_FRAME_OUTPUT,
+                              frames_after=70, **kwargs)
+
+    def test_results_match_single_extractions(self):
+        for file_path in self.files_paths:
+            extractor = self.create_extractor(file_path)
+            results = extractor.extract_frames(TARGETS)
+            single_results = [self.create_extractor(file_path, target_frame_mult=target_frame_mult, target_frame_offset=target_frame_offset).extract_frame()
+                              for target_frame_mult, target_frame_offset in TARGETS]
+            self.assertEqual(results, [(target, *single_result) for target, single_result in zip(TARGETS, single_results)])
+            self.assertEqual([status_code for _, status_code, _ in results], [SUCCESS_CODE] * len(TARGETS))
+
+    def test_samples_are_fetched_in_one_plan(self):
+        for file_path in self.files_paths:
+            extractor = self.create_extractor(file_path)
+            extractor.init()
+            targets_samples = extractor.collect_targets_samples(TARGETS)
+            round_trips = extractor.round_trips
+            extractor.download_samples([target_samples for _, target_samples in targets_samples])
+            self.assertEqual(extractor.round_trips, round_trips + 1)
+            # the repeated and overlapping samples are downloaded once
+            samples = {sample for _, target_samples in targets_samples for sample in target_samples}
+            self.assertLessEqual(extractor.get_fetched_bytes() - sum(size for _, _, size in samples), round_trips * extractor.readahead_size + extractor.probe_window_size * 2)
+
+    def test_batch_reads_less_than_single_extractions(self):
+        for file_path in self.files_paths:
+            extractor = self.create_extractor(file_path)
+            extractor.extract_frames(TARGETS)
+            single_extractors = [self.create_extractor(file_path, target_frame_mult=target_frame_mult, target_frame_offset=target_frame_offset)
+                                 for target_frame_mult, target_frame_offset in TARGETS]
+            for single_extractor in single_extractors:
+                single_extractor.extract_frame()
+            self.assertLess(extractor.round_trips, sum(single_extractor.round_trips for single_extractor in single_extractors))
+            self.assertLess(extractor.get_fetched_bytes(), sum(single_extractor.get_fetched_bytes() for single_extractor in single_extractors))
+
+    def test_failed_targets_fail_together(self):
+        extractor = self.create_extractor(self.files_paths[0], download_limit=KB_SIZE)
+        results = extractor.extract_frames(TARGETS)
+        self.assertEqual([(target, status_code) for target, status_code, _ in results], [(target, DOWNLOAD_LIMIT_FAIL_CODE) for target in TARGETS])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.corpus import get_duration, get_layout, make_fragmented_mp4, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+
+TARGETS = [(0, 0), (0.5, -1), (1, -1), (0.3, 7)]
+# the key frames of a fragment, the frames of its second key frame, the last frame and a time past the end
+TIMES = [0, 0.5, 2.4, 4.7, 7.3, 60, get_duration(get_layout('moov_start')) - 0.01, 1000]
+
+
+class FragmentedExtractionTest(unittest.TestCase):
+    # the fragmented file holds the samples of the regular file so both extractions return the same packets
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.fragmented_path = os.path.join(self.tmp_dir.name, 'fragmented.mp4')
+        with open(self.fragmented_path, 'wb') as f:
+            f.write(make_fragmented_mp4())
+        self.regular_path = os.path.join(self.tmp_dir.name, 'regular.mp4')
+        with open(self.regular_path, 'wb') as f:
+            f.write(make_mp4())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_extractor(self, file_path, **kwargs):
+        return FrameExtractor(FileStreamHandler(file_path, os.devnull), verbose=0, **kwargs)
+
+    def test_key_frame_targets(self):
+        # the limit from the end cuts the frames after the last key frame and is shorter than a fragment
+        for kwargs in ({'frames_after': 3}, {'frames_after': 40, 'frames_limit_from_end': 30}):
+            with self.subTest(**kwargs):
+                extractor = self.create_extractor(self.fragmented_path, **kwargs)
+                self.assertEqual(extractor.prepare_targets_packets(TARGETS + [(1, -3)]),
+                                 self.create_extractor(self.regular_path, **kwargs).prepare_targets_packets(TARGETS + [(1, -3)]))
+                self.assertTrue(extractor.is_fragmented())
+
+    def test_time_targets(self):
+        extractor = self.create_extractor(self.fragmented_path)
+        regular_extractor = self.create_extractor(self.regular_path)
+        for seconds in TIMES:
+            self.assertEqual(extractor.prepare_time_target_packets(seconds), regular_extractor.prepare_time_target_packets(seconds), seconds)
+
+    def test_time_targets_with_track_index(self):
+        track_index = self.create_extractor(self.fragmented_path).build_track_index()
+        self.assertIsNotNone(track_index.keys_times)
+        regular_extractor = self.create_extractor(self.regular_path)
+        for seconds in TIMES:
+            extractor = self.create_extractor(self.fragmented_path, track_index=track_index)
+            self.assertEqual(extractor.prepare_time_target_packets(seconds), regular_extractor.prepare_time_target_packets(seconds), seconds)
+            # the header of the moof of the key frame, the moof and the samples
+            self.assertEqual(extractor.round_trips, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import re
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from frameExtractor.extractor_handlers.HttpStreamHandler import HttpConnectionPool, HttpStreamHandler
+
+FILE_DATA = bytes(range(256)) * 4096
+RANGES = [(10, 100), (5000, 20), (300000, 1000)]
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    # the server mode is multipart, single (the ranges are merged to the range covering them all) or ignore (the whole file is sent)
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(FILE_DATA)))
+        self.send_header('ETag', '"file"')
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('Range'))
+        spans = [(int(first), int(last)) for first, last in re.findall(r'(\d+)-(\d+)', self.headers.get('Range') or '')]
+        if not spans or self.server.mode == 'ignore':
+            self.send_body(200, FILE_DATA, {})
+        elif len(spans) == 1 or self.server.mode == 'single':
+            first, last = min(first for first, _ in spans), max(last for _, last in spans)
+            self.send_body(206, FILE_DATA[first: last + 1], {'Content-Range': f'bytes {first}-{last}/{len(FILE_DATA)}'})
+        else:
+            body = b''.join(b'\r\n--BOUNDARY\r\nContent-Range: bytes %d-%d/%d\r\n\r\n' % (first, last, len(FILE_DATA)) + FILE_DATA[first: last + 1]
+                            for first, last in spans) + b'\r\n--BOUNDARY--\r\n'
+            self.send_body(206, body, {'Content-Type': 'multipart/byteranges; boundary=BOUNDARY'})
+
+
+class HttpStreamHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RangeRequestHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/video.mp4'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        HttpConnectionPool.pools.clear()
+
+    def read_ranges(self, mode):
+        self.server.mode = mode
+        handler = HttpStreamHandler(self.url, 'frame.png')
+        bodies_sizes = []
+        pool_request = handler.pool.request
+
+        def request(*args):
+            response, body = pool_request(*args)
+            bodies_sizes.append(len(body))
+            return response, body
+        handler.pool.request = request
+        ranges_dict = handler.read_ranges(RANGES, 1024)
+        self.assertEqual(ranges_dict, {offset: FILE_DATA[offset: offset + bytes_number] for offset, bytes_number in RANGES})
+        return handler, bodies_sizes
+
+    def test_multipart(self):
+        handler, _ = self.read_ranges('multipart')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertTrue(handler.pool.multipart_supported)
+
+    def test_single_range(self):
+        self.server.mode = 'multipart'
+        handler = HttpStreamHandler(self.url, 'frame.png')
+        self.assertEqual(handler.read_ranges([(1000, 24)], 1024), {1000: FILE_DATA[1000: 1024]})
+        self.assertEqual(self.server.requests, ['bytes=1000-1023'])
+
+    def test_merged_ranges(self):
+        self.read_ranges('single')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_ignored_ranges_are_read_up_to_the_last_range(self):
+        handler, bodies_sizes = self.read_ranges('ignore')
+        last_range_end = max(offset + bytes_number for offset, bytes_number in RANGES)
+        self.assertEqual(bodies_sizes, [last_range_end])
+        self.assertFalse(handler.pool.multipart_supported)
+        # the next reads request every range alone and read only up to its end
+        bodies_sizes.clear()
+        self.assertEqual(handler.read_ranges([(100, 10), (2000, 10)], 1024), {100: FILE_DATA[100: 110], 2000: FILE_DATA[2000: 2010]})
+        self.assertEqual(bodies_sizes, [110, 2010])
+
+    def test_pools_are_kept_apart_by_their_settings(self):
+        pool = HttpConnectionPool.get_pool('http', 'example.com', 80, 4, 10)
+        self.assertIs(HttpConnectionPool.get_pool('http', 'example.com', 80, 4, 10), pool)
+        self.assertIsNot(HttpConnectionPool.get_pool('http', 'example.com', 80, 8, 10), pool)
+        self.assertEqual(HttpConnectionPool.get_pool('http', 'example.com', 80, 4, 30).timeout, 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from benchmarks.corpus import make_mp4
+from benchmarks.import_time import HEAVY_MODULES, LIGHTWEIGHT_SCENARIOS, REPO_DIR, SCENARIOS
+
+# runs the code in a fresh interpreter where importing the heavy modules fails, whether they are installed or not,
+# and prints the heavy modules the code tried to import and the decoder backends it loaded
+BLOCKING_TEMPLATE = '''import json, os, sys
+attempts = []
+class HeavyModulesBlocker:
+    def find_spec(self, name, path=None, target=None):
+        if name.split('.')[0] in {heavy_modules!r}:
+            attempts.append(name)
+            raise ImportError(name)
+sys.meta_path.insert(0, HeavyModulesBlocker())
+FILE_PATH = {file_path!r}
+{code}
+print(json.dumps({{'attempts': attempts, 'decoders_modules': sorted(name for name in sys.modules if name.startswith('frameExtractor.extractor_decoders.')
+                                                                   and name != 'frameExtractor.extractor_decoders.FrameDecoderBase')}}))
+'''
+PACKAGE_MODULES = ['frameExtractor.FrameExtractor', 'frameExtractor.AsyncFrameExtractor', 'frameExtractor.FrameExtractorBatch',
+                   'frameExtractor.FrameExtractorDaemon', 'frameExtractor.FrameExtractorCli']
+
+
+class ImportTimeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'video.mp4')
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_blocked(self, code):
+        script = BLOCKING_TEMPLATE.format(heavy_modules=HEAVY_MODULES, file_path=self.file_path, code=code)
+        # only the repository root is on the path, so the package must resolve its own modules relatively
+        process = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=self.tmp_dir.name,
+                                 env={**os.environ, 'PYTHONPATH': REPO_DIR})
+        self.assertEqual(process.returncode, 0, process.stderr.decode(errors='replace'))
+        return json.loads(process.stdout.decode().strip().splitlines()[-1])
+
+    def test_imports_do_not_load_decoders(self):
+        for module_name in PACKAGE_MODULES:
+            with self.subTest(module_name):
+                self.assertEqual(self.run_blocked(f'import {module_name}'), {'attempts': [], 'decoders_modules': []})
+
+    def test_lightweight_scenarios_do_not_load_decoders(self):
+        for scenario_name in LIGHTWEIGHT_SCENARIOS:
+            with self.subTest(scenario_name):
+                self.assertEqual(self.run_blocked(SCENARIOS[scenario_name]), {'attempts': [], 'decoders_modules': []})
+
+    def test_decoders_are_resolved_on_the_first_decode(self):
+        code = ("from frameExtractor.FrameExtractor import FrameExtractor\n"
+                "from frameExtractor.FrameExtractorConstants import ARRAY_FRAME_OUTPUT, PACKETS_READER_FAIL_CODE\n"
+                "from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler\n"
+                "extractor = FrameExtractor(FileStreamHandler(FILE_PATH, os.devnull), verbose=0, frame_output=ARRAY_FRAME_OUTPUT)\n"
+                "extractor.prepare_targets_packets([(0.5, 0)])\n"
+                "assert not attempts\n"
+                "assert extractor.extract_frame() == (PACKETS_READER_FAIL_CODE, 'no frame decoder is available')")
+        result = self.run_blocked(code)
+        # every default backend was tried in order and none of them was available
+        self.assertEqual([attempt.split('.')[0] for attempt in result['attempts']], ['av', 'numpy', 'cv2'])
+
+    def test_synchronous_extractor_does_not_import_asyncio(self):
+        code = ("from frameExtractor.FrameExtractor import FrameExtractor\n"
+                "assert 'asyncio' not in sys.modules")
+        self.assertEqual(self.run_blocked(code)['attempts'], [])
+
+    def test_exceptions_have_a_single_identity(self):
+        code = ("from frameExtractor import FrameExtractor as extractor_module\n"
+                "from frameExtractor.FrameExtractorExceptions import ExtractorExceptionBase\n"
+                "assert extractor_module.ExtractorExceptionBase is ExtractorExceptionBase\n"
+                "assert 'FrameExtractorExceptions' not in sys.modules")
+        self.assertEqual(self.run_blocked(code)['attempts'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
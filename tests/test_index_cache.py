@@ -0,0 +1,86 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from benchmarks.corpus import make_fragmented_mp4, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.FrameExtractorIndexCache import IndexCache
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+
+TARGETS = [(0.5, -1), (1, -1)]
+
+
+class IndexCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'video.mp4')
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4(moov_at_end=True))
+        self.index_cache = IndexCache(os.path.join(self.tmp_dir.name, 'indexes'))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_extractor(self, file_path=None):
+        return FrameExtractor(FileStreamHandler(file_path or self.file_path, os.devnull), verbose=0, index_cache=self.index_cache)
+
+    def test_round_trip(self):
+        first_extractor = self.create_extractor()
+        expected_packets = first_extractor.prepare_targets_packets(TARGETS)
+        expected_time_packets = first_extractor.prepare_time_target_packets(12.5)
+        file_identity = first_extractor.stream_handler.get_file_identity()
+        boxes, sample_tables, sample_descriptions, timescale = self.index_cache.load(file_identity)
+        self.assertEqual(boxes, first_extractor.boxes)
+        self.assertEqual(sample_descriptions, first_extractor.sample_descriptions)
+        self.assertEqual(timescale, first_extractor.get_timescale())
+        for box_name, table in sample_tables.items():
+            self.assertEqual(table.entries, first_extractor.sample_tables[box_name].entries, box_name)
+        # the index is served from the cache so only the samples are read
+        extractor = self.create_extractor()
+        self.assertEqual(extractor.prepare_targets_packets(TARGETS), expected_packets)
+        self.assertEqual(extractor.round_trips, 1)
+        self.assertEqual(self.create_extractor().prepare_time_target_packets(12.5), expected_time_packets)
+
+    def test_changed_file_is_indexed_again(self):
+        file_identity = self.create_extractor().stream_handler.get_file_identity()
+        self.create_extractor().init()
+        self.assertIsNotNone(self.index_cache.load(file_identity))
+        # another file with the same name and size
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4(moov_at_end=True, seed=2))
+        os.utime(self.file_path, ns=(0, os.stat(self.file_path).st_mtime_ns + 10 ** 9))
+        extractor = self.create_extractor()
+        self.assertNotEqual(extractor.stream_handler.get_file_identity(), file_identity)
+        self.assertFalse(extractor.load_cached_index())
+        expected_packets = FrameExtractor(FileStreamHandler(self.file_path, os.devnull), verbose=0).prepare_targets_packets(TARGETS)
+        self.assertEqual(extractor.prepare_targets_packets(TARGETS), expected_packets)
+        self.assertTrue(self.create_extractor().load_cached_index())
+
+    def test_invalid_index_files_are_ignored(self):
+        extractor = self.create_extractor()
+        extractor.init()
+        file_identity = extractor.stream_handler.get_file_identity()
+        index_path = self.index_cache.get_index_path(file_identity)
+        with open(index_path, 'rb') as f:
+            index_bytes = f.read()
+        # cut, extended, of another version and empty
+        other_version = struct.pack('!H', INDEX_CACHE_VERSION + 1)
+        for invalid_bytes in (index_bytes[:len(index_bytes) // 2], index_bytes + b'\0', index_bytes[:8] + other_version + index_bytes[10:], b''):
+            with open(index_path, 'wb') as f:
+                f.write(invalid_bytes)
+            self.assertIsNone(self.index_cache.load(file_identity))
+        self.assertIsNone(self.index_cache.load(('missing.mp4', 1, '0')))
+
+    def test_fragmented_files_are_not_stored(self):
+        file_path = os.path.join(self.tmp_dir.name, 'fragmented.mp4')
+        with open(file_path, 'wb') as f:
+            f.write(make_fragmented_mp4())
+        extractor = self.create_extractor(file_path)
+        extractor.prepare_targets_packets(TARGETS)
+        self.assertIsNone(self.index_cache.load(extractor.stream_handler.get_file_identity()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.corpus import make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.FrameExtractorMetrics import NULL_SPAN, InMemoryMetricsSink, Instrumentation, MetricsSink
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from tests import RecordingDecoder
+
+TARGETS = [(0, 0), (0.5, -1), (1, -1)]
+
+
+class FailingDecoder(RecordingDecoder):
+    def decode_frame(self, packets, video_codec, width, height, frame_index=-1):
+        raise RuntimeError('corrupted packets')
+
+
+class RecordingMetricsSink(MetricsSink):
+    def __init__(self):
+        self.records = []
+
+    def record_span(self, name, duration, attributes):
+        self.records.append(('span', name, attributes))
+
+    def record_counter(self, name, value, attributes):
+        self.records.append(('counter', name, attributes))
+
+    def record_value(self, name, value, attributes):
+        self.records.append(('value', name, attributes))
+
+
+class InstrumentationTest(unittest.TestCase):
+    def test_disabled_instrumentation_records_nothing(self):
+        instrumentation = Instrumentation()
+        self.assertFalse(instrumentation.enabled)
+        self.assertIs(instrumentation.span('fetch', handler='file'), NULL_SPAN)
+        with instrumentation.span('fetch'):
+            instrumentation.count('requests')
+            instrumentation.observe('request_bytes', 100)
+
+    def test_every_sink_receives_the_measurements(self):
+        sinks = [RecordingMetricsSink(), RecordingMetricsSink()]
+        instrumentation = Instrumentation(sinks)
+        with instrumentation.span('fetch', handler='file'):
+            instrumentation.count('requests', handler='file')
+        with self.assertRaises(ValueError):
+            with instrumentation.span('decode'):
+                raise ValueError()
+        instrumentation.observe('request_bytes', 100)
+        for sink in sinks:
+            self.assertEqual(sink.records, [('counter', 'requests', {'handler': 'file'}), ('span', 'fetch', {'handler': 'file'}),
+                                            ('span', 'decode', {'failed': True}), ('value', 'request_bytes', {})])
+
+
+class ExtractorMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'video.mp4')
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_extractor(self, decoder, metrics_sinks=None):
+        return FrameExtractor(FileStreamHandler(self.file_path, os.devnull), verbose=0, decoders=[decoder], frame_output=ARRAY_FRAME_OUTPUT,
+                              metrics_sinks=metrics_sinks)
+
+    def test_extraction_metrics(self):
+        sink = InMemoryMetricsSink()
+        extractor = self.create_extractor(RecordingDecoder(), [sink])
+        results = extractor.extract_frames(TARGETS)
+        report = sink.get_report()
+        self.assertEqual(set(report['spans']), {'find_boxes', 'collect_target_samples', 'fetch{handler=FileStreamHandler}', 'decode{decoder=recording}'})
+        self.assertEqual(report['spans']['fetch{handler=FileStreamHandler}']['count'], extractor.round_trips)
+        self.assertEqual(report['spans']['decode{decoder=recording}']['count'], len(TARGETS))
+        self.assertEqual(report['counters']['requests{handler=FileStreamHandler}'], extractor.round_trips)
+        self.assertEqual(report['counters']['fetched_bytes{handler=FileStreamHandler}'], extractor.get_fetched_bytes())
+        self.assertEqual(report['counters']['extractions{status_code=10}'], len(TARGETS))
+        self.assertEqual(report['values']['request_bytes{handler=FileStreamHandler}']['total'], extractor.get_fetched_bytes())
+        self.assertEqual(report['values']['cache_hit_rate']['count'], len(TARGETS))
+        # the same extraction without sinks
+        self.assertEqual(self.create_extractor(RecordingDecoder()).extract_frames(TARGETS), results)
+
+    def test_failed_extraction_metrics(self):
+        sink = InMemoryMetricsSink()
+        self.assertEqual(self.create_extractor(FailingDecoder(), [sink]).extract_frame(), (PACKETS_READER_FAIL_CODE, 'corrupted packets'))
+        report = sink.get_report()
+        self.assertEqual(report['spans']['decode{decoder=recording,failed=True}']['count'], 1)
+        self.assertEqual(report['counters']['extractions{status_code=15}'], 1)
+
+    def test_no_sinks_no_measurements(self):
+        extractor = self.create_extractor(RecordingDecoder())
+        self.assertFalse(extractor.metrics.enabled)
+        self.assertIs(extractor.metrics.span('fetch'), NULL_SPAN)
+        self.assertEqual(extractor.extract_frame()[0], SUCCESS_CODE)
+
+
+if __name__ == '__main__':
+    unittest.main()
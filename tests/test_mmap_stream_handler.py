@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.corpus import LAYOUTS, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from frameExtractor.extractor_handlers.MmapFileStreamHandler import MmapFileStreamHandler
+from tests import RecordingDecoder
+
+TARGETS = [(0, 0), (0.5, -1), (1, -1)]
+
+
+class MmapFileStreamHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'video.mp4')
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4(**LAYOUTS['moov_end']))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_reads_match_file_reads(self):
+        file_size = os.path.getsize(self.file_path)
+        # the last range crosses the end of the file
+        ranges = [(0, 8), (1000, 1), (KB_SIZE * 300, KB_SIZE * 64), (file_size - 100, 200)]
+        file_handler = FileStreamHandler(self.file_path, os.devnull)
+        with MmapFileStreamHandler(self.file_path, os.devnull) as mmap_handler:
+            self.assertEqual(mmap_handler.get_file_size(), file_size)
+            self.assertEqual(mmap_handler.get_file_identity(), file_handler.get_file_identity())
+            self.assertEqual(mmap_handler.get_read_alignment(DEFAULT_CHUNK_SIZE), 1)
+            ranges_dict = mmap_handler.read_ranges(ranges, DEFAULT_CHUNK_SIZE)
+            self.assertTrue(all(isinstance(range_bytes, memoryview) for range_bytes in ranges_dict.values()))
+            self.assertEqual({offset: bytes(range_bytes) for offset, range_bytes in ranges_dict.items()},
+                             file_handler.read_ranges(ranges, DEFAULT_CHUNK_SIZE))
+            chunks_dict = mmap_handler.read_chunks(KB_SIZE, 3, KB_SIZE)
+            self.assertEqual({offset: bytes(chunk) for offset, chunk in chunks_dict.items()}, file_handler.read_chunks(KB_SIZE, 3, KB_SIZE))
+            for range_bytes in list(ranges_dict.values()) + list(chunks_dict.values()):
+                range_bytes.release()
+
+    def test_extraction_matches_file_extraction(self):
+        expected_results = FrameExtractor(FileStreamHandler(self.file_path, os.devnull), verbose=0, decoders=[RecordingDecoder()],
+                                          frame_output=ARRAY_FRAME_OUTPUT).extract_frames(TARGETS)
+        extractor = FrameExtractor(MmapFileStreamHandler(self.file_path, os.devnull), verbose=0, decoders=[RecordingDecoder()],
+                                   frame_output=ARRAY_FRAME_OUTPUT)
+        self.assertEqual(extractor.extract_frames(TARGETS), expected_results)
+        # the extractor drops its views so the mapping can be closed
+        extractor.close()
+        self.assertTrue(extractor.stream_handler.file_mmap.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.corpus import LAYOUTS, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from tests import RecordingDecoder
+
+TARGETS = [(0, 0), (0.5, -1), (1, -1)]
+
+
+class MoovProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_file(self, **layout_options):
+        file_path = os.path.join(self.tmp_dir.name, 'video.mp4')
+        with open(file_path, 'wb') as f:
+            f.write(make_mp4(**layout_options))
+        return file_path
+
+    @staticmethod
+    def create_extractor(file_path, **kwargs):
+        return FrameExtractor(FileStreamHandler(file_path, os.devnull), verbose=0, decoders=[RecordingDecoder()], frame_output=ARRAY_FRAME_OUTPUT,
+                              **kwargs)
+
+    def test_moov_at_end_is_found_in_one_round_trip(self):
+        file_path = self.write_file(**LAYOUTS['moov_end'])
+        walking_extractor = self.create_extractor(file_path, probe_window_size=0)
+        walking_extractor.init()
+        self.assertEqual(walking_extractor.moov_round_trips, 2)
+        extractor = self.create_extractor(file_path)
+        extractor.init()
+        # the head window holds the mdat header and the tail window holds the whole moov
+        self.assertEqual(extractor.moov_round_trips, 1)
+        self.assertEqual(extractor.round_trips, 1)
+        self.assertLessEqual(extractor.get_fetched_bytes(), extractor.probe_window_size * 2)
+
+    def test_probing_never_finds_moov_later(self):
+        for layout_name, layout_options in LAYOUTS.items():
+            with self.subTest(layout_name):
+                file_path = self.write_file(**layout_options)
+                walking_extractor = self.create_extractor(file_path, probe_window_size=0)
+                extractor = self.create_extractor(file_path)
+                self.assertEqual(extractor.extract_frames(TARGETS), walking_extractor.extract_frames(TARGETS))
+                self.assertLessEqual(extractor.moov_round_trips, walking_extractor.moov_round_trips)
+                # the walk over the mdat to a moov at the end is saved
+                if layout_options.get('moov_at_end'):
+                    self.assertLess(extractor.round_trips, walking_extractor.round_trips)
+
+    def test_windows_of_a_small_file_overlap(self):
+        file_path = self.write_file(samples_count=10, gop=5)
+        extractor = self.create_extractor(file_path)
+        self.assertLess(os.path.getsize(file_path), extractor.probe_window_size * 2)
+        extractor.init()
+        self.assertEqual(extractor.round_trips, 1)
+        self.assertEqual(extractor.get_fetched_bytes(), os.path.getsize(file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
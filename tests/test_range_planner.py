@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.corpus import LAYOUTS, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.FrameExtractorRangePlanner import RangePlanner
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from frameExtractor.extractor_handlers.StreamHandlerBase import StreamHandler
+from tests import RecordingDecoder
+
+TARGETS = [(0, 0), (0.5, -1), (1, -1)]
+
+
+class PlansRecordingFileStreamHandler(FileStreamHandler):
+    def __init__(self, src_file_name, dst_file_name):
+        super().__init__(src_file_name, dst_file_name)
+        self.plans = []
+
+    def read_ranges(self, ranges, chunk_size):
+        self.plans.append(list(ranges))
+        return super().read_ranges(ranges, chunk_size)
+
+
+# a handler that can only read whole chunks, served by the default read_ranges
+class ChunksOnlyStreamHandler(StreamHandler):
+    def __init__(self, data):
+        self.data = data
+
+    def get_file_size(self):
+        return len(self.data)
+
+    def read_chunks(self, offset, chunk_number, chunk_size):
+        return {offset + i * chunk_size: self.data[offset + i * chunk_size: offset + (i + 1) * chunk_size] for i in range(chunk_number)}
+
+
+class RangePlannerTest(unittest.TestCase):
+    def test_close_ranges_are_merged(self):
+        planner = RangePlanner(10)
+        for offset, bytes_number in [(100, 10), (0, 5), (120, 5), (15, 5), (31, 5), (50, 0)]:
+            planner.add_range(offset, bytes_number)
+        # the gaps of 10 bytes are merged, the gap of 11 bytes is not and the empty range is dropped
+        self.assertEqual(planner.get_plan(), [(0, 20), (31, 5), (100, 25)])
+
+    def test_overlapping_ranges_are_merged(self):
+        planner = RangePlanner(0)
+        for offset, bytes_number in [(10, 20), (0, 15), (12, 3), (30, 5), (36, 4)]:
+            planner.add_range(offset, bytes_number)
+        self.assertEqual(planner.get_plan(), [(0, 35), (36, 4)])
+
+    def test_default_read_ranges_reads_whole_chunks(self):
+        data = bytes(range(256)) * 4
+        ranges = [(0, 3), (10, 40), (1000, 24)]
+        self.assertEqual(ChunksOnlyStreamHandler(data).read_ranges(ranges, 16),
+                         {offset: data[offset: offset + bytes_number] for offset, bytes_number in ranges})
+
+
+class PlannedExtractionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_layout(self, layout_name):
+        file_path = os.path.join(self.tmp_dir.name, f'{layout_name}.mp4')
+        with open(file_path, 'wb') as f:
+            f.write(make_mp4(**LAYOUTS[layout_name]))
+        return file_path
+
+    @staticmethod
+    def extract(file_path, **kwargs):
+        stream_handler = PlansRecordingFileStreamHandler(file_path, os.devnull)
+        extractor = FrameExtractor(stream_handler, verbose=0, decoders=[RecordingDecoder()], frame_output=ARRAY_FRAME_OUTPUT, **kwargs)
+        return extractor, stream_handler, extractor.extract_frames(TARGETS)
+
+    def test_plans_are_sorted_and_apart(self):
+        for layout_name in LAYOUTS:
+            with self.subTest(layout_name):
+                extractor, stream_handler, _ = self.extract(self.write_layout(layout_name))
+                self.assertEqual(len(stream_handler.plans), extractor.round_trips)
+                for plan in stream_handler.plans:
+                    for (offset, bytes_number), (next_offset, _) in zip(plan, plan[1:]):
+                        self.assertGreater(next_offset - (offset + bytes_number), extractor.range_gap_threshold)
+                # a byte is never read twice
+                read_offsets = [offset for plan in stream_handler.plans for offset, bytes_number in plan for offset in range(offset, offset + bytes_number)]
+                self.assertEqual(len(read_offsets), len(set(read_offsets)))
+
+    def test_gap_threshold_merges_a_phase(self):
+        file_path = self.write_layout('moov_start')
+        ranges = [(KB_SIZE * 100, KB_SIZE), (KB_SIZE * 103, KB_SIZE), (KB_SIZE * 110, KB_SIZE)]
+        expected_plans = {0: [ranges], KB_SIZE * 2: [[(KB_SIZE * 100, KB_SIZE * 4), (KB_SIZE * 110, KB_SIZE)]], KB_SIZE * 10: [[(KB_SIZE * 100, KB_SIZE * 11)]]}
+        for range_gap_threshold, expected_plan in expected_plans.items():
+            with self.subTest(range_gap_threshold):
+                stream_handler = PlansRecordingFileStreamHandler(file_path, os.devnull)
+                extractor = FrameExtractor(stream_handler, verbose=0, range_gap_threshold=range_gap_threshold)
+                extractor.prefetch(ranges)
+                self.assertEqual(stream_handler.plans, expected_plan)
+                self.assertEqual(extractor.round_trips, 1)
+                with open(file_path, 'rb') as f:
+                    for offset, bytes_number in ranges:
+                        f.seek(offset)
+                        self.assertEqual(bytes(extractor.get_bytes(offset, bytes_number)), f.read(bytes_number))
+                self.assertEqual(extractor.round_trips, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.corpus import LAYOUTS, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.FrameExtractorExceptions import FetchBudgetException
+from frameExtractor.FrameExtractorRangePlanner import ReadCostModel
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from tests import RecordingDecoder
+
+TARGETS = [(0, 0), (0.5, -1), (1, -1)]
+
+
+# reads whole chunks like the telegram handler, through the file
+class ChunksFileStreamHandler(FileStreamHandler):
+    def __init__(self, src_file_name, dst_file_name):
+        super().__init__(src_file_name, dst_file_name)
+        self.ranges = []
+
+    def get_read_alignment(self, chunk_size):
+        return chunk_size
+
+    def read_ranges(self, ranges, chunk_size):
+        self.ranges.extend(ranges)
+        return super().read_ranges(ranges, chunk_size)
+
+
+class ReadCostModelTest(unittest.TestCase):
+    def test_read_cost(self):
+        cost_model = ReadCostModel(request_latency=0.1, bytes_per_second=MB_SIZE)
+        self.assertAlmostEqual(cost_model.get_read_cost(3, MB_SIZE * 2), 2.3)
+        self.assertEqual(cost_model.get_break_even_size(), MB_SIZE // 10)
+        # the extra bytes of the break even size cost as much as another request
+        self.assertAlmostEqual(cost_model.get_read_cost(1, cost_model.get_break_even_size()), cost_model.get_read_cost(2, 0), places=5)
+
+    def test_local_source_does_not_read_ahead(self):
+        self.assertEqual(ReadCostModel(request_latency=0).get_break_even_size(), 0)
+
+
+class ReadBudgetTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'video.mp4')
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4(**LAYOUTS['many_traks']))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_extractor(self, stream_handler=None, **kwargs):
+        return FrameExtractor(stream_handler or FileStreamHandler(self.file_path, os.devnull), verbose=0, decoders=[RecordingDecoder()],
+                              frame_output=ARRAY_FRAME_OUTPUT, **kwargs)
+
+    def test_cost_model_sizes_the_reads(self):
+        cost_model = ReadCostModel(request_latency=0.01, bytes_per_second=MB_SIZE)
+        extractor = self.create_extractor(cost_model=cost_model)
+        self.assertEqual(extractor.readahead_size, cost_model.get_break_even_size())
+        self.assertEqual(extractor.range_gap_threshold, cost_model.get_break_even_size())
+        self.assertEqual(self.create_extractor(cost_model=cost_model, range_gap_threshold=0).range_gap_threshold, 0)
+        # a slower source reads more ahead and saves requests
+        slow_extractor = self.create_extractor(cost_model=ReadCostModel(request_latency=0.5, bytes_per_second=MB_SIZE), probe_window_size=0)
+        fast_extractor = self.create_extractor(cost_model=ReadCostModel(request_latency=0, bytes_per_second=MB_SIZE), probe_window_size=0)
+        self.assertEqual(slow_extractor.extract_frames(TARGETS), fast_extractor.extract_frames(TARGETS))
+        self.assertLess(slow_extractor.round_trips, fast_extractor.round_trips)
+        self.assertGreater(slow_extractor.get_fetched_bytes(), fast_extractor.get_fetched_bytes())
+
+    def test_reads_are_aligned_for_chunk_handlers(self):
+        expected_results = self.create_extractor().extract_frames(TARGETS)
+        stream_handler = ChunksFileStreamHandler(self.file_path, os.devnull)
+        extractor = self.create_extractor(stream_handler, chunk_size=KB_SIZE * 4)
+        self.assertEqual(extractor.extract_frames(TARGETS), expected_results)
+        file_size = os.path.getsize(self.file_path)
+        for offset, bytes_number in stream_handler.ranges:
+            self.assertEqual(offset % (KB_SIZE * 4), 0)
+            self.assertTrue(bytes_number % (KB_SIZE * 4) == 0 or offset + bytes_number == file_size)
+
+    def test_byte_limit(self):
+        extractor = self.create_extractor()
+        expected_results = extractor.extract_frames(TARGETS)
+        self.assertEqual(self.create_extractor(fetch_byte_limit=extractor.get_fetched_bytes()).extract_frames(TARGETS), expected_results)
+        results = self.create_extractor(fetch_byte_limit=extractor.get_fetched_bytes() - 1).extract_frames(TARGETS)
+        self.assertEqual([status_code for _, status_code, _ in results], [FETCH_BUDGET_FAIL_CODE] * len(TARGETS))
+
+    def test_request_limit(self):
+        extractor = self.create_extractor()
+        extractor.extract_frames(TARGETS)
+        limited_extractor = self.create_extractor(request_limit=extractor.round_trips - 1)
+        with self.assertRaises(FetchBudgetException) as context:
+            limited_extractor.prepare_targets_packets(TARGETS)
+        self.assertEqual(context.exception.requests_count, extractor.round_trips - 1)
+        self.assertEqual(limited_extractor.round_trips, extractor.round_trips - 1)
+        self.assertEqual(context.exception.get_fail_code(), FETCH_BUDGET_FAIL_CODE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,289 @@
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import unittest
+
+from benchmarks.corpus import make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.extractor_handlers.AsyncResilientStreamHandler import AsyncResilientStreamHandler
+from frameExtractor.extractor_handlers.AsyncStreamHandlerBase import AsyncStreamHandler
+from frameExtractor.extractor_handlers.ResilientStreamHandler import DeadlineExceededError, ResilientStreamHandler, RetryPolicy, TokenBucket
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from frameExtractor.extractor_handlers.HttpStreamHandler import HttpStatusError
+from frameExtractor.extractor_handlers.StreamHandlerBase import StreamHandler
+from tests import RecordingDecoder
+
+RANGES = [(0, 4)]
+
+
+class FakeClock:
+    # time moves only when something sleeps
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds):
+        self.sleep(seconds)
+
+
+class FailingStreamHandler(StreamHandler):
+    # fails the first reads with the given errors and then answers
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.reads = 0
+
+    def get_file_size(self):
+        return 100
+
+    def read_ranges(self, ranges, chunk_size):
+        self.reads += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {offset: bytes(bytes_number) for offset, bytes_number in ranges}
+
+
+class AsyncFailingStreamHandler(AsyncStreamHandler):
+    def __init__(self, errors=()):
+        self.stream_handler = FailingStreamHandler(errors)
+
+    def get_file_size(self):
+        return 100
+
+    async def read_ranges(self, ranges, chunk_size):
+        return self.stream_handler.read_ranges(ranges, chunk_size)
+
+
+class SlowFirstStreamHandler(StreamHandler):
+    # the first read hangs until the test releases it, so the hedged read answers first
+    def __init__(self):
+        self.release = threading.Event()
+        self.reads = 0
+        self.lock = threading.Lock()
+
+    def read_ranges(self, ranges, chunk_size):
+        with self.lock:
+            self.reads += 1
+            read_number = self.reads
+        if read_number == 1:
+            self.release.wait(5)
+            return {offset: b'slow' for offset, _ in ranges}
+        return {offset: b'fast' for offset, _ in ranges}
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_delays_are_capped(self):
+        retry_policy = RetryPolicy(base_delay=0.1, max_delay=1, rnd=random.Random(0))
+        for retry_number in range(10):
+            self.assertLessEqual(retry_policy.get_delay(retry_number), min(1, 0.1 * 2 ** retry_number))
+
+    def test_retryable_errors(self):
+        retry_policy = RetryPolicy()
+        self.assertTrue(retry_policy.is_retryable(ConnectionResetError()))
+        self.assertFalse(retry_policy.is_retryable(ValueError()))
+        self.assertFalse(retry_policy.is_retryable(DeadlineExceededError()))
+        # missing files and refused permissions won't heal by retrying
+        self.assertFalse(retry_policy.is_retryable(FileNotFoundError()))
+        self.assertFalse(retry_policy.is_retryable(PermissionError()))
+
+    def test_retryable_statuses(self):
+        retry_policy = RetryPolicy()
+        self.assertEqual([retry_policy.is_retryable(HttpStatusError('failed', status)) for status in (400, 403, 404, 416, 429, 500, 503)],
+                         [False, False, False, False, True, True, True])
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_reserve_and_refill(self):
+        clock = FakeClock()
+        token_bucket = TokenBucket(2, capacity=2, clock=clock)
+        self.assertEqual([token_bucket.reserve() for _ in range(4)], [0.0, 0.0, 0.5, 1.0])
+        self.assertFalse(token_bucket.try_take())
+        clock.now = 2.0
+        self.assertTrue(token_bucket.try_take())
+
+
+class ResilientStreamHandlerTest(unittest.TestCase):
+    def create_handler(self, stream_handler, clock, **kwargs):
+        return ResilientStreamHandler(stream_handler, RetryPolicy(rnd=random.Random(0)), clock=clock, sleep=clock.sleep, **kwargs)
+
+    def test_retries_until_success(self):
+        clock = FakeClock()
+        stream_handler = FailingStreamHandler([ConnectionResetError(), TimeoutError()])
+        handler = self.create_handler(stream_handler, clock)
+        self.assertEqual(handler.read_ranges(RANGES, 1), {0: bytes(4)})
+        self.assertEqual(stream_handler.reads, 3)
+        self.assertEqual(handler.stats['retries'], 2)
+        self.assertEqual(len(clock.sleeps), 2)
+
+    def test_gives_up_after_max_attempts(self):
+        clock = FakeClock()
+        stream_handler = FailingStreamHandler([ConnectionResetError()] * 10)
+        with self.assertRaises(ConnectionResetError):
+            self.create_handler(stream_handler, clock).read_ranges(RANGES, 1)
+        self.assertEqual(stream_handler.reads, RetryPolicy().max_attempts)
+
+    def test_other_errors_are_not_retried(self):
+        stream_handler = FailingStreamHandler([ValueError()])
+        with self.assertRaises(ValueError):
+            self.create_handler(stream_handler, FakeClock()).read_ranges(RANGES, 1)
+        self.assertEqual(stream_handler.reads, 1)
+
+    def test_missing_file_is_not_retried(self):
+        clock = FakeClock()
+        stream_handler = FailingStreamHandler([FileNotFoundError('video.mp4')] * 10)
+        handler = self.create_handler(stream_handler, clock)
+        with self.assertRaises(FileNotFoundError):
+            handler.read_ranges(RANGES, 1)
+        self.assertEqual(stream_handler.reads, 1)
+        self.assertEqual(handler.stats['attempts'], 1)
+        self.assertEqual(clock.sleeps, [])
+
+    def test_deadline(self):
+        clock = FakeClock()
+        stream_handler = FailingStreamHandler([ConnectionResetError()] * 10)
+        handler = ResilientStreamHandler(stream_handler, RetryPolicy(max_attempts=100, base_delay=1, max_delay=1, rnd=random.Random(0)), deadline=3,
+                                         clock=clock, sleep=clock.sleep)
+        with self.assertRaises(DeadlineExceededError):
+            handler.read_ranges(RANGES, 1)
+        self.assertLess(clock.now, 3)
+        # the deadline of the next extraction counts from its start
+        clock.now = 10
+        handler.start_extraction()
+        self.assertEqual(handler.get_deadline().get_remaining(), 3)
+
+    def test_extractions_sharing_a_handler_keep_their_deadlines(self):
+        clock = FakeClock()
+        handler = self.create_handler(FailingStreamHandler(), clock, deadline=3)
+        handler.start_extraction()
+        clock.now = 2
+        # an extraction started on another thread has its own deadline
+        other_remaining = []
+
+        def extract_on_other_thread():
+            handler.start_extraction()
+            other_remaining.append(handler.get_deadline().get_remaining())
+        thread = threading.Thread(target=extract_on_other_thread)
+        thread.start()
+        thread.join()
+        self.assertEqual(other_remaining, [3])
+        self.assertEqual(handler.get_deadline().get_remaining(), 1)
+
+    def test_deadline_is_per_extraction(self):
+        clock = FakeClock()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'video.mp4')
+            with open(file_path, 'wb') as f:
+                f.write(make_mp4())
+            handler = self.create_handler(FileStreamHandler(file_path, os.devnull), clock, deadline=3)
+            extractor = FrameExtractor(handler, verbose=0, decoders=[RecordingDecoder()], frame_output=ARRAY_FRAME_OUTPUT)
+            self.assertEqual(extractor.extract_frame_at(0)[0], SUCCESS_CODE)
+            # the deadline of the first extraction passed long ago, the second extraction has its own
+            clock.now = 10
+            round_trips = extractor.round_trips
+            self.assertEqual(extractor.extract_frame_at(50)[0], SUCCESS_CODE)
+            self.assertGreater(extractor.round_trips, round_trips)
+
+    def test_rate_limit(self):
+        clock = FakeClock()
+        handler = self.create_handler(FailingStreamHandler(), clock, rate_limiter=TokenBucket(1, capacity=1, clock=clock))
+        for _ in range(3):
+            handler.read_ranges(RANGES, 1)
+        self.assertEqual(clock.sleeps, [0.0, 1.0, 1.0])
+
+    def test_hedged_read_wins(self):
+        stream_handler = SlowFirstStreamHandler()
+        handler = ResilientStreamHandler(stream_handler, hedge_delay=0.01)
+        try:
+            self.assertEqual(handler.read_ranges(RANGES, 1), {0: b'fast'})
+            self.assertEqual(handler.stats['hedges'], 1)
+            self.assertEqual(handler.stats['hedge_wins'], 1)
+        finally:
+            stream_handler.release.set()
+            handler.close()
+
+    def test_hedge_needs_a_token(self):
+        clock = FakeClock()
+        stream_handler = SlowFirstStreamHandler()
+        rate_limiter = TokenBucket(1, capacity=1, clock=clock)
+        handler = ResilientStreamHandler(stream_handler, hedge_delay=0.01, rate_limiter=rate_limiter, clock=clock, sleep=clock.sleep)
+        threading.Timer(0.1, stream_handler.release.set).start()
+        try:
+            self.assertEqual(handler.read_ranges(RANGES, 1), {0: b'slow'})
+            self.assertEqual(handler.stats['hedges'], 0)
+        finally:
+            stream_handler.release.set()
+            handler.close()
+
+
+class AsyncResilientStreamHandlerTest(unittest.TestCase):
+    def test_retries_until_success(self):
+        clock = FakeClock()
+        stream_handler = AsyncFailingStreamHandler([ConnectionResetError()])
+        handler = AsyncResilientStreamHandler(stream_handler, RetryPolicy(rnd=random.Random(0)), clock=clock, sleep=clock.async_sleep)
+        self.assertEqual(asyncio.run(handler.read_ranges(RANGES, 1)), {0: bytes(4)})
+        self.assertEqual(handler.stats['retries'], 1)
+        self.assertEqual(len(clock.sleeps), 1)
+
+    def test_deadline(self):
+        clock = FakeClock()
+        stream_handler = AsyncFailingStreamHandler([ConnectionResetError()] * 10)
+        handler = AsyncResilientStreamHandler(stream_handler, RetryPolicy(max_attempts=100, base_delay=1, max_delay=1, rnd=random.Random(0)),
+                                              deadline=3, clock=clock, sleep=clock.async_sleep)
+        with self.assertRaises(DeadlineExceededError):
+            asyncio.run(handler.read_ranges(RANGES, 1))
+        clock.now = 10
+        handler.start_extraction()
+        self.assertEqual(handler.get_deadline().get_remaining(), 3)
+
+    def test_tasks_sharing_a_handler_keep_their_deadlines(self):
+        clock = FakeClock()
+        handler = AsyncResilientStreamHandler(AsyncFailingStreamHandler(), deadline=3, clock=clock, sleep=clock.async_sleep)
+
+        async def extract(start_time):
+            clock.now = max(clock.now, start_time)
+            handler.start_extraction()
+            await asyncio.sleep(0)
+            return handler.get_deadline().end_time
+
+        async def extract_all():
+            return await asyncio.gather(extract(0), extract(2))
+        self.assertEqual(asyncio.run(extract_all()), [3, 5])
+
+    def test_hedged_read_wins_and_the_slow_read_is_cancelled(self):
+        cancelled = []
+
+        class SlowFirstAsyncStreamHandler(AsyncStreamHandler):
+            reads = 0
+
+            async def read_ranges(self, ranges, chunk_size):
+                self.reads += 1
+                if self.reads == 1:
+                    try:
+                        await asyncio.sleep(5)
+                    except asyncio.CancelledError:
+                        cancelled.append(True)
+                        raise
+                return {offset: b'fast' for offset, _ in ranges}
+
+        handler = AsyncResilientStreamHandler(SlowFirstAsyncStreamHandler(), hedge_delay=0.01)
+
+        async def read():
+            ranges_dict = await handler.read_ranges(RANGES, 1)
+            await asyncio.sleep(0)
+            return ranges_dict
+        self.assertEqual(asyncio.run(read()), {0: b'fast'})
+        self.assertEqual(handler.stats['hedge_wins'], 1)
+        self.assertEqual(cancelled, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import random
+import struct
+import tempfile
+import unittest
+
+from benchmarks.corpus import LAYOUTS, get_layout, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.FrameExtractorSampleTables import *
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+
+BOX_OFFSET = 100
+
+
+# the table entries at BOX_OFFSET of a buffer and a reader of the buffer that counts its reads
+def make_table_reader(header, entries, entry_format):
+    data = bytes(BOX_OFFSET) + header + b''.join(struct.pack(entry_format, *entry) for entry in entries)
+    reads = []
+
+    def bytes_reader(offset, bytes_number):
+        reads.append((offset, bytes_number))
+        return memoryview(data)[offset: offset + bytes_number]
+    return bytes_reader, reads
+
+
+class SampleTablesTest(unittest.TestCase):
+    def test_sample_sizes_and_offsets_in_chunks(self):
+        rnd = random.Random(1)
+        sizes = [rnd.randint(1, 5000) for _ in range(1000)]
+        bytes_reader, reads = make_table_reader(bytes(STSZ_ENTRIES_OFFSET), [(size,) for size in sizes], '!I')
+        table = SampleSizeTable(BOX_OFFSET, len(sizes), 0)
+        # (chunk first sample, sample number) pairs of touching chunks at the start of the table and of a chunk in its middle
+        chunks_samples = [(1, 1), (1, 5), (6, 20), (501, 501), (501, 509)]
+        expected = [(sum(sizes[chunk_first_sample - 1: sample_number - 1]), sizes[sample_number - 1]) for chunk_first_sample, sample_number in chunks_samples]
+        self.assertEqual(table.get_samples_offsets_in_chunks(bytes_reader, chunks_samples), expected)
+        # a read per merged span
+        self.assertEqual(len(reads), 2)
+        table.load(bytes_reader)
+        self.assertEqual(list(table.entries), sizes)
+        self.assertEqual(table.get_samples_offsets_in_chunks(bytes_reader, chunks_samples), expected)
+        self.assertEqual(len(reads), 3)
+
+    def test_constant_sample_size(self):
+        table = SampleSizeTable(BOX_OFFSET, 1000, 700)
+        self.assertEqual(table.get_samples_ranges([(1, 20)]), [])
+        self.assertEqual(table.get_samples_offsets_in_chunks(None, [(11, 14)]), [(2100, 700)])
+
+    def test_chunk_offsets(self):
+        offsets = [index * 1000 + 7 for index in range(300)]
+        bytes_reader, _ = make_table_reader(bytes(TABLE_ENTRIES_OFFSET), [(offset,) for offset in offsets], '!I')
+        self.assertEqual(ChunkOffsetTable(BOX_OFFSET, len(offsets)).get_chunks_offsets(bytes_reader, [300, 1, 2, 150]),
+                         [offsets[299], offsets[0], offsets[1], offsets[149]])
+        # 64 bit offsets above 4 GB
+        large_offsets = [(1 << 33) + offset for offset in offsets]
+        bytes_reader, _ = make_table_reader(bytes(TABLE_ENTRIES_OFFSET), [(offset,) for offset in large_offsets], '!Q')
+        table = LargeChunkOffsetTable(BOX_OFFSET, len(large_offsets))
+        self.assertEqual(table.get_chunks_offsets(bytes_reader, [300, 1]), [large_offsets[299], large_offsets[0]])
+        table.load(bytes_reader)
+        self.assertEqual(list(table.entries), large_offsets)
+
+    def test_sample_chunks(self):
+        # chunks of 1 and 2 samples alternating, then 4 samples per chunk with another sample description
+        entries = [(chunk_number, 1 + (chunk_number + 1) % 2, 1) for chunk_number in range(1, 41)] + [(41, 4, 2)]
+        bytes_reader, _ = make_table_reader(bytes(TABLE_ENTRIES_OFFSET), entries, '!III')
+        expected_chunks = []
+        for chunk_number in range(1, 51):
+            samples_per_chunk, description_id = (1 + (chunk_number + 1) % 2, 1) if chunk_number <= 40 else (4, 2)
+            chunk_first_sample = len(expected_chunks) + 1
+            expected_chunks += [(chunk_number, chunk_first_sample, description_id)] * samples_per_chunk
+        table = SampleToChunkTable(BOX_OFFSET, len(entries))
+        table.load(bytes_reader)
+        self.assertEqual([table.get_sample_chunk(sample_number) for sample_number in range(1, len(expected_chunks) + 1)], expected_chunks)
+
+    def test_key_samples(self):
+        bytes_reader, reads = make_table_reader(bytes(TABLE_ENTRIES_OFFSET), [(n,) for n in range(1, 3001, 60)], '!I')
+        table = SyncSampleTable(BOX_OFFSET, 50)
+        self.assertEqual(table.get_key_sample(bytes_reader, 10), 601)
+        self.assertEqual(reads, [table.get_entries_range(10, 1)])
+
+    def test_resolved_samples_point_at_the_samples(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for layout_name in ('moov_start', 'co64', 'huge_stsc'):
+                file_path = os.path.join(tmp_dir, f'{layout_name}.mp4')
+                with open(file_path, 'wb') as f:
+                    f.write(make_mp4(**LAYOUTS[layout_name]))
+                layout = get_layout(layout_name)
+                extractor = FrameExtractor(FileStreamHandler(file_path, os.devnull), verbose=0)
+                extractor.init()
+                _, samples = extractor.resolve_samples(list(range(1, 200)) + [layout['samples_count']])
+                with open(file_path, 'rb') as f:
+                    for sample_number, sample_offset, sample_size in samples:
+                        f.seek(sample_offset)
+                        # every sample is a length prefixed nal unit filling it. key samples are idr slices
+                        nal_size, nal_type = struct.unpack('!IB', f.read(5))
+                        self.assertEqual(nal_size, sample_size - 4)
+                        self.assertEqual(nal_type == 0x65, (sample_number - 1) % layout['gop'] == 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.corpus import make_mp4
+from frameExtractor.AsyncFrameExtractor import AsyncFrameExtractor
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorSharedCache import SharedChunkCache
+from frameExtractor.extractor_handlers.AsyncFileStreamHandler import AsyncFileStreamHandler
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from frameExtractor.extractor_handlers.StreamHandlerBase import StreamHandler
+from tests import RecordingDecoder
+
+TARGETS = [(0.5, -1)]
+
+
+class CountingFileStreamHandler(FileStreamHandler):
+    def __init__(self, src_file_name, dst_file_name, counters):
+        super().__init__(src_file_name, dst_file_name)
+        self.counters = counters
+
+    def read_ranges(self, ranges, chunk_size):
+        ranges_dict = super().read_ranges(ranges, chunk_size)
+        with self.counters['lock']:
+            self.counters['requests'] += 1
+            self.counters['bytes'] += sum(len(range_bytes) for range_bytes in ranges_dict.values())
+        return ranges_dict
+
+
+class CountingAsyncFileStreamHandler(AsyncFileStreamHandler):
+    def __init__(self, src_file_name, dst_file_name, counters):
+        super().__init__(src_file_name, dst_file_name)
+        self.file_handler = CountingFileStreamHandler(src_file_name, dst_file_name, counters)
+
+
+# a handler that can only read whole chunks from their boundaries, like a telegram download
+class AlignedChunksStreamHandler(StreamHandler):
+    def __init__(self, src_file_name):
+        with open(src_file_name, 'rb') as f:
+            self.data = f.read()
+        self.src_file_name = src_file_name
+
+    def get_file_name(self):
+        return self.src_file_name
+
+    def get_file_size(self):
+        return len(self.data)
+
+    def get_file_identity(self):
+        return self.src_file_name, len(self.data), None
+
+    def read_chunks(self, offset, chunk_number, chunk_size):
+        if offset % chunk_size:
+            raise ValueError(f'offset {offset} is not on a chunk boundary')
+        return {offset + i * chunk_size: self.data[offset + i * chunk_size: offset + (i + 1) * chunk_size] for i in range(chunk_number)}
+
+
+class SharedChunkCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'video.mp4')
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4())
+        self.counters = {'lock': threading.Lock(), 'requests': 0, 'bytes': 0}
+        self.shared_cache = SharedChunkCache()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_extractor(self):
+        return FrameExtractor(CountingFileStreamHandler(self.file_path, os.devnull, self.counters), verbose=0, shared_cache=self.shared_cache)
+
+    def create_async_extractor(self):
+        return AsyncFrameExtractor(CountingAsyncFileStreamHandler(self.file_path, os.devnull, self.counters), verbose=0,
+                                   shared_cache=self.shared_cache)
+
+    @staticmethod
+    async def prepare_targets_packets_async(extractor):
+        await extractor.init_async()
+        targets_samples = await extractor.run_step(extractor.collect_targets_samples, TARGETS)
+        await extractor.run_step(extractor.download_samples, [target_samples for _, target_samples in targets_samples])
+        return [(description_data_id, extractor.convert_samples_packets(target_samples, description_data_id))
+                for description_data_id, target_samples in targets_samples]
+
+    def test_cached_reads_are_not_counted_as_requests(self):
+        first_extractor = self.create_extractor()
+        expected_packets = first_extractor.prepare_targets_packets(TARGETS)
+        self.assertEqual(first_extractor.round_trips, self.counters['requests'])
+        self.assertEqual(first_extractor.get_fetched_bytes(), self.counters['bytes'])
+        self.assertEqual(first_extractor.shared_cache_bytes, 0)
+        second_extractor = self.create_extractor()
+        self.assertEqual(second_extractor.prepare_targets_packets(TARGETS), expected_packets)
+        self.assertEqual(second_extractor.round_trips, 0)
+        self.assertEqual(second_extractor.get_fetched_bytes(), 0)
+        self.assertGreater(second_extractor.shared_cache_bytes, 0)
+
+    def test_concurrent_extractors_count_only_their_requests(self):
+        extractors = [self.create_extractor() for _ in range(16)]
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda extractor: extractor.prepare_targets_packets(TARGETS), extractors))
+        self.assertEqual(sum(extractor.round_trips for extractor in extractors), self.counters['requests'])
+        self.assertEqual(sum(extractor.get_fetched_bytes() for extractor in extractors), self.counters['bytes'])
+
+    def test_async_extractors_share_the_cache(self):
+        expected_packets = self.create_extractor().prepare_targets_packets(TARGETS)
+        warm_requests = self.counters['requests']
+        # the blocks read by the synchronous extractor are served to the async one
+        extractor = self.create_async_extractor()
+        self.assertEqual(asyncio.run(self.prepare_targets_packets_async(extractor)), expected_packets)
+        self.assertEqual(extractor.round_trips, 0)
+        self.assertEqual(self.counters['requests'], warm_requests)
+        self.assertGreater(extractor.shared_cache_bytes, 0)
+
+    def test_concurrent_async_extractors_fetch_once(self):
+        single_extractor = self.create_extractor()
+        expected_packets = single_extractor.prepare_targets_packets(TARGETS)
+        self.shared_cache = SharedChunkCache()
+        self.counters.update(requests=0, bytes=0)
+        extractors = [self.create_async_extractor() for _ in range(8)]
+
+        async def extract_all():
+            return await asyncio.gather(*[self.prepare_targets_packets_async(extractor) for extractor in extractors])
+        self.assertEqual(asyncio.run(extract_all()), [expected_packets] * len(extractors))
+        self.assertEqual(sum(extractor.round_trips for extractor in extractors), self.counters['requests'])
+        self.assertEqual(sum(extractor.get_fetched_bytes() for extractor in extractors), self.counters['bytes'])
+        # the misses of the extractors running together are fetched once
+        self.assertLessEqual(self.counters['requests'], single_extractor.round_trips)
+
+    def test_reads_are_aligned_to_the_handler_chunks(self):
+        chunk_size = 4096
+        self.shared_cache = SharedChunkCache(block_size=1000)
+
+        def create_chunks_extractor(shared_cache=None):
+            return FrameExtractor(AlignedChunksStreamHandler(self.file_path), verbose=0, chunk_size=chunk_size, shared_cache=shared_cache,
+                                  decoders=[RecordingDecoder()], frame_output=ARRAY_FRAME_OUTPUT, target_frame_mult=0.5)
+        expected_result = create_chunks_extractor().extract_frame()
+        self.assertEqual(expected_result[0], SUCCESS_CODE)
+        self.assertEqual(create_chunks_extractor(self.shared_cache).extract_frame(), expected_result)
+        # the blocks of the first extraction serve the second one
+        warm_extractor = create_chunks_extractor(self.shared_cache)
+        self.assertEqual(warm_extractor.extract_frame(), expected_result)
+        self.assertEqual(warm_extractor.round_trips, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
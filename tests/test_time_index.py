@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.corpus import DEFAULT_LAYOUT, make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+
+GOP = DEFAULT_LAYOUT['gop']
+SAMPLE_SECONDS = DEFAULT_LAYOUT['sample_delta'] / DEFAULT_LAYOUT['timescale']
+
+
+class TimeIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'video.mp4')
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_extractor(self, **kwargs):
+        return FrameExtractor(FileStreamHandler(self.file_path, os.devnull), verbose=0, **kwargs)
+
+    def test_time_targets(self):
+        extractor = self.create_extractor()
+        extractor.init()
+        extractor.load_time_index()
+        for target_sample in (1, 2, GOP, GOP + 1, 1000, 2999, 3000):
+            target_samples_numbers, frame_index = extractor.get_time_target_samples_numbers((target_sample - 1) * DEFAULT_LAYOUT['sample_delta'])
+            key_sample = (target_sample - 1) // GOP * GOP + 1
+            self.assertEqual(target_samples_numbers, list(range(key_sample, target_sample + 1)))
+            self.assertEqual(frame_index, target_sample - key_sample)
+
+    def test_keys_times_are_shared_by_the_track_index(self):
+        track_index = self.create_extractor().build_track_index()
+        self.assertEqual(len(track_index.keys_times), len(track_index.sample_tables['stss'].entries))
+        extractor = self.create_extractor(track_index=track_index)
+        presentation_times_calls = []
+        get_presentation_time = extractor.get_presentation_time
+        extractor.get_presentation_time = lambda sample_number: presentation_times_calls.append(sample_number) or get_presentation_time(sample_number)
+        extractor.prepare_time_target_packets(100.5 * SAMPLE_SECONDS)
+        self.assertIs(extractor.keys_times, track_index.keys_times)
+        # only the samples of the target group of pictures are timed
+        self.assertLessEqual(len(presentation_times_calls), GOP)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.corpus import make_mp4
+from frameExtractor.FrameExtractor import FrameExtractor
+from frameExtractor.FrameExtractorConstants import *
+from frameExtractor.FrameExtractorIndexCache import IndexCache
+from frameExtractor.extractor_handlers.FileStreamHandler import FileStreamHandler
+from tests import RecordingDecoder
+
+TARGETS = [(0, 0), (0.3, 0), (0.5, -1), (1, -1)]
+# an stsc entry per chunk, so the stsc box is far above the size limit of the tests
+HUGE_STSC_LAYOUT = {'samples_count': 3000, 'samples_per_chunk': (1, 2), 'min_sample_size': 200, 'max_sample_size': 600}
+STSC_SIZE_LIMIT = 64
+THREADS_NUMBER = 8
+TIMES = [0, 3.3, 50]
+
+
+class TrackIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'huge_stsc.mp4')
+        with open(self.file_path, 'wb') as f:
+            f.write(make_mp4(**HUGE_STSC_LAYOUT))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_extractor(self, **kwargs):
+        return FrameExtractor(FileStreamHandler(self.file_path, os.devnull), verbose=0, stsc_size_limit=STSC_SIZE_LIMIT,
+                              decoders=[RecordingDecoder()], frame_output=ARRAY_FRAME_OUTPUT, **kwargs)
+
+    @staticmethod
+    def extract_all(extractor):
+        return extractor.extract_frames(TARGETS), [extractor.extract_frame_at(seconds) for seconds in TIMES]
+
+    def test_track_index_leaves_out_big_stsc(self):
+        track_index = self.create_extractor().build_track_index()
+        self.assertNotIn('stsc', track_index.sample_tables)
+        expected_packets = self.create_extractor().prepare_targets_packets(TARGETS)
+        self.assertEqual(self.create_extractor(track_index=track_index).prepare_targets_packets(TARGETS), expected_packets)
+        # the pages decoded by an extractor are not shared through the index
+        self.assertNotIn('stsc', track_index.sample_tables)
+
+    def test_index_cache_leaves_out_big_stsc(self):
+        index_cache = IndexCache(os.path.join(self.tmp_dir.name, 'index'))
+        expected_packets = self.create_extractor().prepare_targets_packets(TARGETS)
+        self.assertEqual(self.create_extractor(index_cache=index_cache).prepare_targets_packets(TARGETS), expected_packets)
+        cached_extractor = self.create_extractor(index_cache=index_cache)
+        self.assertEqual(cached_extractor.prepare_targets_packets(TARGETS), expected_packets)
+        self.assertFalse(cached_extractor.get_sample_table('stsc').is_loaded())
+
+    def test_threads_share_one_track_index(self):
+        track_index = self.create_extractor().build_track_index()
+        boxes, sample_tables, sample_descriptions = dict(track_index.boxes), dict(track_index.sample_tables), dict(track_index.sample_descriptions)
+        expected_results = self.extract_all(self.create_extractor())
+        self.assertEqual([status_code for _, status_code, _ in expected_results[0]], [SUCCESS_CODE] * len(TARGETS))
+        # the threads start their extractions together so the lookups on the index overlap
+        barrier = threading.Barrier(THREADS_NUMBER)
+
+        def extract_with_index(_):
+            extractor = self.create_extractor(track_index=track_index)
+            barrier.wait()
+            return self.extract_all(extractor), extractor.round_trips
+        with ThreadPoolExecutor(THREADS_NUMBER) as executor:
+            results = list(executor.map(extract_with_index, range(THREADS_NUMBER)))
+        for thread_results, round_trips in results:
+            self.assertEqual(thread_results, expected_results)
+            self.assertGreater(round_trips, 0)
+        # the extractions left the shared index as it was built
+        self.assertEqual(dict(track_index.boxes), boxes)
+        self.assertEqual(dict(track_index.sample_tables), sample_tables)
+        self.assertEqual(dict(track_index.sample_descriptions), sample_descriptions)
+
+    def test_track_index_views_are_read_only(self):
+        track_index = self.create_extractor().build_track_index()
+        for view in (track_index.boxes, track_index.sample_tables, track_index.sample_descriptions):
+            with self.subTest(view=view):
+                key = next(iter(view))
+                with self.assertRaises(TypeError):
+                    view[key] = None
+                with self.assertRaises(TypeError):
+                    del view[key]
+                self.assertIn(key, view)
+
+
+if __name__ == '__main__':
+    unittest.main()